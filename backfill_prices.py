@@ -0,0 +1,59 @@
+# backfill_prices.py
+# Load years of end-of-day PSX price files into the price history store:
+#   python backfill_prices.py data/eod/ 2019/*.csv market-data.json
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from trackerbazaar.data import init_db
+from trackerbazaar.nav import PKT_OFFSET, invalidate_nav
+from trackerbazaar.price_history import bulk_load, HISTORY_DB_FILE
+
+
+def _expand(inputs):
+    for item in inputs:
+        if os.path.isdir(item):
+            for ext in ("*.csv", "*.json"):
+                yield from sorted(glob.glob(os.path.join(item, "**", ext), recursive=True))
+        else:
+            yield from sorted(glob.glob(item)) or [item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill PSX end-of-day prices.")
+    parser.add_argument("inputs", nargs="+", help="CSV/JSON files, globs or directories")
+    parser.add_argument("--db", default=HISTORY_DB_FILE, help=f"history DB (default: {HISTORY_DB_FILE})")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=250_000, help="rows per transaction")
+    parser.add_argument("--replace", action="store_true", help="overwrite rows already in the store")
+    parser.add_argument("--keep-index", action="store_true",
+                        help="maintain the ts index during the load instead of rebuilding it")
+    args = parser.parse_args()
+
+    paths = list(dict.fromkeys(_expand(args.inputs)))
+    if not paths:
+        print("No input files found.")
+        return
+    print(f"Loading {len(paths)} file(s) into {args.db}...")
+    stats = bulk_load(
+        paths, path=args.db, workers=args.workers, batch_size=args.batch_size,
+        replace=args.replace, rebuild_index=not args.keep_index, progress=print,
+    )
+    print(
+        f"✅ {stats['rows_inserted']:,} rows inserted ({stats['rows_parsed']:,} parsed, "
+        f"{stats['failed_files']} file(s) skipped) in {stats['seconds']:.1f}s "
+        f"— {stats['rows_per_sec']:,.0f} rows/s"
+    )
+    if stats["rows_inserted"] and stats["first_ts"] is not None:
+        # Closes may predate computed NAV rollups; those days get recomputed on next view
+        since = np.datetime64((stats["first_ts"] + PKT_OFFSET) // 86400, "D")
+        init_db()
+        n = invalidate_nav(since=str(since))
+        print(f"NAV rollups of {n} portfolio(s) marked stale from {since}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# corporate_action.py
+# Record (or list / delete) splits, bonus issues and rights issues; every
+# user's positions in the symbol are restated in one transaction:
+#   python corporate_action.py OGDC 2024-09-16 BONUS 0.1    # 10% bonus shares
+#   python corporate_action.py HUBC 2024-05-02 SPLIT 2      # 2-for-1 split
+#   python corporate_action.py --list
+#   python corporate_action.py --delete 7
+
+import argparse
+
+from trackerbazaar.cache import note_write
+from trackerbazaar.corporate_actions import (
+    ACTION_TYPES, add_corporate_action, delete_corporate_action, load_actions, parse_ex_date,
+)
+from trackerbazaar.data import get_conn, init_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a corporate action and restate positions.")
+    parser.add_argument("symbol", nargs="?")
+    parser.add_argument("ex_date", nargs="?", type=parse_ex_date, help="YYYY-MM-DD; trades before it are restated")
+    parser.add_argument("type", nargs="?", choices=ACTION_TYPES, type=str.upper)
+    parser.add_argument("ratio", nargs="?", type=float,
+                        help="SPLIT: new shares per old share; BONUS/RIGHTS: shares per share held")
+    parser.add_argument("--price", type=float, default=0.0, help="rights subscription price")
+    parser.add_argument("--note", default=None)
+    parser.add_argument("--list", action="store_true", help="show recorded actions")
+    parser.add_argument("--delete", type=int, metavar="ID", help="delete an action and rebuild its symbol")
+    args = parser.parse_args()
+
+    init_db()
+    if args.list:
+        print(load_actions(conn=get_conn()).to_string(index=False))
+        return
+    if args.delete is not None:
+        with get_conn() as conn:
+            n = delete_corporate_action(conn, args.delete)
+        note_write()
+        print(f"✅ Deleted action {args.delete}; {n} position row(s) rebuilt")
+        return
+    if args.ratio is None:
+        parser.error("symbol, ex_date, type and ratio are required")
+
+    with get_conn() as conn:
+        result = add_corporate_action(conn, args.symbol, args.ex_date, args.type, args.ratio, args.price, args.note)
+    note_write()
+    print(
+        f"✅ {args.type} on {args.symbol.upper()} (x{result['factor']:g}): {result['scaled']:,} position(s) scaled, "
+        f"{result['replayed']:,} replayed in {result['seconds']:.2f}s"
+    )
+    if args.type == "RIGHTS":
+        print("Record subscribed rights shares as a BUY at the subscription price.")
+
+
+if __name__ == "__main__":
+    main()
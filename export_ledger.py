@@ -0,0 +1,43 @@
+# export_ledger.py
+# Stream ledgers out to CSV/Parquet, or take a hot backup of the database:
+#   python export_ledger.py --user me@example.com --format parquet
+#   python export_ledger.py --out /tmp/ledger          # plain files, every portfolio
+#   python export_ledger.py --backup backups/nightly.db
+
+import argparse
+
+from trackerbazaar.data import init_db
+from trackerbazaar.export import BACKUP_PAGES, CHUNK_ROWS, FORMATS, backup_database, export_archive, export_ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ledgers or back up the database.")
+    parser.add_argument("--user", default=None, help="owner email (default: every portfolio)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", default=None, help="write plain files into this directory instead of a zip")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read per chunk")
+    parser.add_argument("--backup", nargs="?", const="", default=None, metavar="DEST",
+                        help="online backup instead of an export (default DEST: backups/<db>-<time>.db)")
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES, help="pages copied per backup step")
+    args = parser.parse_args()
+
+    init_db()
+    if args.backup is not None:
+        stats = backup_database(args.backup or None, pages=args.pages)
+        print(
+            f"✅ Backed up {stats['pages']:,} pages to {stats['path']} "
+            f"({stats['bytes'] / 2**20:.1f} MB) in {stats['seconds']:.1f}s, {stats['restarts']} restart(s)"
+        )
+        return
+
+    if args.out:
+        rows = export_ledger(args.out, args.user, args.format, chunk_rows=args.chunk_rows, progress=print)
+        print(f"✅ {sum(rows.values()):,} rows written to {args.out}")
+        return
+    stats = export_archive(args.user, args.format, chunk_rows=args.chunk_rows, progress=print)
+    print(f"✅ {sum(stats['rows'].values()):,} rows written to {stats['path']} "
+          f"({stats['bytes'] / 2**20:.1f} MB) in {stats['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
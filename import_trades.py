@@ -0,0 +1,44 @@
+# import_trades.py
+# Bulk-import a broker statement (CSV/XLSX) into a portfolio:
+#   python import_trades.py statement.csv --portfolio 3
+#   python import_trades.py statement.xlsx --portfolio 3 --dry-run --rejects rejects.csv
+
+import argparse
+
+from trackerbazaar.cache import note_write
+from trackerbazaar.data import init_db
+from trackerbazaar.importer import CHUNK_ROWS, import_transactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import broker trades into a portfolio.")
+    parser.add_argument("statement", help="CSV or XLSX file")
+    parser.add_argument("--portfolio", type=int, required=True, help="portfolio id")
+    parser.add_argument("--month-first", action="store_true", help="dates are MM/DD/YYYY (default DD/MM/YYYY)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows parsed per chunk")
+    parser.add_argument("--dry-run", action="store_true", help="validate and roll back")
+    parser.add_argument("--rejects", help="write rejected rows (with reasons) to this CSV")
+    args = parser.parse_args()
+
+    init_db()
+    stats = import_transactions(
+        args.statement, args.portfolio, chunksize=args.chunk_rows,
+        dayfirst=not args.month_first, dry_run=args.dry_run, progress=print,
+    )
+    if not args.dry_run:
+        note_write()
+    rejected = stats["rejected"]
+    print(
+        f"{'🔍 Dry run: ' if args.dry_run else '✅ '}{stats['inserted']:,} trades imported, "
+        f"{stats['duplicates']:,} duplicate(s), {len(rejected) - stats['duplicates']:,} invalid row(s) "
+        f"of {stats['rows_read']:,} in {stats['seconds']:.1f}s — {stats['rows_per_sec']:,.0f} rows/s"
+    )
+    if args.rejects and len(rejected):
+        rejected.to_csv(args.rejects, index=False)
+        print(f"Rejected rows written to {args.rejects}")
+    elif len(rejected):
+        print(rejected.head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import streamlit as st
 
 # App modules
 from trackerbazaar.data import init_db
+from trackerbazaar.price_refresher import start_price_refresher
 from trackerbazaar.user_manager import UserManager
 from trackerbazaar.portfolio import PortfolioUI
 from trackerbazaar.dashboard import DashboardUI
@@ -23,6 +24,12 @@ def main():
         st.error(f"Database init failed: {e}")
         return
 
+    # Background price polling (one thread per server process, shared by all sessions)
+    try:
+        start_price_refresher()
+    except Exception as e:
+        st.warning(f"Price refresher not started: {e}")
+
     # Auth
     um = UserManager()
     if not um.is_logged_in():
@@ -4,6 +4,9 @@ from trackerbazaar.data import init_db, DB_FILE
 if os.path.exists(DB_FILE):
     print(f"Deleting old database: {DB_FILE}")
     os.remove(DB_FILE)
+for sidecar in (DB_FILE + "-wal", DB_FILE + "-shm"):
+    if os.path.exists(sidecar):
+        os.remove(sidecar)
 
 print("Recreating database schema...")
 init_db()
@@ -0,0 +1,27 @@
+# tests/test_query_plans.py
+
+import pytest
+
+from trackerbazaar import data
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """A newly migrated database in a temp dir, with no connections left open afterwards."""
+    data.close_connections()
+    monkeypatch.setattr(data, "DB_FILE", str(tmp_path / "plans.db"))
+    data.init_db(force=True)
+    yield data.get_conn()
+    data.close_connections()
+
+
+def test_every_ui_query_is_an_index_search(fresh_db):
+    results = data.check_query_plans(fresh_db)
+    assert results
+    for name, ok, plan in results:
+        steps = [d for d in plan if not d.startswith("SCALAR SUBQUERY")]
+        assert ok, f"{name}: {plan}"
+        assert steps, f"{name}: empty plan"
+        for detail in steps:
+            assert detail.startswith("SEARCH ") and " INDEX " in detail, f"{name}: {detail}"
+            assert "TEMP B-TREE" not in detail, f"{name}: {detail}"
@@ -1,8 +1,14 @@
 # trackerbazaar/admin_tools.py
 import streamlit as st
 import os
-import sqlite3
-from trackerbazaar.data import DB_FILE, init_db
+from trackerbazaar.cache import cache_stats, clear_cache, note_write
+from trackerbazaar.corporate_actions import ACTION_TYPES, add_corporate_action, delete_corporate_action, load_actions
+from trackerbazaar.data import DB_FILE, init_db, get_conn, close_connections, check_query_plans
+from trackerbazaar.export import FORMATS, backup_database, export_archive
+from trackerbazaar.nav import invalidate_nav
+from trackerbazaar.positions import rebuild_positions, verify_positions
+from trackerbazaar.price_refresher import refresher_status
+from trackerbazaar.source_health import source_metrics
 
 def show_admin_tools():
     st.header("🛠️ Admin Tools")
@@ -18,8 +24,11 @@ def show_admin_tools():
     # Button: Initialize / Reset DB
     if st.button("🔄 Rebuild Database (Drop & Recreate All Tables)"):
         try:
-            if os.path.exists(DB_FILE):
-                os.remove(DB_FILE)  # delete old DB file
+            close_connections()  # drop cached handles to the old file
+            clear_cache()
+            for path in (DB_FILE, DB_FILE + "-wal", DB_FILE + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)  # delete old DB file
             init_db()  # re-create fresh DB with tables
             st.success("✅ Database has been rebuilt successfully!")
         except Exception as e:
@@ -28,11 +37,9 @@ def show_admin_tools():
     # Button: Inspect tables
     if st.button("📋 Show Tables"):
         try:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
+            cursor = get_conn().cursor()
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
             tables = cursor.fetchall()
-            conn.close()
             if tables:
                 st.write("### Tables in DB:")
                 for t in tables:
@@ -41,3 +48,152 @@ def show_admin_tools():
                 st.info("No tables found in database.")
         except Exception as e:
             st.error(f"❌ Failed to read tables: {e}")
+
+    # Button: Verify every UI query is index-backed
+    if st.button("🔍 Check Query Plans"):
+        try:
+            init_db()
+            results = check_query_plans()
+            failing = [name for name, ok, _ in results if not ok]
+            if failing:
+                st.error(f"❌ {len(failing)} query(ies) not index-backed: {', '.join(failing)}")
+            else:
+                st.success(f"✅ All {len(results)} UI queries use an index")
+            st.dataframe(
+                [{"query": name, "ok": ok, "plan": " | ".join(plan)} for name, ok, plan in results],
+                use_container_width=True,
+            )
+        except Exception as e:
+            st.error(f"❌ Failed to check query plans: {e}")
+
+    # Buttons: materialized positions vs the raw ledger
+    c1, c2 = st.columns(2)
+    if c1.button("🧮 Verify Positions"):
+        try:
+            init_db()
+            mismatches = verify_positions()
+            if mismatches.empty:
+                st.success("✅ Positions table matches the transaction ledger")
+            else:
+                st.error(f"❌ {len(mismatches)} position(s) differ from the ledger")
+                st.dataframe(mismatches, use_container_width=True)
+        except Exception as e:
+            st.error(f"❌ Failed to verify positions: {e}")
+    if c2.button("♻️ Rebuild Positions"):
+        try:
+            init_db()
+            with get_conn() as conn:
+                n = rebuild_positions(conn)
+            note_write()
+            st.success(f"✅ Rebuilt {n} position row(s) from the ledger")
+        except Exception as e:
+            st.error(f"❌ Failed to rebuild positions: {e}")
+    if st.button("📈 Recompute NAV History"):
+        try:
+            init_db()
+            n = invalidate_nav()
+            clear_cache()
+            st.success(f"✅ NAV rollups of {n} portfolio(s) will be recomputed on next view")
+        except Exception as e:
+            st.error(f"❌ Failed to reset NAV rollups: {e}")
+
+    # Splits / bonus / rights issues: restate every user's positions in the symbol
+    st.subheader("📑 Corporate Actions")
+    init_db()
+    with st.form("corporate_action"):
+        a1, a2, a3, a4 = st.columns(4)
+        symbol = a1.text_input("Symbol")
+        ex_date = a2.date_input("Ex-date")
+        kind = a3.selectbox("Type", ACTION_TYPES)
+        ratio = a4.number_input("Ratio", min_value=0.0, value=0.0, step=0.05, format="%.4f",
+                                help="SPLIT: new shares per old share (2 = 2-for-1). "
+                                     "BONUS: bonus shares per share (0.1 = 10%). RIGHTS: rights per share.")
+        price = st.number_input("Subscription price (rights)", min_value=0.0, value=0.0)
+        note = st.text_input("Note")
+        if st.form_submit_button("➕ Record Action"):
+            try:
+                with get_conn() as conn:
+                    result = add_corporate_action(conn, symbol, ex_date, kind, ratio, price, note or None)
+                note_write()
+                st.success(
+                    f"✅ {kind} on {symbol.strip().upper()} (x{result['factor']:g}): {result['scaled']} position(s) "
+                    f"scaled, {result['replayed']} replayed in {result['seconds']:.2f}s"
+                )
+                if kind == "RIGHTS":
+                    st.info("Record subscribed rights shares as a BUY at the subscription price.")
+            except Exception as e:
+                st.error(f"❌ Failed to record action: {e}")
+    actions = load_actions(conn=get_conn())
+    if actions.empty:
+        st.caption("No corporate actions recorded.")
+    else:
+        st.dataframe(actions, use_container_width=True, hide_index=True)
+        d1, d2 = st.columns([3, 1])
+        action_id = d1.selectbox("Action", actions["id"],
+                                 format_func=lambda i: " ".join(actions.loc[actions["id"] == i, ["symbol", "ex_date", "type"]]
+                                                                .iloc[0].astype(str)))
+        if d2.button("🗑️ Delete Action"):
+            try:
+                with get_conn() as conn:
+                    n = delete_corporate_action(conn, int(action_id))
+                note_write()
+                st.success(f"✅ Deleted; {n} position row(s) rebuilt")
+            except Exception as e:
+                st.error(f"❌ Failed to delete action: {e}")
+
+    # Ledger export (streamed chunk by chunk) and hot backup
+    st.subheader("💾 Export & Backup")
+    init_db()
+    owners = [r[0] for r in get_conn().execute("SELECT DISTINCT owner_email FROM portfolios ORDER BY owner_email")]
+    c1, c2 = st.columns(2)
+    owner = c1.selectbox("Owner", ["All users"] + owners)
+    fmt = c2.radio("Format", FORMATS, horizontal=True)
+    e1, e2 = st.columns(2)
+    if e1.button("📤 Export Ledger"):
+        try:
+            with st.spinner("Exporting…"):
+                result = export_archive(None if owner == "All users" else owner, fmt)
+            st.success(
+                f"✅ Exported {sum(result['rows'].values()):,} rows to `{result['path']}` "
+                f"({result['bytes'] / 2**20:.1f} MB, {result['seconds']:.1f}s)"
+            )
+            with open(result["path"], "rb") as f:
+                st.download_button("Download export", f, file_name=os.path.basename(result["path"]),
+                                   mime="application/zip")
+        except Exception as e:
+            st.error(f"❌ Export failed: {e}")
+    if e2.button("🗄️ Back Up Database"):
+        try:
+            status = st.empty()
+            result = backup_database(progress=status.caption)
+            status.empty()
+            st.success(
+                f"✅ Backed up {result['pages']:,} pages to `{result['path']}` "
+                f"({result['bytes'] / 2**20:.1f} MB, {result['seconds']:.1f}s"
+                + (f", {result['restarts']} restart(s)" if result["restarts"] else "") + ")"
+            )
+        except Exception as e:
+            st.error(f"❌ Backup failed: {e}")
+
+    # Page data cache
+    st.subheader("🗃️ Cache")
+    stats = cache_stats()
+    st.caption(
+        f"{stats['entries']} entries, {stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} MB — "
+        f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), {stats['evictions']} evictions"
+    )
+
+    # Price source health (circuit breakers + latency)
+    st.subheader("📡 Price Sources")
+    metrics = source_metrics()
+    if metrics:
+        st.dataframe(metrics, use_container_width=True)
+    else:
+        st.info("No price fetches in this process yet.")
+    status = refresher_status()
+    if status:
+        st.caption(
+            f"Refresher: last run {status['last_run']}, last version {status['last_version']}, "
+            f"next in {status['next_run_in']}s"
+            + (f" — last error: {status['last_error']}" if status["last_error"] else "")
+        )
@@ -0,0 +1,206 @@
+# trackerbazaar/cache.py
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from trackerbazaar import data
+
+# Memory cap for cached values (MB)
+CACHE_MAX_BYTES = int(os.environ.get("TRACKERBAZAAR_CACHE_MB", "128")) * 2**20
+
+
+def _sizeof(value) -> int:
+    """Rough memory footprint of a cached value."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU with a byte budget and hit/miss/eviction counters."""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Return ``(True, value)`` on a hit, ``(False, None)`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, value):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return  # would evict everything else; just don't cache it
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class DataVersions:
+    """
+    In-memory mirror of the data_versions table (scope -> write counter).
+
+    The triggers bump a scope inside every writing transaction. The mirror
+    is re-read after this process's own writes (note_write()) and whenever
+    the DB or WAL file's mtime/size changes, which is how commits from other
+    processes show up. Between those points a version lookup costs two
+    stat() calls and no SQL.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self._versions = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        path = self.path or data.DB_FILE
+        stamp = [data._generation]
+        for name in (path, path + "-wal"):
+            try:
+                st = os.stat(name)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _reload(self):
+        stamp = self._file_stamp()  # taken first: a commit racing the read forces another reload
+        rows = data.get_conn(self.path).execute("SELECT scope, version FROM data_versions").fetchall()
+        with self._lock:
+            self._versions = dict(rows)
+            self._stamp = stamp
+
+    def version(self, scope: str) -> int:
+        if self._file_stamp() != self._stamp:
+            self._reload()
+        return self._versions.get(scope, 0)
+
+    def total(self, prefix: str) -> int:
+        """Sum of the versions of every scope starting with `prefix`; grows with each write to any of them."""
+        if self._file_stamp() != self._stamp:
+            self._reload()
+        return sum(v for scope, v in self._versions.items() if scope.startswith(prefix))
+
+    def note_write(self):
+        """Pick up a commit made by this process right away."""
+        self._reload()
+
+
+_cache = LRUCache()
+_versions = DataVersions()
+
+
+def portfolio_scope(portfolio_id) -> str:
+    return f"p:{portfolio_id}"
+
+def user_scope(user_email) -> str:
+    return f"u:{user_email}"
+
+def symbol_scope(symbol) -> str:
+    return f"s:{symbol}"
+
+
+def cached(kind: str, loader, user: str = None, portfolio_id=None, extra=(), symbol: str = None):
+    """
+    Memoize ``loader()`` under (kind, user, portfolio, extra, data version).
+
+    The version comes from the symbol's scope when a symbol is given (data
+    shared by every user, like corporate actions), else the portfolio's,
+    else the user's, so any write to that scope makes old entries
+    unreachable (they age out of the LRU). Cached values are shared between
+    reruns and sessions: callers must not mutate them in place.
+    """
+    data.init_db()
+    if symbol is not None:
+        scope = symbol_scope(symbol)
+    else:
+        scope = portfolio_scope(portfolio_id) if portfolio_id is not None else user_scope(user)
+    key = (kind, user, portfolio_id, symbol, tuple(extra), data._generation, _versions.version(scope))
+    hit, value = _cache.get(key)
+    if hit:
+        return value
+    value = loader()
+    _cache.put(key, value)
+    return value
+
+
+def actions_version() -> tuple:
+    """Changes with every corporate action write, for state derived from all symbols' actions."""
+    data.init_db()
+    return data._generation, _versions.total(symbol_scope(""))
+
+
+def note_write():
+    """Call after committing a write so this process sees it on the next lookup."""
+    _versions.note_write()
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+
+# ---- memoized page data
+
+def user_portfolios(user_email: str) -> list:
+    """[(id, name), ...] for the user, ordered by name."""
+    def load():
+        return data.get_conn().execute(data.QUERIES["user_portfolios"], (user_email,)).fetchall()
+    return cached("portfolios", load, user=user_email)
+
+
+def ledger(table: str, portfolio_id: int, descending: bool = False, user: str = None) -> pd.DataFrame:
+    """One portfolio's transactions/dividends/cash rows in canonical columns."""
+    def load():
+        conn = data.get_conn()
+        return pd.read_sql_query(data.ledger_query(table, descending, conn=conn), conn, params=(portfolio_id,))
+    return cached(f"ledger:{table}", load, user=user, portfolio_id=portfolio_id, extra=(descending,))
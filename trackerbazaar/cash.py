@@ -1,29 +1,16 @@
 # trackerbazaar/cash.py
-import sqlite3
-import pandas as pd
 import streamlit as st
 from datetime import date
-from trackerbazaar.data import DB_FILE, init_db
-
-def _table_has_column(table: str, column: str) -> bool:
-    with sqlite3.connect(DB_FILE) as conn:
-        cur = conn.cursor()
-        cur.execute(f"PRAGMA table_info({table})")
-        cols = [row[1] for row in cur.fetchall()]
-        return column in cols
+from trackerbazaar.cache import note_write, user_portfolios
+from trackerbazaar.data import get_conn, init_db
+from trackerbazaar.history_view import ledger_totals_cached, show_history
 
 class CashUI:
     def __init__(self, user_email: str):
         self.user_email = user_email
 
     def _user_portfolios(self):
-        with sqlite3.connect(DB_FILE) as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT id, name FROM portfolios WHERE owner_email=? ORDER BY name",
-                (self.user_email,),
-            )
-            return cur.fetchall()
+        return user_portfolios(self.user_email)
 
     def show(self):
         st.header("💵 Cash")
@@ -32,7 +19,6 @@ class CashUI:
             st.warning("Please log in to manage cash.")
             return
 
-        # Ensure schema & run migrations (adds cash.note if missing)
         init_db()
 
         portfolios = self._user_portfolios()
@@ -58,20 +44,12 @@ class CashUI:
             if submitted:
                 signed_amount = amount if kind == "Deposit" else -amount
                 try:
-                    with sqlite3.connect(DB_FILE) as conn:
-                        cur = conn.cursor()
-                        # Insert depending on whether 'note' column exists (defensive)
-                        if _table_has_column("cash", "note"):
-                            cur.execute(
-                                "INSERT INTO cash (portfolio_id, date, amount, note) VALUES (?,?,?,?)",
-                                (portfolio_id, str(cash_date), signed_amount, note),
-                            )
-                        else:
-                            cur.execute(
-                                "INSERT INTO cash (portfolio_id, date, amount) VALUES (?,?,?)",
-                                (portfolio_id, str(cash_date), signed_amount),
-                            )
-                        conn.commit()
+                    with get_conn() as conn:
+                        conn.execute(
+                            "INSERT INTO cash (portfolio_id, date, amount, note) VALUES (?,?,?,?)",
+                            (portfolio_id, str(cash_date), signed_amount, note),
+                        )
+                    note_write()
                     st.success("Cash record saved.")
                     try:
                         st.rerun()
@@ -80,27 +58,10 @@ class CashUI:
                 except Exception as e:
                     st.error(f"Failed to save cash record: {e}")
 
-        # Read table (be tolerant to older schema)
-        try:
-            with sqlite3.connect(DB_FILE) as conn:
-                df = pd.read_sql_query(
-                    "SELECT date, amount, COALESCE(note,'') AS note FROM cash WHERE portfolio_id=? ORDER BY date DESC",
-                    conn,
-                    params=(portfolio_id,),
-                )
-        except Exception:
-            # Fallback when 'note' column doesn't exist yet
-            with sqlite3.connect(DB_FILE) as conn:
-                df = pd.read_sql_query(
-                    "SELECT date, amount FROM cash WHERE portfolio_id=? ORDER BY date DESC",
-                    conn,
-                    params=(portfolio_id,),
-                )
-            df["note"] = ""
-
-        st.subheader("History")
-        if df.empty:
-            st.info("No cash records yet.")
-        else:
-            st.dataframe(df, use_container_width=True)
-            st.caption(f"Balance: **PKR {df['amount'].sum():,.0f}**")
+        shown = show_history("cash", portfolio_id, self.user_email, "No cash records yet.")
+        balance = ledger_totals_cached("cash", portfolio_id, self.user_email)
+        if balance["rows"]:
+            caption = f"Balance: **PKR {balance['amount']:,.0f}**"
+            if shown["rows"] != balance["rows"]:
+                caption += f" · Filtered: PKR {shown['amount']:,.0f} over {shown['rows']:,} record(s)"
+            st.caption(caption)
@@ -0,0 +1,202 @@
+# trackerbazaar/corporate_actions.py
+
+import json
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from trackerbazaar.cache import cached
+from trackerbazaar.data import get_conn
+
+ACTION_TYPES = ("SPLIT", "BONUS", "RIGHTS")
+
+ACTION_COLUMNS = ["id", "symbol", "ex_date", "type", "ratio", "price", "note", "factor"]
+
+# Composite (symbol code, day) search keys: days since 1970 are offset into
+# [0, DAY_SPAN) so each symbol's actions sort into their own contiguous block
+DAY_OFFSET = 1 << 20
+DAY_SPAN = 1 << 21
+
+ACTIONS_SQL = """SELECT id, symbol, ex_date, type, ratio, COALESCE(price, 0) AS price, COALESCE(note, '') AS note
+                 FROM corporate_actions"""
+INSERT_SQL = "INSERT INTO corporate_actions (symbol, ex_date, type, ratio, price, note) VALUES (?,?,?,?,?,?)"
+
+
+def action_factor(kind: str, ratio: float) -> float:
+    """
+    Shares held after the ex-date per share held before it. SPLIT ratios
+    are new shares per old share (2 for a 2-for-1, 0.1 for a 1-for-10
+    consolidation), BONUS ratios are bonus shares per share held (0.1 for
+    a 10% bonus). Rights shares are only received when subscribed, which
+    the ledger records as a BUY at the subscription price, so RIGHTS is 1.
+    """
+    kind = kind.strip().upper()
+    if kind not in ACTION_TYPES:
+        raise ValueError(f"Unknown corporate action type {kind!r} (expected one of {', '.join(ACTION_TYPES)})")
+    if not ratio or ratio <= 0:
+        raise ValueError("Corporate action ratio must be positive")
+    return {"SPLIT": float(ratio), "BONUS": 1.0 + float(ratio), "RIGHTS": 1.0}[kind]
+
+
+def parse_ex_date(value) -> str:
+    """An ex-date (date, datetime or ISO string) as ISO YYYY-MM-DD; ValueError for anything else, e.g. 01/07/2024."""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    try:
+        return date.fromisoformat(str(value).strip()).isoformat()
+    except ValueError:
+        raise ValueError(f"Ex-date {value!r} is not an ISO date (YYYY-MM-DD)") from None
+
+
+def _day_numbers(values) -> tuple:
+    """(days since 1970 as int64, valid mask) of ISO dates, strings or datetime64 values."""
+    days = np.asarray(values)
+    if days.dtype.kind != "M":
+        days = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce", format="mixed").to_numpy()
+    days = days.astype("datetime64[D]")
+    valid = ~np.isnat(days)
+    return np.where(valid, days.astype(np.int64), 0), valid
+
+
+def load_actions(symbols=None, conn=None) -> pd.DataFrame:
+    """
+    Corporate actions of the given symbols (all when None) with their
+    factors, ordered by symbol and ex-date. With a connection the table is
+    read in that connection's transaction (write paths); without one each
+    symbol's actions come from the page cache, which a write to that
+    symbol's actions invalidates without touching any other symbol.
+    """
+    if conn is None and symbols is not None:
+        frames = [symbol_actions(s) for s in sorted(set(symbols))]
+        frames = [f for f in frames if len(f)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ACTION_COLUMNS)
+    conn = conn or get_conn()
+    sql, params = ACTIONS_SQL, []
+    if symbols is not None:
+        sql += " WHERE symbol IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(sorted(set(symbols))))
+    df = pd.read_sql_query(sql + " ORDER BY symbol, ex_date, id", conn, params=params)
+    df["factor"] = [action_factor(k, r) for k, r in zip(df["type"], df["ratio"])]
+    return df[ACTION_COLUMNS]
+
+
+def symbol_actions(symbol: str) -> pd.DataFrame:
+    """One symbol's corporate actions, cached until an action for that symbol is written."""
+    return cached("corporate_actions", lambda: load_actions([symbol], get_conn()), symbol=symbol)
+
+
+def adjustment_factors(actions: pd.DataFrame, symbols, days) -> np.ndarray:
+    """
+    Cumulative factor F for each (symbol, day) pair: the product of the
+    factors of that symbol's actions with an ex-date after the day, i.e.
+    today's shares per share held on that day (1 when nothing happened
+    since). A trade on the ex-date itself is already in post-action units.
+
+    Vectorized over any number of pairs: actions are sorted on a composite
+    (symbol, ex-date) key, suffix sums of log factors are taken once, and
+    each pair is two searchsorted lookups into that array.
+    """
+    symbols = np.asarray(symbols, dtype=object)
+    out = np.ones(symbols.size)
+    if actions.empty or not symbols.size:
+        return out
+    a_day, a_valid = _day_numbers(actions["ex_date"].to_numpy())
+    names = pd.Index(np.unique(actions["symbol"].to_numpy(dtype=object)[a_valid]))
+    a_key = names.get_indexer(actions["symbol"][a_valid]) * DAY_SPAN + a_day[a_valid] + DAY_OFFSET
+    order = np.argsort(a_key, kind="stable")
+    a_key = a_key[order]
+    log_f = np.log(actions["factor"].to_numpy(dtype=np.float64)[a_valid][order])
+    tail = np.r_[np.cumsum(log_f[::-1])[::-1], 0.0]  # tail[i] = sum of log_f[i:]
+
+    code = names.get_indexer(symbols)
+    q_day, q_valid = _day_numbers(days)
+    hit = (code >= 0) & q_valid
+    code, q_day = code[hit], q_day[hit]
+    lo = np.searchsorted(a_key, code * DAY_SPAN + q_day + DAY_OFFSET, side="right")  # first action after the day
+    hi = np.searchsorted(a_key, (code + 1) * DAY_SPAN, side="left")                  # end of the symbol's block
+    out[hit] = np.exp(tail[lo] - tail[hi])
+    return out
+
+
+def adjust_ledger(tx: pd.DataFrame, conn=None, actions: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Trades (symbol, date, quantity, price columns) restated in today's
+    share units: quantity x F, price / F. Notional and fees are unchanged,
+    so average cost, invested amount and realized P&L stay in PKR terms.
+    The stored ledger is never rewritten.
+    """
+    if tx.empty:
+        return tx
+    if actions is None:
+        actions = load_actions(tx["symbol"].unique(), conn)
+    if actions.empty:
+        return tx
+    f = adjustment_factors(actions, tx["symbol"].to_numpy(), tx["date"].to_numpy())
+    if (f == 1.0).all():
+        return tx
+    tx = tx.copy()
+    tx["quantity"] = tx["quantity"].to_numpy(dtype=np.float64) * f
+    tx["price"] = tx["price"].to_numpy(dtype=np.float64) / f
+    return tx
+
+
+# ---- writes (every portfolio holding the symbol, in bulk)
+
+def add_corporate_action(conn, symbol: str, ex_date, kind: str, ratio: float, price: float = 0.0,
+                         note: str = None) -> dict:
+    """
+    Record a corporate action and restate every user's positions in the
+    symbol, in the caller's transaction (``with get_conn() as conn:``,
+    then cache.note_write()). Positions are scaled by one UPDATE, with a
+    ledger replay only for those traded on or after the ex-date; the data
+    version triggers invalidate just the portfolios holding the symbol and
+    pull their NAV rollups back to the ex-date. Returns id, factor,
+    scaled and replayed row counts and seconds.
+    """
+    from trackerbazaar.positions import scale_positions
+
+    started = time.perf_counter()
+    symbol, kind, ex_date = symbol.strip().upper(), kind.strip().upper(), parse_ex_date(ex_date)
+    factor = action_factor(kind, ratio)
+    cur = conn.execute(INSERT_SQL, (symbol, ex_date, kind, float(ratio), float(price or 0.0), note))
+    scaled, replayed = scale_positions(conn, symbol, ex_date, factor) if factor != 1.0 else (0, 0)
+    return {"id": cur.lastrowid, "factor": factor, "scaled": scaled, "replayed": replayed,
+            "seconds": time.perf_counter() - started}
+
+
+def delete_corporate_action(conn, action_id: int) -> int:
+    """Remove an action and replay the symbol's positions without it (caller's transaction). Returns rows rebuilt."""
+    from trackerbazaar.positions import rebuild_positions
+
+    row = conn.execute("SELECT symbol FROM corporate_actions WHERE id=?", (action_id,)).fetchone()
+    if row is None:
+        return 0
+    conn.execute("DELETE FROM corporate_actions WHERE id=?", (action_id,))
+    return rebuild_positions(conn, None, [row[0]])
+
+
+def benchmark_adjustments(n_rows: int = 1_000_000, n_symbols: int = 600, n_actions: int = 2_000,
+                          seed: int = 0) -> dict:
+    """Time adjustment_factors() on a synthetic ledger; returns rows, actions, seconds and rows/s."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"S{i}" for i in range(n_symbols)], dtype=object)
+    start = np.datetime64("2010-01-01")
+    actions = pd.DataFrame({
+        "symbol": names[rng.integers(0, n_symbols, n_actions)],
+        "ex_date": (start + rng.integers(0, 5000, n_actions)).astype(str),
+        "factor": rng.choice([2.0, 1.1, 1.25, 0.1], n_actions),
+    })
+    symbols = names[rng.integers(0, n_symbols, n_rows)]
+    days = start + rng.integers(0, 5000, n_rows)
+    started = time.perf_counter()
+    adjustment_factors(actions, symbols, days)
+    seconds = time.perf_counter() - started
+    return {"rows": n_rows, "actions": n_actions, "seconds": seconds, "rows_per_sec": n_rows / seconds}
+
+
+if __name__ == "__main__":
+    print(benchmark_adjustments())
@@ -1,22 +1,21 @@
 # trackerbazaar/current_prices.py
 
-import json
 import os
+from trackerbazaar.price_store import get_price_store
 
-DATA_FILE = os.path.join(os.path.dirname(__file__), "market-data.json")
+# market-data.json lives at the project root, next to the app entry point
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "market-data.json")
 
 class CurrentPrices:
     def __init__(self, data_file: str = DATA_FILE):
         self.data_file = data_file
-        self._load_prices()
+        # Shared, parsed-once store; cheap to construct per page render
+        self.store = get_price_store(data_file)
 
-    def _load_prices(self):
-        if os.path.exists(self.data_file):
-            with open(self.data_file, "r") as f:
-                self.prices = json.load(f)
-        else:
-            self.prices = {}
-
-    def get_price(self, ticker: str) -> float:
+    def get_price(self, ticker: str, market: str = None) -> float:
         """Return the current price of a stock (defaults to 0 if missing)."""
-        return float(self.prices.get(ticker, 0.0))
+        return self.store.get_price(ticker, market)
+
+    def get_prices(self, tickers, market: str = None):
+        """Return current prices for many tickers at once as a NumPy array (0 where missing)."""
+        return self.store.get_prices(tickers, market)
@@ -1,132 +1,93 @@
 # trackerbazaar/dashboard.py
 
-import sqlite3
 import pandas as pd
 import streamlit as st
-from trackerbazaar.data import DB_FILE, init_db
+from trackerbazaar.cache import cached, ledger, user_portfolios
+from trackerbazaar.current_prices import CurrentPrices
+from trackerbazaar.data import get_conn, init_db, metrics_query
+from trackerbazaar.nav import get_nav, last_close_day
+from trackerbazaar.positions import EPS, get_positions
+from trackerbazaar.returns import WINDOWS, portfolio_returns, symbol_returns
+from trackerbazaar.risk import BENCHMARK, exposures, get_returns_matrix, risk_metrics, rolling_volatility
+from trackerbazaar.valuation import summarize, value_positions
 
 
 class DashboardUI:
     def __init__(self, user_email: str):
         self.user_email = user_email
+        self._close_day = None  # last stored close, looked up once per rerun in show()
 
     # ------------------------- helpers -------------------------
 
     def _get_user_portfolios(self):
-        with sqlite3.connect(DB_FILE) as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT id, name FROM portfolios WHERE owner_email=? ORDER BY name",
-                (self.user_email,),
-            )
-            return cur.fetchall()
+        return user_portfolios(self.user_email)
 
-    def _safe_tx_df(self, conn, portfolio_id: int) -> pd.DataFrame:
+    def _ledger_df(self, table: str, portfolio_id: int) -> pd.DataFrame:
         """
-        Load transactions for the portfolio and normalize columns so the rest
-        of the code can rely on: date, symbol, type, quantity, price, fees.
-        Works with old schemas (ticker/transaction_type/brokerage) too.
+        Rows of `table` for the portfolio in canonical columns
+        (transactions: date, symbol, type, quantity, price, fees;
+        dividends: date, symbol, amount; cash: date, amount, note).
+        Old layouts (ticker/transaction_type/brokerage) are mapped by the
+        schema adapter, so this is always a single query.
         """
-        try:
-            # Preferred (new) schema
-            df = pd.read_sql_query(
-                """SELECT date, symbol, type, quantity, price, fees
-                   FROM transactions WHERE portfolio_id=? ORDER BY date""",
-                conn,
-                params=(portfolio_id,),
-            )
-            return df
-        except Exception:
-            # Fallback: load everything and remap columns
-            df = pd.read_sql_query(
-                "SELECT * FROM transactions WHERE portfolio_id=? ORDER BY date",
-                conn,
-                params=(portfolio_id,),
-            )
-
-            # symbol vs ticker
-            if "symbol" not in df.columns and "ticker" in df.columns:
-                df["symbol"] = df["ticker"]
-            elif "symbol" not in df.columns:
-                df["symbol"] = ""
-
-            # type vs transaction_type
-            if "type" not in df.columns and "transaction_type" in df.columns:
-                df["type"] = df["transaction_type"]
-            elif "type" not in df.columns:
-                df["type"] = ""
-
-            # fees vs brokerage
-            if "fees" not in df.columns and "brokerage" in df.columns:
-                df["fees"] = df["brokerage"]
-            elif "fees" not in df.columns:
-                df["fees"] = 0.0
-
-            # Ensure required numeric cols exist
-            for col in ("quantity", "price", "fees"):
-                if col not in df.columns:
-                    df[col] = 0.0
+        return ledger(table, portfolio_id, user=self.user_email)
 
-            if "date" not in df.columns:
-                df["date"] = ""
-
-            # Keep only what we need in the expected order
-            return df[["date", "symbol", "type", "quantity", "price", "fees"]]
-
-    def _safe_div_df(self, conn, portfolio_id: int) -> pd.DataFrame:
+    def _metrics(self, portfolio_id: int) -> dict:
         """
-        Load dividends and normalize columns to: date, symbol, amount.
-        Works with old 'ticker' column too.
+        Headline numbers (transaction count, net invested, cash balance,
+        dividends) aggregated in SQL, so only four numbers leave SQLite.
         """
-        try:
-            df = pd.read_sql_query(
-                """SELECT date, symbol, amount
-                   FROM dividends WHERE portfolio_id=? ORDER BY date""",
-                conn,
-                params=(portfolio_id,),
-            )
-            return df
-        except Exception:
-            df = pd.read_sql_query(
-                "SELECT * FROM dividends WHERE portfolio_id=? ORDER BY date",
-                conn,
-                params=(portfolio_id,),
-            )
-            if "symbol" not in df.columns and "ticker" in df.columns:
-                df["symbol"] = df["ticker"]
-            elif "symbol" not in df.columns:
-                df["symbol"] = ""
-            if "amount" not in df.columns:
-                df["amount"] = 0.0
-            if "date" not in df.columns:
-                df["date"] = ""
-            return df[["date", "symbol", "amount"]]
-
-    def _safe_cash_df(self, conn, portfolio_id: int) -> pd.DataFrame:
-        """
-        Load cash records normalized to: date, amount, note.
-        """
-        try:
-            df = pd.read_sql_query(
-                """SELECT date, amount, COALESCE(note,'') AS note
-                   FROM cash WHERE portfolio_id=? ORDER BY date""",
-                conn,
-                params=(portfolio_id,),
-            )
-            return df
-        except Exception:
-            df = pd.read_sql_query(
-                "SELECT * FROM cash WHERE portfolio_id=? ORDER BY date",
-                conn,
-                params=(portfolio_id,),
-            )
-            if "amount" not in df.columns:
-                df["amount"] = 0.0
-            if "date" not in df.columns:
-                df["date"] = ""
-            if "note" not in df.columns:
-                df["note"] = ""
-            return df[["date", "amount", "note"]]
+        def load():
+            conn = get_conn()
+            row = conn.execute(metrics_query(conn), (portfolio_id,) * 3).fetchone()
+            return dict(zip(("tx_count", "net_invested", "cash_balance", "dividends_total"), row))
+        return cached("metrics", load, user=self.user_email, portfolio_id=portfolio_id)
+
+    def _positions(self, portfolio_id: int) -> pd.DataFrame:
+        """Materialized positions, closed ones included (for realized P&L)."""
+        return cached("positions", lambda: get_positions(portfolio_id, open_only=False),
+                      user=self.user_email, portfolio_id=portfolio_id)
+
+    def _nav(self, portfolio_id: int) -> pd.DataFrame:
+        """Daily NAV series; the rollup is extended (not recomputed) when trades or closes arrive."""
+        return cached("nav", lambda: get_nav(portfolio_id), user=self.user_email,
+                      portfolio_id=portfolio_id, extra=(self._close_day,))
+
+    def _returns(self, portfolio_id: int) -> pd.DataFrame:
+        """TWR / XIRR over every window in one call (one NAV update, one XIRR batch), cached per close day."""
+        return cached("returns", lambda: portfolio_returns([portfolio_id], WINDOWS), user=self.user_email,
+                      portfolio_id=portfolio_id, extra=(self._close_day,))
+
+    def _symbol_returns(self, portfolio_id: int, window: str) -> pd.DataFrame:
+        return cached("symbol_returns", lambda: symbol_returns(portfolio_id, (window,)), user=self.user_email,
+                      portfolio_id=portfolio_id, extra=(window, self._close_day))
+
+    def _valued(self, portfolio_ids, snapshot) -> pd.DataFrame:
+        """Open positions of the given portfolios marked to the price snapshot."""
+        frames = []
+        for pid in portfolio_ids:
+            pos = self._positions(pid)
+            frames.append(pos.loc[pos["net_qty"] > EPS, ["symbol", "net_qty", "cost_basis"]].assign(portfolio_id=pid))
+        return value_positions(pd.concat(frames, ignore_index=True), snapshot)
+
+    def _show_risk(self, valued: pd.DataFrame):
+        """Risk of the current holdings replayed over price history (the returns matrix is shared process-wide)."""
+        state = get_returns_matrix()
+        if not state.dates.size:
+            st.info("No price history yet. Load closes with backfill_prices.py.")
+            return
+        _, matrix, unmodelled = exposures(valued, state.symbols)
+        m = {k: v[0] for k, v in risk_metrics(matrix, state).items()}
+        r1, r2, r3, r4, r5 = st.columns(5)
+        r1.metric("Volatility (ann.)", f"{m['volatility']:.1%}")
+        r2.metric("Max Drawdown", f"{m['max_drawdown']:.1%}")
+        r3.metric(f"Beta vs {BENCHMARK}", "–" if pd.isna(m["beta"]) else f"{m['beta']:.2f}")
+        r4.metric("1-day VaR 95% (hist.)", f"PKR {m['var_historical']:,.0f}")
+        r5.metric("1-day VaR 95% (param.)", f"PKR {m['var_parametric']:,.0f}")
+        window = state.window()
+        st.caption(f"Current holdings replayed over the {len(window)} trading days through {state.dates[-1]}."
+                   + (f" PKR {unmodelled[0]:,.0f} in symbols without price history is left out." if unmodelled[0] else ""))
+        st.line_chart(rolling_volatility(matrix, state)[0].dropna().rename("Rolling volatility (21d, ann.)"))
 
     # --------------------------- UI ----------------------------
 
@@ -148,64 +109,104 @@ class DashboardUI:
         selected_name = st.selectbox("Portfolio", names)
         portfolio_id = [pid for pid, nm in portfolios if nm == selected_name][0]
 
-        with sqlite3.connect(DB_FILE) as conn:
-            tx = self._safe_tx_df(conn, portfolio_id)
-            dv = self._safe_div_df(conn, portfolio_id)
-            cash = self._safe_cash_df(conn, portfolio_id)
+        m = self._metrics(portfolio_id)
+        self._close_day = str(last_close_day())
 
         # ---- Top metrics
         c1, c2, c3, c4 = st.columns(4)
-
-        buys = tx[tx["type"].str.upper() == "BUY"] if not tx.empty else pd.DataFrame()
-        sells = tx[tx["type"].str.upper() == "SELL"] if not tx.empty else pd.DataFrame()
-
-        buys_val = (buys["quantity"] * buys["price"]).sum() if not buys.empty else 0.0
-        sells_val = (sells["quantity"] * sells["price"]).sum() if not sells.empty else 0.0
-        net_invested = buys_val - sells_val
-        cash_balance = cash["amount"].sum() if not cash.empty else 0.0
-        dividends_total = dv["amount"].sum() if not dv.empty else 0.0
-
         c1.metric("Portfolios", len(portfolios))
-        c2.metric("Transactions", 0 if tx.empty else len(tx))
-        c3.metric("Net Invested (PKR)", f"{net_invested:,.0f}")
-        c4.metric("Cash Balance (PKR)", f"{cash_balance:,.0f}")
-        st.caption(f"Dividends received: **PKR {dividends_total:,.0f}**")
-
-        # ---- Holdings snapshot (net quantity + avg buy)
-        st.subheader("Holdings (derived from transactions)")
-        if tx.empty:
+        c2.metric("Transactions", m["tx_count"])
+        c3.metric("Net Invested (PKR)", f"{m['net_invested']:,.0f}")
+        c4.metric("Cash Balance (PKR)", f"{m['cash_balance']:,.0f}")
+        st.caption(f"Dividends received: **PKR {m['dividends_total']:,.0f}**")
+
+        # ---- Holdings (materialized positions, average cost)
+        st.subheader("Holdings")
+        if not m["tx_count"]:
             st.info("No transactions yet.")
             return
 
-        tx = tx.copy()
-        tx["qty_signed"] = tx.apply(
-            lambda r: r["quantity"] if str(r["type"]).upper() == "BUY" else -r["quantity"],
-            axis=1,
-        )
-        net_qty = tx.groupby("symbol", dropna=False)["qty_signed"].sum()
-
-        buys_only = tx[tx["type"].str.upper() == "BUY"].copy()
-        if buys_only.empty:
-            st.info("No BUY transactions to compute holdings.")
-            return
-
-        buys_only["notional"] = buys_only["quantity"] * buys_only["price"]
-        sum_notional = buys_only.groupby("symbol")["notional"].sum()
-        sum_qty = buys_only.groupby("symbol")["quantity"].sum()
-        wavg = (sum_notional / sum_qty).replace([pd.NA, pd.NaT], 0).fillna(0)
-
-        df = pd.DataFrame(
-            {
-                "Symbol": net_qty.index,
-                "Net Quantity": net_qty.values,
-                "Avg Buy Price": wavg.reindex(net_qty.index).fillna(0).values,
-            }
-        )
-
-        df = df[df["Net Quantity"] > 0].sort_values("Symbol").reset_index(drop=True)
-
-        if df.empty:
+        pos = self._positions(portfolio_id)
+        st.caption(f"Realized P&L (incl. closed positions): **PKR {pos['realized_pnl'].sum():,.0f}**")
+        snapshot = CurrentPrices().store.snapshot
+        valued = self._valued([portfolio_id], snapshot)
+        if valued.empty:
             st.info("No open positions at the moment.")
         else:
-            df["Invested (PKR)"] = (df["Net Quantity"] * df["Avg Buy Price"]).round(2)
+            total = summarize(valued).iloc[0]
+            v1, v2, v3 = st.columns(3)
+            v1.metric("Market Value (PKR)", f"{total['market_value']:,.0f}")
+            v2.metric("Unrealized P&L (PKR)", f"{total['unrealized_pnl']:,.0f}", f"{total['unrealized_pct']:.2f}%")
+            v3.metric("Day Change (PKR)", f"{total['day_change']:,.0f}", f"{total['day_change_pct']:.2f}%")
+            if total["unpriced"]:
+                st.caption(f"{int(total['unpriced'])} holding(s) have no current price and are carried at cost.")
+            last_trade = pos.set_index("symbol")["last_trade_date"]
+            df = pd.DataFrame(
+                {
+                    "Symbol": valued["symbol"],
+                    "Net Quantity": valued["quantity"],
+                    "Avg Cost": valued["avg_cost"].round(4),
+                    "Price": valued["price"],
+                    "Cost Basis (PKR)": valued["cost_basis"].round(2),
+                    "Market Value (PKR)": valued["market_value"].round(2),
+                    "Unrealized P&L (PKR)": valued["unrealized_pnl"].round(2),
+                    "Day Change (PKR)": valued["day_change"].round(2),
+                    "Weight": (valued["weight"] * 100).round(2).astype(str) + "%",
+                    "Last Trade": valued["symbol"].map(last_trade),
+                }
+            )
             st.dataframe(df, use_container_width=True)
+
+        # ---- Daily NAV
+        st.subheader("NAV")
+        nav = self._nav(portfolio_id)
+        if nav.empty:
+            st.info("No NAV history yet.")
+        else:
+            chart = nav.set_index(pd.to_datetime(nav["date"]))[["nav", "holdings_value", "cash_balance"]]
+            st.line_chart(chart.rename(columns={"nav": "NAV", "holdings_value": "Holdings",
+                                               "cash_balance": "Cash"}))
+            st.caption(f"NAV on {nav['date'].iloc[-1]}: **PKR {nav['nav'].iloc[-1]:,.0f}** "
+                       "(holdings at the last close, plus cash, dividends and trade flows)")
+
+        # ---- Returns: time-weighted and money-weighted, per window
+        if not nav.empty:
+            st.subheader("Returns")
+            ret = self._returns(portfolio_id)
+            st.dataframe(pd.DataFrame({
+                "Window": ret["window"],
+                "From": ret["start"],
+                "To": ret["end"],
+                "TWR": ret["twr"].map("{:.2%}".format),
+                "XIRR": ret["xirr"].map(lambda x: "–" if pd.isna(x) else f"{x:.2%}"),
+            }), use_container_width=True, hide_index=True)
+            basis = "the whole account (cash entries as flows)" if ret["basis"].iloc[0] == "account" \
+                else "holdings (trade spend as flows, dividends as income)"
+            st.caption(f"Measured on {basis}. XIRR is annualized for windows of a year or more.")
+            if st.checkbox("Returns by symbol"):
+                window = st.selectbox("Window", WINDOWS, key="symbol_returns_window")
+                by_symbol = self._symbol_returns(portfolio_id, window)
+                st.dataframe(pd.DataFrame({
+                    "Symbol": by_symbol["symbol"],
+                    "TWR %": (by_symbol["twr"] * 100).round(2),
+                    "XIRR %": (by_symbol["xirr"] * 100).round(2),
+                }), use_container_width=True, hide_index=True)
+
+        # ---- Risk of the current holdings (first use builds the returns matrix)
+        if not valued.empty and st.checkbox("Show risk (volatility, drawdown, beta, VaR)"):
+            st.subheader("Risk")
+            self._show_risk(valued)
+
+        # ---- Every portfolio the user owns, valued in the same pass
+        if len(portfolios) > 1:
+            with st.expander("All portfolios"):
+                summary = summarize(self._valued([pid for pid, _ in portfolios], snapshot))
+                summary.insert(0, "portfolio", summary["portfolio_id"].map(dict(portfolios)))
+                st.dataframe(summary.drop(columns="portfolio_id").round(2), use_container_width=True)
+
+        # ---- Detail rows are only loaded when asked for
+        if st.checkbox("Show transaction, dividend and cash rows"):
+            t1, t2, t3 = st.tabs(["Transactions", "Dividends", "Cash"])
+            t1.dataframe(self._ledger_df("transactions", portfolio_id), use_container_width=True)
+            t2.dataframe(self._ledger_df("dividends", portfolio_id), use_container_width=True)
+            t3.dataframe(self._ledger_df("cash", portfolio_id), use_container_width=True)
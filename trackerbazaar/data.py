@@ -1,9 +1,20 @@
 # trackerbazaar/data.py
 import sqlite3
+import threading
 
 # Single source of truth for the DB filename
 DB_FILE = "trackerbazaar_v3.db"
 
+# Applied to every connection handed out by get_conn()
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",          # readers don't block the writer (persisted in the file)
+    "PRAGMA busy_timeout=5000",         # wait on a locked DB instead of failing straight away
+    "PRAGMA synchronous=NORMAL",        # safe with WAL, far fewer fsyncs than FULL
+    "PRAGMA cache_size=-16000",         # ~16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",       # map up to 256 MB of the DB file
+    "PRAGMA temp_store=MEMORY",
+)
+
 # Base CREATE TABLE DDLs (new installs will have the latest schema)
 TABLES = {
     "users": """
@@ -51,36 +62,573 @@ TABLES = {
             note TEXT,
             FOREIGN KEY (portfolio_id) REFERENCES portfolios(id)
         );
-    """
+    """,
+    # Materialized from transactions by trackerbazaar.positions (average cost)
+    "positions": """
+        CREATE TABLE IF NOT EXISTS positions (
+            portfolio_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            net_qty REAL NOT NULL DEFAULT 0,
+            cost_basis REAL NOT NULL DEFAULT 0,
+            realized_pnl REAL NOT NULL DEFAULT 0,
+            last_trade_date TEXT,
+            PRIMARY KEY (portfolio_id, symbol)
+        ) WITHOUT ROWID;
+    """,
+    # Write counters per scope ('p:<portfolio_id>', 'u:<owner_email>', 's:<symbol>'), bumped by
+    # the triggers below in the writing transaction; read by trackerbazaar.cache
+    "data_versions": """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+    """,
+    # Daily NAV rollups written by trackerbazaar.nav; rows after the
+    # portfolio's nav_state.valid_through are stale and get recomputed
+    "nav_daily": """
+        CREATE TABLE IF NOT EXISTS nav_daily (
+            portfolio_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            holdings_value REAL NOT NULL,
+            cash_balance REAL NOT NULL,
+            nav REAL NOT NULL,
+            external_flow REAL NOT NULL DEFAULT 0,
+            trade_flow REAL NOT NULL DEFAULT 0,
+            dividends REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (portfolio_id, date)
+        ) WITHOUT ROWID;
+    """,
+    "nav_state": """
+        CREATE TABLE IF NOT EXISTS nav_state (
+            portfolio_id INTEGER PRIMARY KEY,
+            valid_through TEXT NOT NULL,
+            checkpoint_date TEXT,
+            checkpoint_cash REAL
+        );
+    """,
+    # Per-symbol state on nav_state.checkpoint_date, so extending the series
+    # doesn't re-aggregate the whole ledger
+    "nav_checkpoint": """
+        CREATE TABLE IF NOT EXISTS nav_checkpoint (
+            portfolio_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            trade_price REAL,
+            close REAL,
+            PRIMARY KEY (portfolio_id, symbol)
+        ) WITHOUT ROWID;
+    """,
+    # Splits, bonus issues and rights issues per symbol (shared by every user);
+    # trackerbazaar.corporate_actions turns them into ledger adjustment factors
+    "corporate_actions": """
+        CREATE TABLE IF NOT EXISTS corporate_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            ex_date TEXT NOT NULL,
+            type TEXT NOT NULL CHECK(type IN ('SPLIT','BONUS','RIGHTS')),
+            ratio REAL NOT NULL CHECK(ratio > 0),
+            price REAL DEFAULT 0,
+            note TEXT,
+            UNIQUE (symbol, ex_date, type)
+        );
+    """,
+}
+
+# table -> data_versions scope expression for a row (NEW/OLD substituted in)
+VERSIONED_TABLES = {
+    "portfolios": "'u:' || {row}.owner_email",
+    "transactions": "'p:' || {row}.portfolio_id",
+    "dividends": "'p:' || {row}.portfolio_id",
+    "cash": "'p:' || {row}.portfolio_id",
+    "positions": "'p:' || {row}.portfolio_id",
+    "corporate_actions": "'s:' || {row}.symbol",
 }
 
+# Read queries issued by the UI pages. Kept here so check_query_plans() can
+# verify every one of them is served by an index.
+QUERIES = {
+    "user_portfolios": "SELECT id, name FROM portfolios WHERE owner_email=? ORDER BY name",
+    "user_lookup": "SELECT password_hash FROM users WHERE email=?",
+    "transactions_ledger": """SELECT date, symbol, type, quantity, price, fees
+                              FROM transactions WHERE portfolio_id=? ORDER BY date""",
+    "transactions_history": """SELECT date, symbol, type, quantity, price, fees
+                               FROM transactions WHERE portfolio_id=? ORDER BY date DESC""",
+    "dividends_ledger": """SELECT date, symbol, amount
+                           FROM dividends WHERE portfolio_id=? ORDER BY date""",
+    "dividends_history": """SELECT date, symbol, amount
+                            FROM dividends WHERE portfolio_id=? ORDER BY date DESC""",
+    "cash_ledger": """SELECT date, amount, COALESCE(note,'') AS note
+                      FROM cash WHERE portfolio_id=? ORDER BY date""",
+    "cash_history": """SELECT date, amount, COALESCE(note,'') AS note
+                       FROM cash WHERE portfolio_id=? ORDER BY date DESC""",
+    # Dashboard headline numbers in one round trip; pass the portfolio id three times
+    "dashboard_metrics": """SELECT COUNT(*) AS tx_count,
+                                   COALESCE(SUM(CASE UPPER(type) WHEN 'BUY' THEN quantity * price
+                                                                 WHEN 'SELL' THEN -quantity * price END), 0) AS net_invested,
+                                   (SELECT COALESCE(SUM(amount), 0) FROM cash WHERE portfolio_id=?) AS cash_balance,
+                                   (SELECT COALESCE(SUM(amount), 0) FROM dividends WHERE portfolio_id=?) AS dividends_total
+                            FROM transactions WHERE portfolio_id=?""",
+}
+
+# Covering indexes: (table, leading filter/sort columns + every projected column)
+INDEXES = {
+    "idx_portfolios_owner": ("portfolios", ["owner_email", "name"]),
+    "idx_transactions_portfolio_date": ("transactions", ["portfolio_id", "date", "symbol", "type", "quantity", "price", "fees"]),
+    "idx_dividends_portfolio_date": ("dividends", ["portfolio_id", "date", "symbol", "amount"]),
+    "idx_cash_portfolio_date": ("cash", ["portfolio_id", "date", "amount", "note"]),
+}
+
+# Keyset pagination on (date, id), newest first, optionally within one symbol
+KEYSET_INDEXES = {
+    "idx_transactions_page": ("transactions", ["portfolio_id", "date", "id"]),
+    "idx_transactions_symbol_page": ("transactions", ["portfolio_id", "symbol", "date", "id"]),
+    "idx_dividends_page": ("dividends", ["portfolio_id", "date", "id"]),
+    "idx_dividends_symbol_page": ("dividends", ["portfolio_id", "symbol", "date", "id"]),
+    "idx_cash_page": ("cash", ["portfolio_id", "date", "id"]),
+}
+
+# ---------------------------- connection manager ----------------------------
+
+_local = threading.local()
+_owners = {}                   # thread -> {path: conn} handed out to it, so close_connections() reaches all threads
+_idle = {}                     # path -> connections of finished threads, reused before opening new ones
+_registry_lock = threading.Lock()
+_generation = 0                # bumped by close_connections(); stale thread-local conns are reopened
+_stats = {"connections": 0, "reused": 0, "queries": 0}
+_stats_lock = threading.Lock()
+
+
+def _count_statement(_sql):
+    with _stats_lock:
+        _stats["queries"] += 1
+
+
+def _reclaim():
+    """Move connections of threads that have exited into the idle pool (call with _registry_lock held)."""
+    for thread in [t for t in _owners if not t.is_alive()]:
+        for path, conn in _owners.pop(thread).items():
+            try:
+                conn.rollback()  # a thread that died mid-transaction must not leave it open
+            except sqlite3.Error:
+                conn.close()
+                continue
+            _idle.setdefault(path, []).append(conn)
+
+
+def _open(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.execute("PRAGMA optimize=0x10002")  # refresh stale planner stats on open
+    conn.set_trace_callback(_count_statement)
+    return conn
+
+
+def get_conn(path: str = None) -> sqlite3.Connection:
+    """
+    Return this thread's cached connection to `path` (default DB_FILE).
+
+    Connections are opened with WAL and the PRAGMAS above and kept for the
+    thread's lifetime, so callers keep the usual pattern::
+
+        with get_conn() as conn:   # commits on success, rolls back on error
+            conn.execute(...)
+
+    but must not close the connection themselves. When a thread exits (a
+    Streamlit rerun runs on a fresh thread) its connections go back to a
+    pool and are handed to the next thread, so the number of open
+    connections stays at the number of live threads.
+    """
+    path = path or DB_FILE
+    conns = getattr(_local, "conns", None)
+    if conns is None or getattr(_local, "generation", None) != _generation:
+        conns = _local.conns = {}
+        _local.generation = _generation
+    conn = conns.get(path)
+    if conn is None:
+        with _registry_lock:
+            _reclaim()
+            pool = _idle.get(path)
+            reused = bool(pool)
+            conn = pool.pop() if reused else _open(path)
+            _owners.setdefault(threading.current_thread(), {})[path] = conn
+        with _stats_lock:
+            _stats["reused" if reused else "connections"] += 1
+        conns[path] = conn
+    return conn
+
+
+def close_connections():
+    """Close every cached connection in every thread (e.g. before deleting the DB file)."""
+    global _generation
+    with _registry_lock:
+        _generation += 1
+        _schema_version.clear()  # the file may be deleted/replaced next
+        _projections.clear()
+        for conn in [c for conns in _owners.values() for c in conns.values()] + \
+                    [c for pool in _idle.values() for c in pool]:
+            try:
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _owners.clear()
+        _idle.clear()
+
+
+def db_stats() -> dict:
+    """Connections opened (and reused from finished threads) and SQL statements executed through get_conn() so far."""
+    with _stats_lock:
+        return dict(_stats)
+
+
 def _has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
     cur = conn.cursor()
     cur.execute(f"PRAGMA table_info({table})")
     cols = [row[1] for row in cur.fetchall()]
     return column in cols
 
-def init_db():
-    """Create tables (if missing) and run lightweight migrations."""
-    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-    cur = conn.cursor()
+def _add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, decl: str):
+    if not _has_column(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
 
-    # Create base tables
-    for ddl in TABLES.values():
-        cur.execute(ddl.strip())
+# -------------------------------- migrations --------------------------------
+# Each step runs once per database, in order, inside one transaction with
+# the PRAGMA user_version bump. Steps must be idempotent: databases created
+# before versioning start at user_version 0 and replay every step.
 
-    # ---- Migrations / Backward compatibility ----
-    # Some older DBs might not have these columns. Add them if missing.
+def _m001_base_tables(conn):
+    # Frozen at the original schema: every later table is created by its own step
+    for name in ("users", "portfolios", "transactions", "dividends", "cash"):
+        conn.execute(TABLES[name].strip())
 
-    # portfolios.owner_email (should exist, but ensure it)
-    if not _has_column(conn, "portfolios", "owner_email"):
-        cur.execute("ALTER TABLE portfolios ADD COLUMN owner_email TEXT DEFAULT ''")
+def _m002_legacy_columns(conn):
+    # Older DBs predate portfolios.owner_email and cash.note
+    _add_column_if_missing(conn, "portfolios", "owner_email", "TEXT DEFAULT ''")
+    _add_column_if_missing(conn, "cash", "note", "TEXT")
 
-    # cash.note (your current error)
-    if not _has_column(conn, "cash", "note"):
-        cur.execute("ALTER TABLE cash ADD COLUMN note TEXT")
+def _create_indexes(conn, indexes: dict):
+    for name, (table, columns) in indexes.items():
+        # Legacy layouts (ticker/brokerage/...) get the columns they actually have
+        present = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        cols = [c for c in columns if c in present]
+        if cols:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(cols)})")
+    conn.execute("ANALYZE")
 
-    # You can add more migrations here if needed in the future.
+def _m003_covering_indexes(conn):
+    _create_indexes(conn, INDEXES)
 
+def _m004_positions(conn):
+    conn.execute(TABLES["positions"].strip())
+    # Seed from the existing ledger; legacy layouts without symbol/type can't be replayed.
+    # Corporate actions (migration 9) don't exist yet, so there is nothing to restate.
+    if _has_column(conn, "transactions", "symbol") and _has_column(conn, "transactions", "type"):
+        from trackerbazaar.positions import rebuild_positions
+        rebuild_positions(conn, restate=False)
+
+def _version_triggers(tables=None):
+    """AFTER INSERT/UPDATE/DELETE triggers bumping data_versions for VERSIONED_TABLES rows (all tables by default)."""
+    for table in tables or VERSIONED_TABLES:
+        scope = VERSIONED_TABLES[table]
+        for op, rows in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            body = " ".join(
+                f"INSERT INTO data_versions (scope, version) VALUES ({scope.format(row=row)}, 1) "
+                "ON CONFLICT(scope) DO UPDATE SET version = version + 1;"
+                for row in rows
+            )
+            yield (f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version "
+                   f"AFTER {op} ON {table} BEGIN {body} END;")
+
+def _m005_data_versions(conn):
+    conn.execute(TABLES["data_versions"].strip())
+    for ddl in _version_triggers(("portfolios", "transactions", "dividends", "cash", "positions")):
+        conn.execute(ddl)
+
+def _m006_keyset_indexes(conn):
+    _create_indexes(conn, KEYSET_INDEXES)
+
+def _m007_import_hash(conn):
+    # Set by trackerbazaar.importer; NULL for hand-entered trades (NULLs don't collide)
+    _add_column_if_missing(conn, "transactions", "content_hash", "TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_content_hash "
+                 "ON transactions(content_hash)")
+
+def _nav_triggers():
+    """Ledger writes dated on or before a portfolio's NAV watermark pull it back to the day before."""
+    for table in ("transactions", "dividends", "cash"):
+        for op, rows in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            body = " ".join(
+                f"UPDATE nav_state SET valid_through = date({row}.date, '-1 day') "
+                f"WHERE portfolio_id = {row}.portfolio_id AND valid_through >= date({row}.date);"
+                for row in rows
+            )
+            yield (f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_nav "
+                   f"AFTER {op} ON {table} BEGIN {body} END;")
+
+def _m008_nav_rollups(conn):
+    conn.execute(TABLES["nav_daily"].strip())
+    conn.execute(TABLES["nav_state"].strip())
+    conn.execute(TABLES["nav_checkpoint"].strip())
+    for ddl in _nav_triggers():
+        conn.execute(ddl)
+
+def _action_triggers():
+    """Corporate actions restate a symbol from its ex-date: pull back the NAV watermark of every portfolio holding it."""
+    for op, rows in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+        body = " ".join(
+            f"UPDATE nav_state SET valid_through = date({row}.ex_date, '-1 day') "
+            f"WHERE valid_through >= date({row}.ex_date) "
+            f"AND portfolio_id IN (SELECT portfolio_id FROM positions WHERE symbol = {row}.symbol);"
+            for row in rows
+        )
+        yield (f"CREATE TRIGGER IF NOT EXISTS trg_corporate_actions_{op.lower()}_nav "
+               f"AFTER {op} ON corporate_actions BEGIN {body} END;")
+
+def _m009_corporate_actions(conn):
+    conn.execute(TABLES["corporate_actions"].strip())
+    for ddl in _version_triggers(("corporate_actions",)):
+        conn.execute(ddl)
+    for ddl in _action_triggers():
+        conn.execute(ddl)
+
+MIGRATIONS = [
+    (1, _m001_base_tables),
+    (2, _m002_legacy_columns),
+    (3, _m003_covering_indexes),
+    (4, _m004_positions),
+    (5, _m005_data_versions),
+    (6, _m006_keyset_indexes),
+    (7, _m007_import_hash),
+    (8, _m008_nav_rollups),
+    (9, _m009_corporate_actions),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_schema_version = {}   # DB path -> user_version confirmed in this process
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending MIGRATIONS to `conn`. Returns the resulting user_version."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current >= SCHEMA_VERSION:
+        return current
     conn.commit()
-    conn.close()
+    conn.execute("BEGIN IMMEDIATE")  # one migrator at a time across processes
+    try:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, step in MIGRATIONS:
+            if version > current:
+                step(conn)
+                conn.execute(f"PRAGMA user_version={version}")
+                current = version
+        conn.commit()
+        _projections.clear()  # steps may have added columns
+    except BaseException:
+        conn.rollback()
+        raise
+    return current
+
+def init_db(force: bool = False):
+    """
+    Bring the schema up to SCHEMA_VERSION. After the first successful call
+    in a process this is a single integer comparison, so it is safe to call
+    on every rerun and from every page.
+    """
+    path = DB_FILE
+    if not force and _schema_version.get(path) == SCHEMA_VERSION:
+        return
+    _schema_version[path] = migrate(get_conn(path))
+
+
+# ------------------------------ schema adapter ------------------------------
+# Databases from older app versions name some ledger columns differently.
+# The adapter inspects each table once per process and builds a projection
+# that always yields the canonical columns, so pages issue one query that
+# works on either layout instead of trying and falling back.
+
+# table -> canonical column -> (legacy spellings, default when absent)
+LEDGER_COLUMNS = {
+    "transactions": {
+        "date": ((), "''"),
+        "symbol": (("ticker",), "''"),
+        "type": (("transaction_type",), "''"),
+        "quantity": ((), "0"),
+        "price": ((), "0"),
+        "fees": (("brokerage",), "0"),
+    },
+    "dividends": {
+        "date": ((), "''"),
+        "symbol": (("ticker",), "''"),
+        "amount": ((), "0"),
+    },
+    "cash": {
+        "date": ((), "''"),
+        "amount": ((), "0"),
+        "note": ((), "''"),
+    },
+}
+
+_projections = {}  # (DB path, table) -> {canonical column: SQL expression}
+
+
+def table_projection(table: str, conn: sqlite3.Connection = None, path: str = None) -> dict:
+    """
+    Canonical column -> SQL expression for `table` in this database,
+    e.g. {"symbol": "ticker", "fees": "0", ...} on a legacy layout.
+    Introspected once per process and DB file.
+    """
+    path = path or DB_FILE
+    key = (path, table)
+    proj = _projections.get(key)
+    if proj is None:
+        conn = conn or get_conn(path)
+        present = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        proj = {}
+        for col, (legacy, default) in LEDGER_COLUMNS[table].items():
+            source = next((c for c in (col, *legacy) if c in present), None)
+            proj[col] = source or default
+        _projections[key] = proj
+    return proj
+
+
+def is_canonical(table: str, conn: sqlite3.Connection = None, path: str = None) -> bool:
+    return all(expr == col for col, expr in table_projection(table, conn, path).items())
+
+
+def ledger_query(table: str, descending: bool = False, conn: sqlite3.Connection = None, path: str = None) -> str:
+    """
+    One portfolio's rows of `table` in canonical columns, ordered by date.
+    The current layout gets the index-checked QUERIES entry verbatim.
+    """
+    name = f"{table}_{'history' if descending else 'ledger'}"
+    if is_canonical(table, conn, path):
+        return QUERIES[name]
+    proj = table_projection(table, conn, path)
+    select = ", ".join(col if expr == col else f"{expr} AS {col}" for col, expr in proj.items())
+    return (f"SELECT {select} FROM {table} WHERE portfolio_id=? "
+            f"ORDER BY date{' DESC' if descending else ''}")
+
+
+def metrics_query(conn: sqlite3.Connection = None, path: str = None) -> str:
+    """QUERIES['dashboard_metrics'] adapted to this database's column names."""
+    if all(is_canonical(t, conn, path) for t in LEDGER_COLUMNS):
+        return QUERIES["dashboard_metrics"]
+    tx = table_projection("transactions", conn, path)
+    return f"""SELECT COUNT(*) AS tx_count,
+                      COALESCE(SUM(CASE UPPER({tx['type']}) WHEN 'BUY' THEN {tx['quantity']} * {tx['price']}
+                                   WHEN 'SELL' THEN -{tx['quantity']} * {tx['price']} END), 0) AS net_invested,
+                      (SELECT COALESCE(SUM({table_projection('cash', conn, path)['amount']}), 0)
+                         FROM cash WHERE portfolio_id=?) AS cash_balance,
+                      (SELECT COALESCE(SUM({table_projection('dividends', conn, path)['amount']}), 0)
+                         FROM dividends WHERE portfolio_id=?) AS dividends_total
+               FROM transactions WHERE portfolio_id=?"""
+
+
+def _filter_clauses(proj: dict, filters: dict) -> tuple:
+    """WHERE terms and params for optional symbol / start / end (inclusive ISO dates) filters."""
+    where, params = [], []
+    if filters.get("symbol") and "symbol" in proj:
+        where.append(f"{proj['symbol']}=?")
+        params.append(filters["symbol"])
+    if filters.get("start"):
+        where.append("date>=?")
+        params.append(str(filters["start"]))
+    if filters.get("end"):
+        where.append("date<=?")
+        params.append(str(filters["end"]))
+    return where, params
+
+
+def ledger_page_sql(table: str, filters: dict = None, after: bool = False,
+                    conn: sqlite3.Connection = None, path: str = None) -> tuple:
+    """
+    ``(sql, columns, filter_params)`` for one keyset page of `table`. Bind
+    as (portfolio_id, *filter_params, [cursor date, cursor id,] limit).
+    """
+    proj = table_projection(table, conn, path)
+    select = ", ".join(
+        ["id"] + [
+            f"COALESCE({expr}, '') AS {col}" if col == "note"
+            else col if expr == col else f"{expr} AS {col}"
+            for col, expr in proj.items()
+        ]
+    )
+    where, params = _filter_clauses(proj, filters or {})
+    where.insert(0, "portfolio_id=?")
+    if after:
+        where.append("(date, id) < (?, ?)")
+    sql = (f"SELECT {select} FROM {table} WHERE {' AND '.join(where)} "
+           f"ORDER BY date DESC, id DESC LIMIT ?")
+    return sql, ["id"] + list(proj), params
+
+
+def ledger_page(table: str, portfolio_id: int, page_size: int = 50, after=None, filters: dict = None,
+                conn: sqlite3.Connection = None, path: str = None) -> tuple:
+    """
+    One page of `table`, newest first, by keyset on (date, id): `after` is
+    the (date, id) of the previous page's last row. Filters (symbol, start,
+    end) are pushed into the WHERE clause. Returns
+    ``(rows, columns, next_cursor)``; next_cursor is None on the last page.
+    """
+    conn = conn or get_conn(path)
+    sql, cols, params = ledger_page_sql(table, filters, after is not None, conn, path)
+    cursor = tuple(after) if after is not None else ()
+    # One extra row tells us whether there is a next page
+    rows = conn.execute(sql, (portfolio_id, *params, *cursor, page_size + 1)).fetchall()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][cols.index("date")], rows[-1][0])
+    return rows, cols, next_cursor
+
+
+# table -> aggregate select list over its canonical columns (formatted with the projection)
+LEDGER_TOTALS = {
+    "transactions": """COUNT(*) AS rows,
+                       COALESCE(SUM(CASE WHEN UPPER({type})='BUY' THEN {quantity} * {price} END), 0) AS bought,
+                       COALESCE(SUM(CASE WHEN UPPER({type})='SELL' THEN {quantity} * {price} END), 0) AS sold,
+                       COALESCE(SUM({fees}), 0) AS fees""",
+    "dividends": "COUNT(*) AS rows, COALESCE(SUM({amount}), 0) AS amount",
+    "cash": "COUNT(*) AS rows, COALESCE(SUM({amount}), 0) AS amount",
+}
+
+
+def ledger_totals(table: str, portfolio_id: int, filters: dict = None,
+                  conn: sqlite3.Connection = None, path: str = None) -> dict:
+    """Row count and amount totals over the (filtered) rows of `table`, aggregated in SQL."""
+    conn = conn or get_conn(path)
+    proj = table_projection(table, conn, path)
+    where, params = _filter_clauses(proj, filters or {})
+    where.insert(0, "portfolio_id=?")
+    params.insert(0, portfolio_id)
+    cur = conn.execute(
+        f"SELECT {LEDGER_TOTALS[table].format(**proj)} FROM {table} WHERE {' AND '.join(where)}", params
+    )
+    return dict(zip([d[0] for d in cur.description], cur.fetchone()))
+
+
+def check_query_plans(conn: sqlite3.Connection = None) -> list:
+    """
+    EXPLAIN QUERY PLAN every entry in QUERIES, plus the keyset page queries
+    with each kind of filter, and flag full-table scans and sorts through a
+    temp B-tree. Returns [(name, ok, plan_details), ...].
+    """
+    conn = conn or get_conn()
+    statements = list(QUERIES.items())
+    for table in LEDGER_TOTALS:
+        for label, filters in (("", {}), (":symbol", {"symbol": "X"}), (":dates", {"start": "0", "end": "9"})):
+            if label == ":symbol" and "symbol" not in LEDGER_COLUMNS[table]:
+                continue
+            statements.append((f"{table}_page{label}", ledger_page_sql(table, filters, True, conn)[0]))
+    results = []
+    for name, sql in statements:
+        params = (None,) * sql.count("?")
+        details = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        bad = [
+            d for d in details
+            if (d.startswith("SCAN ") and "INDEX" not in d) or "TEMP B-TREE" in d
+        ]
+        results.append((name, not bad, details))
+    return results
@@ -1,9 +1,9 @@
-import sqlite3
+from trackerbazaar.data import get_conn
 
 DB_FILE = "trackerbazaar_v2.db"  # ✅ new DB
 
 def init_distribution_table():
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_conn(DB_FILE) as conn:
         c = conn.cursor()
         c.execute("""
             CREATE TABLE IF NOT EXISTS distributions (
@@ -18,7 +18,7 @@ def init_distribution_table():
         conn.commit()
 
 def add_distribution(email, portfolio_name, ticker, amount, timestamp):
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_conn(DB_FILE) as conn:
         c = conn.cursor()
         c.execute(
             "INSERT INTO distributions (email, portfolio_name, ticker, amount, timestamp) VALUES (?,?,?,?,?)",
@@ -27,7 +27,7 @@ def add_distribution(email, portfolio_name, ticker, amount, timestamp):
         conn.commit()
 
 def get_distributions(email, portfolio_name):
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_conn(DB_FILE) as conn:
         c = conn.cursor()
         c.execute(
             "SELECT ticker, amount, timestamp FROM distributions WHERE email=? AND portfolio_name=? ORDER BY id DESC",
@@ -1,8 +1,8 @@
-import sqlite3
-import pandas as pd
 import streamlit as st
 from datetime import date
-from trackerbazaar.data import DB_FILE, init_db
+from trackerbazaar.cache import note_write, user_portfolios
+from trackerbazaar.data import get_conn, init_db
+from trackerbazaar.history_view import show_history
 
 
 class DividendsUI:
@@ -10,13 +10,7 @@ class DividendsUI:
         self.user_email = user_email
 
     def _user_portfolios(self):
-        with sqlite3.connect(DB_FILE) as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT id, name FROM portfolios WHERE owner_email=? ORDER BY name",
-                (self.user_email,),
-            )
-            return cur.fetchall()
+        return user_portfolios(self.user_email)
 
     def show(self):
         st.header("💰 Dividends")
@@ -50,7 +44,7 @@ class DividendsUI:
                     st.warning("Enter a symbol.")
                 else:
                     try:
-                        with sqlite3.connect(DB_FILE) as conn:
+                        with get_conn() as conn:
                             cur = conn.cursor()
                             cur.execute(
                                 """INSERT INTO dividends (portfolio_id, date, symbol, amount)
@@ -58,6 +52,7 @@ class DividendsUI:
                                 (portfolio_id, str(dv_date), symbol, amount),
                             )
                             conn.commit()
+                        note_write()
                         st.success("Dividend added.")
                         try:
                             st.rerun()
@@ -67,15 +62,6 @@ class DividendsUI:
                         st.error(f"Failed to add dividend: {e}")
 
         # List dividends
-        with sqlite3.connect(DB_FILE) as conn:
-            df = pd.read_sql_query(
-                """SELECT date, symbol, amount
-                   FROM dividends WHERE portfolio_id=? ORDER BY date DESC""",
-                conn,
-                params=(portfolio_id,),
-            )
-        st.subheader("History")
-        if df.empty:
-            st.info("No dividends recorded.")
-        else:
-            st.dataframe(df, use_container_width=True)
+        totals = show_history("dividends", portfolio_id, self.user_email, "No dividends recorded.")
+        if totals["rows"]:
+            st.caption(f"Total: **PKR {totals['amount']:,.0f}**")
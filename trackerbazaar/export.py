@@ -0,0 +1,244 @@
+# trackerbazaar/export.py
+
+import csv
+import os
+import re
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from trackerbazaar import data
+
+CHUNK_ROWS = 50_000
+EXPORT_DIR = "exports"
+BACKUP_DIR = "backups"
+FORMATS = ("csv", "parquet")
+
+# Online backup: pages copied per step (~4 MB at 4 KB pages) and the pause
+# between steps, during which other connections can take the write lock
+BACKUP_PAGES = 1024
+BACKUP_PAUSE = 0.005
+MAX_RESTARTS = 3
+
+# Exported columns and their types, per table (portfolio_id/portfolio lead every table)
+EXPORT_COLUMNS = {
+    "transactions": {"id": "int", "date": "str", "symbol": "str", "type": "str",
+                     "quantity": "float", "price": "float", "fees": "float"},
+    "cash": {"id": "int", "date": "str", "amount": "float", "note": "str"},
+    "dividends": {"id": "int", "date": "str", "symbol": "str", "amount": "float"},
+    "positions": {"symbol": "str", "net_qty": "float", "cost_basis": "float",
+                  "realized_pnl": "float", "last_trade_date": "str"},
+}
+EXPORT_TABLES = tuple(EXPORT_COLUMNS)
+_LEAD = {"portfolio_id": "int", "portfolio": "str"}
+
+
+@contextmanager
+def snapshot(path: str = None):
+    """
+    A private read-only connection holding one read transaction, so every
+    table exported through it reflects the same point in time. Under WAL
+    this doesn't block writers.
+    """
+    conn = sqlite3.connect(path or data.DB_FILE)
+    try:
+        conn.execute("PRAGMA query_only=1")
+        conn.execute("BEGIN")
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1")  # BEGIN is deferred; pin the snapshot now
+        yield conn
+    finally:
+        conn.close()
+
+
+def _select(table: str, conn: sqlite3.Connection, path: str) -> str:
+    """One portfolio's rows in export order, served by the keyset / primary key indexes."""
+    if table == "positions":
+        cols = ", ".join(EXPORT_COLUMNS["positions"])
+        return f"SELECT ?, ?, {cols} FROM positions WHERE portfolio_id=? ORDER BY symbol"
+    proj = data.table_projection(table, conn, path)
+    cols = ", ".join(f"{expr} AS {col}" for col, expr in proj.items())
+    return f"SELECT ?, ?, rowid AS id, {cols} FROM {table} WHERE portfolio_id=? ORDER BY date, rowid"
+
+
+def _frame(rows: list, table: str) -> pd.DataFrame:
+    types = {**_LEAD, **EXPORT_COLUMNS[table]}
+    df = pd.DataFrame(rows, columns=list(types))
+    for col, kind in types.items():
+        if kind == "float":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        elif kind == "int":
+            df[col] = df[col].astype("int64")
+        else:
+            df[col] = df[col].astype("string")
+    return df
+
+
+def _iter_rows(table: str, conn: sqlite3.Connection, user_email: str = None,
+               chunk_rows: int = CHUNK_ROWS, path: str = None):
+    """Lists of at most `chunk_rows` raw row tuples, read with fetchmany."""
+    if table not in EXPORT_COLUMNS:
+        raise ValueError(f"Unknown export table {table!r}; expected one of {EXPORT_TABLES}")
+    if user_email:
+        portfolios = conn.execute(data.QUERIES["user_portfolios"], (user_email,)).fetchall()
+    else:
+        portfolios = conn.execute("SELECT id, name FROM portfolios ORDER BY id").fetchall()
+    sql = _select(table, conn, path or data.DB_FILE)
+
+    buf = []
+    for pid, name in portfolios:
+        cur = conn.execute(sql, (pid, name, pid))
+        while rows := cur.fetchmany(chunk_rows - len(buf)):
+            buf.extend(rows)
+            if len(buf) >= chunk_rows:
+                yield buf
+                buf = []
+    if buf:
+        yield buf
+
+
+def iter_export(table: str, conn: sqlite3.Connection, user_email: str = None,
+                chunk_rows: int = CHUNK_ROWS, path: str = None):
+    """
+    Yield `table` for the user's portfolios (every portfolio when None) as
+    DataFrame chunks of at most `chunk_rows` rows, so memory stays flat
+    however large the ledger is.
+    """
+    for rows in _iter_rows(table, conn, user_email, chunk_rows, path):
+        yield _frame(rows, table)
+
+
+# ---- writers
+
+def _write_csv(conn, table: str, dest: str, user_email: str, chunk_rows: int, path: str) -> int:
+    # Raw tuples straight to the csv module; building DataFrames would only slow this down
+    rows = 0
+    with open(dest, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([*_LEAD, *EXPORT_COLUMNS[table]])
+        for chunk in _iter_rows(table, conn, user_email, chunk_rows, path):
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def _write_parquet(conn, table: str, dest: str, user_email: str, chunk_rows: int, path: str) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow); or export as CSV.") from e
+    arrow = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    schema = pa.schema([(col, arrow[kind]) for col, kind in {**_LEAD, **EXPORT_COLUMNS[table]}.items()])
+    rows = 0
+    with pq.ParquetWriter(dest, schema) as writer:  # one row group per chunk
+        for chunk in iter_export(table, conn, user_email, chunk_rows, path):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return rows
+
+
+def export_ledger(dest_dir: str, user_email: str = None, fmt: str = "csv", tables=EXPORT_TABLES,
+                  chunk_rows: int = CHUNK_ROWS, path: str = None, progress=None) -> dict:
+    """
+    Write <table>.csv or <table>.parquet into `dest_dir` for each table,
+    streaming chunk by chunk from a single snapshot. Returns
+    {table: rows written}.
+    """
+    fmt = fmt.lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {FORMATS}")
+    write = _write_parquet if fmt == "parquet" else _write_csv
+    os.makedirs(dest_dir, exist_ok=True)
+    counts = {}
+    with snapshot(path) as conn:
+        for table in tables:
+            dest = os.path.join(dest_dir, f"{table}.{fmt}")
+            counts[table] = write(conn, table, dest, user_email, chunk_rows, path)
+            if progress:
+                progress(f"{table}: {counts[table]:,} rows")
+    return counts
+
+
+def export_archive(user_email: str = None, fmt: str = "csv", out_dir: str = EXPORT_DIR,
+                   chunk_rows: int = CHUNK_ROWS, path: str = None, progress=None) -> dict:
+    """
+    export_ledger() into a timestamped folder under `out_dir`, zipped.
+    Returns path, rows (per table), bytes and seconds.
+    """
+    started = time.perf_counter()
+    owner = re.sub(r"[^A-Za-z0-9]+", "_", user_email).strip("_") if user_email else "all"
+    folder = os.path.join(out_dir, f"ledger-{owner}-{datetime.now():%Y%m%d-%H%M%S}")
+    try:
+        rows = export_ledger(folder, user_email, fmt, chunk_rows=chunk_rows, path=path, progress=progress)
+        archive = shutil.make_archive(folder, "zip", folder)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return {"path": archive, "rows": rows, "bytes": os.path.getsize(archive),
+            "seconds": time.perf_counter() - started}
+
+
+# ---- online backup
+
+class _Restarted(Exception):
+    pass
+
+
+def backup_database(dest: str = None, path: str = None, pages: int = BACKUP_PAGES,
+                    pause: float = BACKUP_PAUSE, progress=None) -> dict:
+    """
+    Hot copy of the database with SQLite's online backup API.
+
+    Pages are copied `pages` at a time with a short pause between steps, so
+    sessions keep reading and writing while the backup runs. A write from
+    another connection makes SQLite restart the copy; after MAX_RESTARTS
+    the rest is copied in one step, which under WAL only holds a read
+    snapshot. The copy is written next to `dest` and renamed into place
+    when complete. Returns path, pages, bytes, seconds and restarts.
+    """
+    path = path or data.DB_FILE
+    if dest is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+        dest = os.path.join(BACKUP_DIR, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.db")
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    partial = dest + ".partial"
+    started = time.perf_counter()
+    state = {"remaining": None, "total": 0, "restarts": 0}
+
+    def step(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _Restarted
+        state.update(remaining=remaining, total=total)
+        if progress:
+            progress(f"backup: {total - remaining:,} / {total:,} pages ({(total - remaining) / max(total, 1):.0%})")
+        if remaining and pause:
+            time.sleep(pause)
+
+    src = sqlite3.connect(path)
+    try:
+        for attempt_pages in (pages, -1):
+            dst = sqlite3.connect(partial)
+            try:
+                src.backup(dst, pages=attempt_pages, progress=step)
+                break
+            except _Restarted:
+                if progress:
+                    progress("backup: source busy, copying the rest in one step")
+            finally:
+                dst.close()
+    except BaseException:
+        try:
+            os.remove(partial)  # don't leave a half-written copy in backups/
+        except OSError:
+            pass
+        raise
+    finally:
+        src.close()
+    os.replace(partial, dest)
+    return {"path": dest, "pages": state["total"], "bytes": os.path.getsize(dest),
+            "seconds": time.perf_counter() - started, "restarts": state["restarts"]}
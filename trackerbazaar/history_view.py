@@ -0,0 +1,68 @@
+# trackerbazaar/history_view.py
+
+import math
+
+import pandas as pd
+import streamlit as st
+
+from trackerbazaar.cache import cached
+from trackerbazaar.data import LEDGER_COLUMNS, ledger_page, ledger_totals
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def ledger_totals_cached(table: str, portfolio_id: int, user_email: str, filters: dict = None) -> dict:
+    """ledger_totals() through the page-data cache."""
+    filters = filters or {}
+    extra = tuple(sorted((k, str(v)) for k, v in filters.items() if v))
+    return cached(f"totals:{table}", lambda: ledger_totals(table, portfolio_id, filters),
+                  user=user_email, portfolio_id=portfolio_id, extra=extra)
+
+
+def show_history(table: str, portfolio_id: int, user_email: str, empty_message: str) -> dict:
+    """
+    Render a paginated, filterable History section for `table`
+    (transactions, dividends or cash). Only the visible page is fetched,
+    by keyset on (date, id); the totals for the filtered rows come from a
+    separate aggregate query. Returns those totals.
+    """
+    st.subheader("History")
+    key = f"{table}_history_{portfolio_id}"
+
+    has_symbol = "symbol" in LEDGER_COLUMNS[table]
+    cols = st.columns([2, 2, 2, 1] if has_symbol else [2, 2, 1])
+    symbol = cols[0].text_input("Symbol", key=f"{key}_symbol").strip().upper() if has_symbol else ""
+    start = cols[-3].date_input("From", value=None, key=f"{key}_start")
+    end = cols[-2].date_input("To", value=None, key=f"{key}_end")
+    page_size = cols[-1].selectbox("Rows", PAGE_SIZES, index=1, key=f"{key}_size")
+    filters = {"symbol": symbol or None, "start": start, "end": end}
+
+    # Cursor stack: one (date, id) per page boundary; reset when the filters change
+    signature = (symbol, str(start), str(end), page_size)
+    state = st.session_state.setdefault(key, {"signature": signature, "cursors": [None]})
+    if state["signature"] != signature:
+        state.update(signature=signature, cursors=[None])
+    after = state["cursors"][-1]
+
+    totals = ledger_totals_cached(table, portfolio_id, user_email, filters)
+    if not totals["rows"]:
+        st.info(empty_message)
+        return totals
+
+    rows, columns, next_cursor = cached(
+        f"page:{table}",
+        lambda: ledger_page(table, portfolio_id, page_size, after, filters),
+        user=user_email, portfolio_id=portfolio_id, extra=(signature, after),
+    )
+    st.dataframe(pd.DataFrame(rows, columns=columns).drop(columns="id"), use_container_width=True)
+
+    p1, p2, p3 = st.columns([1, 1, 4])
+    if p1.button("◀ Newer", key=f"{key}_prev", disabled=len(state["cursors"]) == 1):
+        state["cursors"].pop()
+        st.rerun()
+    if p2.button("Older ▶", key=f"{key}_next", disabled=next_cursor is None):
+        state["cursors"].append(next_cursor)
+        st.rerun()
+    p3.caption(f"Page {len(state['cursors'])} of {max(1, math.ceil(totals['rows'] / page_size))} "
+               f"· {totals['rows']:,} row(s)")
+    return totals
@@ -0,0 +1,171 @@
+# trackerbazaar/holdings.py
+
+import time
+
+import numpy as np
+import pandas as pd
+
+HOLDINGS_COLUMNS = ["Symbol", "Net Quantity", "Avg Buy Price", "Invested (PKR)"]
+POSITION_COLUMNS = ["portfolio_id", "symbol", "net_qty", "cost_basis", "realized_pnl", "last_trade_date"]
+
+EPS = 1e-9  # quantities at or below this are a closed position
+LOG_SPAN = 500.0  # log-space cumsums are rebased every e^500 so exp() can't overflow
+
+
+def _is_buy(types) -> np.ndarray:
+    """BUY mask; upper-cases only the distinct type labels, not every row."""
+    codes, labels = pd.factorize(np.asarray(types, dtype=object), use_na_sentinel=False)
+    upper = np.array([str(label).upper() for label in labels], dtype=object)
+    return (upper == "BUY")[codes] if len(labels) else np.zeros(len(codes), dtype=bool)
+
+
+def compute_positions(symbols, types, quantities, prices):
+    """
+    Aggregate a ledger given as parallel arrays into per-symbol totals.
+
+    Returns ``(symbols, net_qty, buy_qty, buy_notional)`` as NumPy arrays,
+    one entry per distinct symbol in first-seen order. Everything is a
+    single factorize plus `np.bincount` passes; no Python-level row loop.
+    """
+    codes, uniques = pd.factorize(np.asarray(symbols, dtype=object), use_na_sentinel=False)
+    k = len(uniques)
+    qty = np.asarray(quantities, dtype=np.float64)
+    px = np.asarray(prices, dtype=np.float64)
+    buy = _is_buy(types)
+
+    net_qty = np.bincount(codes, weights=np.where(buy, qty, -qty), minlength=k)
+    buy_qty = np.bincount(codes, weights=qty * buy, minlength=k)
+    buy_notional = np.bincount(codes, weights=qty * px * buy, minlength=k)
+    return np.asarray(uniques, dtype=object), net_qty, buy_qty, buy_notional
+
+
+def compute_holdings(symbols, types, quantities, prices, open_only: bool = True) -> pd.DataFrame:
+    """
+    Holdings table from ledger arrays: net quantity, weighted-average buy
+    price and invested amount per symbol (open positions only by default),
+    sorted by symbol.
+    """
+    syms, net_qty, buy_qty, buy_notional = compute_positions(symbols, types, quantities, prices)
+    avg_buy = np.divide(buy_notional, buy_qty, out=np.zeros_like(buy_notional), where=buy_qty > 0)
+
+    df = pd.DataFrame({
+        "Symbol": syms,
+        "Net Quantity": net_qty,
+        "Avg Buy Price": avg_buy,
+    })
+    if open_only:
+        df = df[df["Net Quantity"] > 0]
+    df = df.sort_values("Symbol").reset_index(drop=True)
+    df["Invested (PKR)"] = (df["Net Quantity"] * df["Avg Buy Price"]).round(2)
+    return df[HOLDINGS_COLUMNS]
+
+
+def holdings_from_frame(tx: pd.DataFrame, open_only: bool = True) -> pd.DataFrame:
+    """compute_holdings() for a ledger DataFrame with symbol, type, quantity and price columns."""
+    return compute_holdings(
+        tx["symbol"].to_numpy(), tx["type"].to_numpy(),
+        tx["quantity"].to_numpy(), tx["price"].to_numpy(),
+        open_only=open_only,
+    )
+
+
+def _scan(seg: np.ndarray, log_a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    B[k] = a[k] * B[k-1] + b[k] within each segment (contiguous codes
+    0..m-1, B = 0 before a segment's first row), with a in (0, 1]. Solved
+    as exp(L) * cumsum(b * exp(-L)) for L = cumsum(log a), one pass per
+    LOG_SPAN of L (almost always a single pass) carrying B across.
+    """
+    L = pd.Series(log_a).groupby(seg).cumsum().to_numpy()
+    level = np.floor(-L / LOG_SPAN).astype(np.int64)
+    out = np.empty(len(b))
+    carry, carry_log = np.zeros(seg[-1] + 1), np.zeros(seg[-1] + 1)
+    for lv in np.unique(level):
+        rows = np.flatnonzero(level == lv)
+        s, ref = seg[rows], -LOG_SPAN * lv
+        scaled = pd.Series(b[rows] * np.exp(ref - L[rows])).groupby(s).cumsum().to_numpy()
+        out[rows] = np.exp(L[rows] - ref) * (scaled + carry[s] * np.exp(ref - carry_log[s]))
+        last = rows[np.r_[s[1:] != s[:-1], True]]
+        carry[seg[last]], carry_log[seg[last]] = out[last], L[last]
+    return out
+
+
+def average_cost(tx: pd.DataFrame) -> pd.DataFrame:
+    """
+    Average-cost positions per (portfolio_id, symbol) from a ledger frame
+    (portfolio_id, date, symbol, type, quantity, price, fees) in trade
+    order: net quantity, remaining cost basis, realized P&L and last trade
+    date, in the positions table's columns.
+
+    Same arithmetic as a trade-by-trade replay (buy fees go into the basis,
+    sells release basis pro rata and realize only the matched quantity,
+    fees charged pro rata, a position closed to zero resets its basis) but
+    with no row loop: the running quantity clipped at zero is a cumulative
+    sum minus its running minimum, and the basis is a linear recurrence
+    solved per stretch between closes.
+    """
+    if tx.empty:
+        return pd.DataFrame(columns=POSITION_COLUMNS)
+    codes = tx.groupby(["portfolio_id", "symbol"], sort=True, dropna=False).ngroup().to_numpy()
+    order = np.argsort(codes, kind="stable")  # grouped, trade order kept within each group
+    g = codes[order]
+    qty = tx["quantity"].to_numpy(dtype=np.float64)[order]
+    px = tx["price"].to_numpy(dtype=np.float64)[order]
+    fees = tx["fees"].fillna(0.0).to_numpy(dtype=np.float64)[order] if "fees" in tx.columns else np.zeros(len(g))
+    live = qty > 0
+    buy = _is_buy(tx["type"].to_numpy())[order] & live
+    sell = ~buy & live
+    first = np.r_[True, g[1:] != g[:-1]]
+
+    # Running quantity, oversells clipped at zero: Q = S - min(0, running min of S)
+    s = pd.Series(np.where(buy, qty, np.where(sell, -qty, 0.0))).groupby(g).cumsum().to_numpy()
+    q = s - np.minimum(pd.Series(s).groupby(g).cummin().to_numpy(), 0.0)
+    q_prev = np.where(first, 0.0, np.r_[0.0, q[:-1]])
+    closed = sell & (q <= EPS)
+
+    # Basis: buys add quantity x price + fees, sells keep Q/Q_prev of it, a close resets it
+    keep = np.where(sell & ~closed, q / np.where(q_prev > EPS, q_prev, 1.0), 1.0)
+    seg = np.cumsum(first | np.r_[False, closed[:-1]]) - 1
+    basis = _scan(seg, np.log(keep), np.where(buy, qty * px + fees, 0.0))
+    basis[closed] = 0.0
+    basis_prev = np.where(first, 0.0, np.r_[0.0, basis[:-1]])
+
+    matched = np.where(sell, q_prev - q, 0.0)
+    pnl = np.where(sell, matched * px - fees * matched / np.where(sell, qty, 1.0) - (basis_prev - basis), 0.0)
+
+    last = np.r_[first[1:], True]
+    out = tx.iloc[order[last]][["portfolio_id", "symbol", "date"]].reset_index(drop=True)
+    return pd.DataFrame({
+        "portfolio_id": out["portfolio_id"].astype(int),
+        "symbol": out["symbol"],
+        "net_qty": np.where(q[last] <= EPS, 0.0, q[last]),
+        "cost_basis": basis[last],
+        "realized_pnl": np.bincount(g, weights=pnl),
+        "last_trade_date": out["date"].astype(str),
+    })[POSITION_COLUMNS]
+
+
+def benchmark_holdings(sizes=(10_000, 100_000, 1_000_000, 5_000_000), n_symbols: int = 500, seed: int = 0):
+    """Time compute_holdings() and average_cost() on synthetic ledgers; returns [(rows, seconds, avg cost seconds)]."""
+    rng = np.random.default_rng(seed)
+    universe = np.array([f"SYM{i}" for i in range(n_symbols)], dtype=object)
+    results = []
+    for n in sizes:
+        symbols = universe[rng.integers(0, n_symbols, n)]
+        types = np.where(rng.random(n) < 0.7, "BUY", "SELL").astype(object)
+        qty = rng.integers(1, 1000, n).astype(np.float64)
+        px = rng.random(n) * 500
+        started = time.perf_counter()
+        compute_holdings(symbols, types, qty, px)
+        elapsed = time.perf_counter() - started
+        tx = pd.DataFrame({"portfolio_id": rng.integers(0, 20, n), "date": np.arange(n), "symbol": symbols,
+                           "type": types, "quantity": qty, "price": px, "fees": rng.random(n) * 50})
+        started = time.perf_counter()
+        average_cost(tx)
+        results.append((n, elapsed, time.perf_counter() - started))
+    return results
+
+
+if __name__ == "__main__":
+    for rows, secs, avg_secs in benchmark_holdings():
+        print(f"{rows:>10,d} rows  holdings {secs * 1000:9.1f} ms  average cost {avg_secs * 1000:9.1f} ms")
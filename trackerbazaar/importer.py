@@ -0,0 +1,210 @@
+# trackerbazaar/importer.py
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from trackerbazaar.data import get_conn
+from trackerbazaar.positions import rebuild_positions
+
+CHUNK_ROWS = 50_000
+
+# Broker statement header spellings -> our column
+COLUMN_ALIASES = {
+    "date": "date", "trade_date": "date", "trade date": "date", "settlement_date": "date",
+    "symbol": "symbol", "ticker": "symbol", "scrip": "symbol", "security": "symbol",
+    "type": "type", "side": "type", "transaction_type": "type", "buy/sell": "type", "b/s": "type",
+    "quantity": "quantity", "qty": "quantity", "shares": "quantity", "volume": "quantity",
+    "price": "price", "rate": "price", "trade_price": "price",
+    "fees": "fees", "brokerage": "fees", "commission": "fees", "charges": "fees",
+}
+REQUIRED = ("date", "symbol", "type", "quantity", "price")
+
+SIDES = {"BUY": "BUY", "B": "BUY", "PURCHASE": "BUY", "SELL": "SELL", "S": "SELL", "SALE": "SELL"}
+SYMBOL_PATTERN = r"^[A-Z0-9][A-Z0-9.\-]{0,15}$"
+
+INSERT_SQL = """INSERT OR IGNORE INTO transactions
+                (portfolio_id, date, symbol, type, quantity, price, fees, content_hash)
+                VALUES (?,?,?,?,?,?,?,?)"""
+
+
+def read_statement(source, chunksize: int = CHUNK_ROWS, name: str = None):
+    """
+    Yield DataFrame chunks of a CSV or XLSX statement. `source` is a path or
+    a file-like object (e.g. a Streamlit upload); `name` gives the file
+    name when it can't be inferred.
+    """
+    name = (name or getattr(source, "name", None) or str(source)).lower()
+    if name.endswith((".xlsx", ".xls")):
+        try:
+            df = pd.read_excel(source, dtype=str)
+        except ImportError as e:
+            raise ValueError("Reading Excel statements needs openpyxl (pip install openpyxl); "
+                             "or export the statement as CSV.") from e
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        yield from pd.read_csv(source, chunksize=chunksize, dtype=str, skipinitialspace=True)
+
+
+def _numbers(col: pd.Series) -> pd.Series:
+    return pd.to_numeric(col.str.replace(",", "", regex=False).str.strip(), errors="coerce")
+
+
+def normalize_chunk(df: pd.DataFrame, first_row: int = 1, dayfirst: bool = True,
+                    known_symbols=None) -> tuple:
+    """
+    Map a raw chunk onto date, symbol, type, quantity, price and fees, and
+    validate it column-wise. Returns ``(valid, rejected)``. `rejected`
+    holds the source row number (1-based, header excluded), the raw values
+    and the first reason the row failed.
+    """
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip().lower(), str(c).strip().lower()))
+    missing = [c for c in REQUIRED if c not in df.columns]
+    if missing:
+        raise ValueError(f"Statement is missing column(s): {', '.join(missing)}")
+    df = df.reset_index(drop=True)
+    rows = np.arange(first_row, first_row + len(df))
+
+    raw_date = df["date"].astype("string").str.strip()
+    dates = pd.to_datetime(raw_date, errors="coerce", dayfirst=dayfirst)
+    retry = dates.isna() & raw_date.notna()
+    if retry.any():  # statements sometimes mix date formats
+        dates[retry] = pd.to_datetime(raw_date[retry], errors="coerce", dayfirst=dayfirst, format="mixed")
+    symbol = df["symbol"].astype("string").str.strip().str.upper()
+    side = df["type"].astype("string").str.strip().str.upper().map(SIDES)
+    qty = _numbers(df["quantity"].astype("string"))
+    price = _numbers(df["price"].astype("string"))
+    fees = _numbers(df["fees"].astype("string")).fillna(0.0) if "fees" in df.columns else pd.Series(0.0, index=df.index)
+
+    bad_symbol = ~symbol.fillna("").str.match(SYMBOL_PATTERN)
+    checks = [
+        (dates.isna(), "invalid date"),
+        (bad_symbol, "invalid symbol"),
+        (side.isna(), "type must be BUY or SELL"),
+        (qty.isna() | (qty <= 0), "quantity must be a positive number"),
+        (price.isna() | (price < 0), "price must be a non-negative number"),
+        (fees.isna() | (fees < 0), "fees must be a non-negative number"),
+    ]
+    if known_symbols is not None:
+        checks.append((~symbol.isin(list(known_symbols)), "unknown symbol"))
+    masks = [m.fillna(True).to_numpy(dtype=bool) for m, _ in checks]
+    reason = np.select(masks, [r for _, r in checks], default="")
+    bad = reason != ""
+
+    valid = pd.DataFrame({
+        "row": rows, "date": dates.dt.strftime("%Y-%m-%d"), "symbol": symbol, "type": side,
+        "quantity": qty, "price": price, "fees": fees,
+    })[~bad].reset_index(drop=True)
+    rejected = df[bad].assign(row=rows[bad], reason=reason[bad])
+    return valid, rejected[["row", "reason"] + [c for c in df.columns]]
+
+
+def content_hashes(portfolio_id: int, valid: pd.DataFrame, seen: dict) -> list:
+    """
+    Stable per-trade hash of (portfolio, date, symbol, type, qty, price, fees,
+    occurrence). Identical fills in one statement get distinct occurrence
+    numbers, so they are kept; re-importing the same statement reproduces
+    the same hashes, so it is ignored. `seen` carries occurrence counts
+    across chunks.
+    """
+    keys = (
+        str(portfolio_id) + "|" + valid["date"] + "|" + valid["symbol"] + "|" + valid["type"] + "|"
+        + valid["quantity"].map(repr) + "|" + valid["price"].map(repr) + "|" + valid["fees"].map(repr)
+    ).tolist()
+    out = []
+    for key in keys:
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        out.append(hashlib.blake2b(f"{key}|{n}".encode(), digest_size=16).hexdigest())
+    return out
+
+
+def import_transactions(source, portfolio_id: int, name: str = None, chunksize: int = CHUNK_ROWS,
+                        dayfirst: bool = True, known_symbols=None, dry_run: bool = False,
+                        conn=None, progress=None) -> dict:
+    """
+    Import a broker statement into one portfolio.
+
+    Chunks are parsed and validated in pandas and inserted with executemany
+    inside a single transaction. Rows whose content hash is already stored
+    are skipped as duplicates. Positions for the touched symbols are
+    rebuilt before the commit. With `dry_run` everything runs and the
+    transaction is rolled back.
+
+    Returns rows_read, inserted, duplicates, rejected (a DataFrame with row
+    numbers and reasons), seconds and rows_per_sec.
+    """
+    started = time.perf_counter()
+    conn = conn or get_conn()
+    stats = {"rows_read": 0, "inserted": 0, "duplicates": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    rejected, symbols, seen = [], set(), {}
+
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")  # one importer/writer at a time; all-or-nothing
+    try:
+        for chunk in read_statement(source, chunksize, name):
+            valid, bad = normalize_chunk(chunk, stats["rows_read"] + 1, dayfirst, known_symbols)
+            stats["rows_read"] += len(chunk)
+            if len(bad):
+                rejected.append(bad)
+            if valid.empty:
+                continue
+            valid["content_hash"] = content_hashes(portfolio_id, valid, seen)
+
+            existing = {h for (h,) in conn.execute(
+                "SELECT content_hash FROM transactions WHERE content_hash IN (SELECT value FROM json_each(?))",
+                (json.dumps(valid["content_hash"].tolist()),),
+            )}
+            dup = valid["content_hash"].isin(existing).to_numpy()
+            if dup.any():
+                stats["duplicates"] += int(dup.sum())
+                rejected.append(valid[dup][["row"]].assign(reason="duplicate of an imported trade"))
+                valid = valid[~dup]
+
+            cur = conn.executemany(INSERT_SQL, zip(
+                [portfolio_id] * len(valid), valid["date"].tolist(), valid["symbol"].tolist(),
+                valid["type"].tolist(), valid["quantity"].tolist(), valid["price"].tolist(),
+                valid["fees"].tolist(), valid["content_hash"].tolist(),
+            ))
+            stats["inserted"] += cur.rowcount
+            symbols.update(valid["symbol"].unique().tolist())
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress(f"{stats['rows_read']:,} rows read, {stats['inserted']:,} inserted "
+                         f"({stats['rows_read'] / elapsed:,.0f} rows/s)")
+
+        if symbols:
+            rebuild_positions(conn, portfolio_id, sorted(symbols))
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    stats["rejected"] = (pd.concat(rejected, ignore_index=True).sort_values("row", kind="stable")
+                         if rejected else pd.DataFrame(columns=["row", "reason"]))
+    stats["seconds"] = time.perf_counter() - started
+    stats["rows_per_sec"] = stats["rows_read"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def write_sample_statement(path: str, rows: int = 100_000, n_symbols: int = 300, seed: int = 0):
+    """Synthetic broker statement for benchmarking imports."""
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2010-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 5000, rows)), unit="D")
+    pd.DataFrame({
+        "Trade Date": days.strftime("%d/%m/%Y"),
+        "Scrip": np.array([f"SYM{i}" for i in range(n_symbols)])[rng.integers(0, n_symbols, rows)],
+        "Side": np.where(rng.random(rows) < 0.6, "Buy", "Sell"),
+        "Qty": rng.integers(1, 5000, rows),
+        "Rate": np.round(rng.random(rows) * 500, 2),
+        "Commission": np.round(rng.random(rows) * 100, 2),
+    }).to_csv(path, index=False)
+    return os.path.getsize(path)
@@ -0,0 +1,439 @@
+# trackerbazaar/nav.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from trackerbazaar.corporate_actions import adjustment_factors, load_actions
+from trackerbazaar.data import get_conn
+from trackerbazaar.price_history import HISTORY_DB_FILE, connect_history
+
+NAV_COLUMNS = ["date", "holdings_value", "cash_balance", "nav", "external_flow", "trade_flow", "dividends"]
+
+PKT_OFFSET = 5 * 3600  # PSX closes are bucketed into PKT calendar days
+
+# Ledger events of one portfolio from a date on (inclusive); trades in (date, id) order
+WINDOW_SQL = {
+    "transactions": """SELECT date, symbol, UPPER(type) AS type, quantity, price, COALESCE(fees, 0) AS fees
+                       FROM transactions WHERE portfolio_id=? AND date>=? ORDER BY date, id""",
+    "cash": "SELECT date, amount FROM cash WHERE portfolio_id=? AND date>=?",
+    "dividends": "SELECT date, symbol, amount FROM dividends WHERE portfolio_id=? AND date>=?",
+}
+
+# State just before the window: quantities (per trade date, for corporate
+# actions), last trade price and its date per symbol, and cash
+SEED_QTY_SQL = """SELECT symbol, date, SUM(CASE UPPER(type) WHEN 'BUY' THEN quantity ELSE -quantity END)
+                  FROM transactions WHERE portfolio_id=? AND date<? GROUP BY symbol, date"""
+SEED_TRADE_PRICE_SQL = """SELECT s.symbol, t.date, t.price
+                          FROM (SELECT DISTINCT symbol FROM transactions WHERE portfolio_id=?1 AND date<?2) AS s
+                          JOIN transactions AS t ON t.id = (SELECT id FROM transactions AS u
+                                                            WHERE u.portfolio_id=?1 AND u.symbol=s.symbol AND u.date<?2
+                                                            ORDER BY u.date DESC, u.id DESC LIMIT 1)"""
+SEED_CASH_SQL = """SELECT (SELECT COALESCE(SUM(amount), 0) FROM cash WHERE portfolio_id=? AND date<?)
+                        + (SELECT COALESCE(SUM(amount), 0) FROM dividends WHERE portfolio_id=? AND date<?)
+                        - (SELECT COALESCE(SUM(CASE UPPER(type)
+                                                   WHEN 'BUY' THEN quantity * price + COALESCE(fees, 0)
+                                                   ELSE -(quantity * price - COALESCE(fees, 0)) END), 0)
+                           FROM transactions WHERE portfolio_id=? AND date<?)"""
+LAST_DATE_SQL = """SELECT MAX(d) FROM (
+                       SELECT MAX(date) AS d FROM transactions WHERE portfolio_id=?
+                       UNION ALL SELECT MAX(date) FROM cash WHERE portfolio_id=?
+                       UNION ALL SELECT MAX(date) FROM dividends WHERE portfolio_id=?)"""
+
+# Prices of the requested symbols, keyed by position in the JSON list (a primary-key range per symbol)
+CLOSES_SQL = """SELECT j.key, p.ts, p.price
+                FROM json_each(?) AS j JOIN prices AS p ON p.symbol = j.value AND p.ts >= ? AND p.ts < ?"""
+SEED_CLOSE_SQL = """SELECT j.value, p.price, p.ts
+                    FROM json_each(?) AS j JOIN prices AS p
+                      ON p.symbol = j.value AND p.ts = (SELECT MAX(ts) FROM prices WHERE symbol = j.value AND ts < ?)"""
+
+UPSERT_STATE_SQL = """INSERT INTO nav_state (portfolio_id, valid_through, checkpoint_date, checkpoint_cash)
+                      VALUES (?, ?, ?, ?)
+                      ON CONFLICT(portfolio_id) DO UPDATE SET
+                          valid_through=excluded.valid_through, checkpoint_date=excluded.checkpoint_date,
+                          checkpoint_cash=excluded.checkpoint_cash"""
+CHECKPOINT_SQL = "INSERT INTO nav_checkpoint (portfolio_id, symbol, quantity, trade_price, close) VALUES (?,?,?,?,?)"
+INSERT_SQL = f"INSERT INTO nav_daily (portfolio_id, {', '.join(NAV_COLUMNS)}) VALUES (?,?,?,?,?,?,?,?)"
+
+
+def _days(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values, dtype=object), errors="coerce", format="mixed").to_numpy("datetime64[D]")
+
+
+def _epoch(day: np.datetime64) -> int:
+    """Epoch seconds of PKT midnight starting `day`."""
+    return int(day.astype("datetime64[s]").astype(np.int64)) - PKT_OFFSET
+
+
+def _ffill(a: np.ndarray) -> np.ndarray:
+    """Forward-fill NaNs down each column."""
+    idx = np.where(np.isnan(a), 0, np.arange(a.shape[0])[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return a[idx, np.arange(a.shape[1])]
+
+
+_close_days = {}  # history path -> (file stamp, last close day)
+_close_days_lock = threading.Lock()
+
+
+def _history_stamp(path: str):
+    """mtime/size of the history DB and its WAL; None when the DB doesn't exist."""
+    stamp = []
+    for name in (path, path + "-wal"):
+        try:
+            st = os.stat(name)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp) if stamp[0] is not None else None
+
+
+def last_close_day(history_path: str = HISTORY_DB_FILE):
+    """
+    Most recent PKT day with any stored price, as datetime64[D] (None if
+    the store is empty or missing). Re-queried only when the history file
+    or its WAL changes, so between loads this is two stat() calls.
+    """
+    path = os.path.abspath(history_path)
+    stamp = _history_stamp(path)
+    if stamp is None:
+        return None
+    cached = _close_days.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    hconn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        (ts,) = hconn.execute("SELECT MAX(ts) FROM prices").fetchone()
+    except sqlite3.OperationalError:  # created but no schema yet
+        ts = None
+    finally:
+        hconn.close()
+    day = None if ts is None else np.datetime64((ts + PKT_OFFSET) // 86400, "D")
+    with _close_days_lock:
+        _close_days[path] = (stamp, day)
+    return day
+
+
+def _ledger_seed(conn, portfolio_id: int, start: str) -> dict:
+    """
+    Quantities, last trade prices and cash from every ledger row dated
+    before `start`, in the share units of the day before it.
+    """
+    (cash,) = conn.execute(SEED_CASH_SQL, (portfolio_id, start) * 3).fetchone()
+    qty = pd.DataFrame(conn.execute(SEED_QTY_SQL, (portfolio_id, start)).fetchall(), columns=["symbol", "date", "q"])
+    trade = pd.DataFrame(conn.execute(SEED_TRADE_PRICE_SQL, (portfolio_id, start)).fetchall(),
+                         columns=["symbol", "date", "p"])
+    actions = load_actions(qty["symbol"].unique(), conn)
+    if len(actions):
+        day = np.datetime64(start, "D") - 1
+        qty["q"] *= adjustment_factors(actions, qty["symbol"], qty["date"]) \
+            / adjustment_factors(actions, qty["symbol"], np.full(len(qty), day))
+        trade["p"] *= adjustment_factors(actions, trade["symbol"], np.full(len(trade), day)) \
+            / adjustment_factors(actions, trade["symbol"], trade["date"])
+    return {
+        "qty": qty.groupby("symbol")["q"].sum().to_dict(),
+        "trade": dict(zip(trade["symbol"], trade["p"])),
+        "close": None,
+        "cash": cash,
+    }
+
+
+def _checkpoint_seed(conn, portfolio_id: int, cash: float) -> dict:
+    rows = conn.execute("SELECT symbol, quantity, trade_price, close FROM nav_checkpoint WHERE portfolio_id=?",
+                        (portfolio_id,)).fetchall()
+    nan = float("nan")
+    return {
+        "qty": {r[0]: r[1] for r in rows},
+        "trade": {r[0]: nan if r[2] is None else r[2] for r in rows},
+        "close": {r[0]: nan if r[3] is None else r[3] for r in rows},
+        "cash": cash,
+    }
+
+
+def compute_nav(conn, portfolio_id: int, after=None, end=None,
+                history_path: str = HISTORY_DB_FILE) -> pd.DataFrame:
+    """
+    Daily NAV of one portfolio on business days after `after` (a business
+    day already covered; None for the whole history) through `end`.
+
+    Holdings come from a (days x symbols) matrix of signed trade
+    quantities, cumulatively summed and seeded with the quantities held at
+    `after`. Each cell is marked at the last close on or before that day,
+    falling back to the last trade price for symbols without a close yet.
+    Cash is the cash ledger plus dividends minus net trade spend, also a
+    cumulative sum. Events on non-trading days land on the next business
+    day. Oversold quantities are not clamped. Splits and bonus issues
+    restate holdings and trade-price marks into each day's share units,
+    matching the unadjusted closes in price history.
+    """
+    return _compute(conn, portfolio_id, after, end, history_path)[0]
+
+
+def _compute(conn, portfolio_id: int, after, end, history_path: str, seed: dict = None,
+             checkpoint_day=None, detail: bool = False) -> tuple:
+    """
+    compute_nav(), optionally seeded from a checkpoint; also returns the
+    state on `checkpoint_day`, and with `detail` the per-symbol matrices.
+    """
+    start = np.datetime64(after, "D") + 1 if after is not None else None
+    start_s = str(start) if start is not None else ""
+    frames = {t: pd.read_sql_query(sql, conn, params=(portfolio_id, start_s)) for t, sql in WINDOW_SQL.items()}
+    for df in frames.values():
+        df["day"] = _days(df["date"])
+        df.dropna(subset=["day"], inplace=True)
+        if end is not None:  # events after `end` are outside the series
+            df.drop(df.index[df["day"] > np.datetime64(end, "D")], inplace=True)
+
+    if after is None:
+        seed = {"qty": {}, "trade": {}, "close": {}, "cash": 0.0}
+    elif seed is None:
+        seed = _ledger_seed(conn, portfolio_id, start_s)
+    seed_qty, seed_trade, seed_cash = seed["qty"], seed["trade"], seed["cash"]
+
+    first = start
+    if first is None:
+        found = [df["day"].min() for df in frames.values() if len(df)]
+        if not found:
+            return (pd.DataFrame(columns=NAV_COLUMNS), None) + ((None,) if detail else ())
+        first = min(found)
+    if end is None:
+        found = [df["day"].max() for df in frames.values() if len(df)]
+        end = max(found) if found else first
+    grid = pd.bdate_range(first, max(np.datetime64(end, "D"), first)).to_numpy("datetime64[D]")
+    if grid.size == 0 or grid[-1] < np.datetime64(end, "D"):
+        grid = np.append(grid, np.busday_offset(np.datetime64(end, "D"), 0, roll="forward"))
+    n_days = grid.size
+
+    tx = frames["transactions"]
+    symbols = pd.Index(sorted(set(seed_qty) | set(seed_trade) | set(tx["symbol"].unique())))
+    n_sym = len(symbols)
+
+    # Corporate actions: quantities and prices are accumulated in today's
+    # share units (x F, / F at their own day) and restated with each day's F;
+    # the seed is in the units of the day before the grid
+    actions = load_actions(symbols, conn)
+    f_trade = adjustment_factors(actions, tx["symbol"].to_numpy(), tx["day"].to_numpy())
+    f_seed = adjustment_factors(actions, symbols, np.full(n_sym, grid[0] - 1))
+    f_day = 1.0
+    if len(actions):
+        f_day = adjustment_factors(actions, np.tile(symbols.to_numpy(), n_days),
+                                   np.repeat(grid, n_sym)).reshape(n_days, n_sym)
+
+    # Holdings: cumulative signed quantities on top of the seed
+    di = np.searchsorted(grid, tx["day"].to_numpy())
+    si = symbols.get_indexer(tx["symbol"])
+    buy = (tx["type"] == "BUY").to_numpy()
+    qty, px, fees = (tx[c].to_numpy(dtype=np.float64) for c in ("quantity", "price", "fees"))
+    signed = np.where(buy, qty, -qty)
+    held = np.bincount(di * n_sym + si, weights=signed * f_trade, minlength=n_days * n_sym).astype(np.float64)
+    held = held.reshape(n_days, n_sym)
+    np.cumsum(held, axis=0, out=held)
+    held += symbols.map(lambda s: seed_qty.get(s, 0.0)).to_numpy(dtype=np.float64) * f_seed
+    held /= f_day
+
+    # Marks: closes, else last trade price, both carried forward from the seed row
+    closes = np.full((n_days + 1, n_sym), np.nan)
+    trades = np.full((n_days + 1, n_sym), np.nan)
+    trades[0] = symbols.map(lambda s: seed_trade.get(s, np.nan)).to_numpy(dtype=np.float64) / f_seed
+    last = pd.DataFrame({"d": di, "s": si, "p": px / f_trade}).drop_duplicates(["d", "s"], keep="last")
+    trades[last["d"].to_numpy() + 1, last["s"].to_numpy()] = last["p"].to_numpy()
+    if n_sym:
+        hconn = connect_history(history_path)
+        try:
+            names = json.dumps(symbols.tolist())
+            if seed["close"] is None:
+                found = hconn.execute(SEED_CLOSE_SQL, (names, _epoch(grid[0]))).fetchall()
+                if found:
+                    sym, price, ts = zip(*found)
+                    close_day = ((np.array(ts, dtype=np.int64) + PKT_OFFSET) // 86400).astype("datetime64[D]")
+                    closes[0, symbols.get_indexer(sym)] = np.array(price) / adjustment_factors(actions, sym, close_day)
+            else:
+                closes[0] = symbols.map(lambda s: seed["close"].get(s, np.nan)).to_numpy(dtype=np.float64) / f_seed
+            rows = hconn.execute(CLOSES_SQL, (names, _epoch(grid[0]), _epoch(grid[-1] + 1))).fetchall()
+        finally:
+            hconn.close()
+        if rows:
+            arr = np.array(rows, dtype=np.float64)  # epoch seconds are exact in float64
+            arr = arr[np.lexsort((arr[:, 1], arr[:, 0]))]
+            cs, ts, price = arr[:, 0].astype(np.int64), arr[:, 1].astype(np.int64), arr[:, 2]
+            day = ((ts + PKT_OFFSET) // 86400).astype("datetime64[D]")
+            cd = np.searchsorted(grid, day)
+            last = np.r_[(cs[1:] != cs[:-1]) | (cd[1:] != cd[:-1]), True]  # the day's last price
+            closes[cd[last] + 1, cs[last]] = price[last] / adjustment_factors(actions, symbols[cs[last]], day[last])
+    closes, trades = _ffill(closes)[1:] * f_day, _ffill(trades)[1:] * f_day
+    marks = np.nan_to_num(np.where(np.isnan(closes), trades, closes))
+    holdings_value = np.einsum("ij,ij->i", held, marks)
+
+    # Cash: external flows + dividends - net spend on trades
+    # (bincount returns ints for an empty window, hence the casts)
+    spend = np.where(buy, qty * px + fees, -(qty * px - fees))
+    trade_flow = np.bincount(di, weights=spend, minlength=n_days).astype(np.float64)
+    def daily(df):
+        return np.bincount(np.searchsorted(grid, df["day"].to_numpy()),
+                           weights=df["amount"].to_numpy(dtype=np.float64), minlength=n_days).astype(np.float64)
+    external, dividends = daily(frames["cash"]), daily(frames["dividends"])
+    cash = seed_cash + np.cumsum(external + dividends - trade_flow)
+
+    nav = pd.DataFrame({
+        "date": grid.astype(str), "holdings_value": holdings_value, "cash_balance": cash,
+        "nav": holdings_value + cash, "external_flow": external, "trade_flow": trade_flow,
+        "dividends": dividends,
+    })
+    checkpoint = None
+    if checkpoint_day is not None:
+        k = np.searchsorted(grid, checkpoint_day)
+        if k < n_days and grid[k] == checkpoint_day:
+            checkpoint = {"date": str(checkpoint_day), "cash": float(cash[k]), "rows": [
+                (sym, q, None if np.isnan(t) else t, None if np.isnan(c) else c)
+                for sym, q, t, c in zip(symbols.tolist(), held[k].tolist(), trades[k].tolist(), closes[k].tolist())
+            ]}
+    if not detail:
+        return nav, checkpoint
+
+    div = frames["dividends"]
+    dsi = symbols.get_indexer(div["symbol"])
+    keep = dsi >= 0  # dividends on symbols never traded here only count at portfolio level
+    ddi = np.searchsorted(grid, div["day"].to_numpy()[keep])
+    matrices = {
+        "dates": grid, "symbols": symbols.tolist(), "value": held * marks,
+        "flow": np.bincount(di * n_sym + si, weights=spend,
+                            minlength=n_days * n_sym).astype(np.float64).reshape(n_days, n_sym),
+        "dividends": np.bincount(ddi * n_sym + dsi[keep], weights=div["amount"].to_numpy(dtype=np.float64)[keep],
+                                 minlength=n_days * n_sym).astype(np.float64).reshape(n_days, n_sym),
+    }
+    return nav, checkpoint, matrices
+
+
+def symbol_matrices(portfolio_id: int, end=None, conn=None, history_path: str = HISTORY_DB_FILE) -> dict:
+    """
+    One portfolio's per-symbol daily series over its whole history, as
+    (days x symbols) arrays: dates, symbols, value (quantity x mark), flow
+    (net trade spend) and dividends. Not stored; computed on each call.
+    """
+    conn = conn or get_conn()
+    if end is None:
+        (last_event,) = conn.execute(LAST_DATE_SQL, (portfolio_id,) * 3).fetchone()
+        ends = [d for d in (_days([last_event])[0] if last_event else None, last_close_day(history_path))
+                if d is not None and not np.isnat(d)]
+        end = max(ends) if ends else None
+    return _compute(conn, portfolio_id, None, end, history_path, detail=True)[2]
+
+
+def _pending(conn, portfolio_id: int, close_day) -> tuple:
+    """
+    (nav_state row, watermark business day, end day) of the update due for
+    a portfolio; end is None when the rollup is already current.
+    """
+    row = conn.execute("SELECT valid_through, checkpoint_date, checkpoint_cash FROM nav_state "
+                       "WHERE portfolio_id=?", (portfolio_id,)).fetchone()
+    after = np.busday_offset(np.datetime64(row[0], "D"), 0, roll="backward") if row is not None else None
+    (last_event,) = conn.execute(LAST_DATE_SQL, (portfolio_id,) * 3).fetchone()
+    ends = [d for d in (_days([last_event])[0] if last_event else None, close_day) if d is not None and not np.isnat(d)]
+    if not ends:
+        return row, after, None
+    end = np.busday_offset(max(ends), 0, roll="forward")
+    return row, after, (None if after is not None and after >= end else end)
+
+
+def update_nav(portfolio_id: int, conn=None, history_path: str = HISTORY_DB_FILE) -> dict:
+    """
+    Bring one portfolio's nav_daily rollup up to date. Only days after the
+    watermark in nav_state are (re)computed: new trades or closes extend
+    the series, and the ledger triggers pull the watermark back for
+    backdated writes so just that suffix is redone. Days after the last
+    stored close are provisional and recomputed once prices arrive. A
+    current watermark returns without taking the write lock.
+    Returns from, to, rows and seconds.
+    """
+    started = time.perf_counter()
+    conn = conn or get_conn()
+    close_day = last_close_day(history_path)
+    # Plain reads first: an up-to-date rollup returns without taking the write lock
+    row, after, end = _pending(conn, portfolio_id, close_day)
+    current = {"from": None, "to": None if after is None else str(after), "rows": 0}
+    if end is None:
+        return {**current, "seconds": time.perf_counter() - started}
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")  # ledger writes wait, so none slip in between read and write
+    try:
+        row, after, end = _pending(conn, portfolio_id, close_day)  # re-checked under the lock
+        if end is None:
+            conn.rollback()
+            current["to"] = None if after is None else str(after)
+            return {**current, "seconds": time.perf_counter() - started}
+
+        seed = None
+        if row is not None:
+            if row[1] == str(after):  # watermark untouched since the last run: resume from its state
+                seed = _checkpoint_seed(conn, portfolio_id, row[2])
+
+        valid = min(end, close_day) if close_day is not None else end
+        nav, checkpoint = _compute(conn, portfolio_id, after, end, history_path, seed,
+                                   np.busday_offset(valid, 0, roll="backward"))
+        conn.execute("DELETE FROM nav_daily WHERE portfolio_id=? AND date>?",
+                     (portfolio_id, str(after) if after is not None else ""))
+        conn.executemany(INSERT_SQL, ((portfolio_id, *r) for r in nav.itertuples(index=False, name=None)))
+        conn.execute("DELETE FROM nav_checkpoint WHERE portfolio_id=?", (portfolio_id,))
+        if checkpoint:
+            conn.executemany(CHECKPOINT_SQL, ((portfolio_id, *r) for r in checkpoint["rows"]))
+        conn.execute(UPSERT_STATE_SQL, (portfolio_id, str(valid), checkpoint and checkpoint["date"],
+                                        checkpoint and checkpoint["cash"]))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return {"from": nav["date"].iloc[0] if len(nav) else None, "to": str(end), "rows": len(nav),
+            "seconds": time.perf_counter() - started}
+
+
+def get_nav(portfolio_id: int, start=None, conn=None, history_path: str = HISTORY_DB_FILE) -> pd.DataFrame:
+    """The portfolio's daily NAV series (updated first), optionally from `start`."""
+    conn = conn or get_conn()
+    update_nav(portfolio_id, conn, history_path)
+    return pd.read_sql_query(
+        f"SELECT {', '.join(NAV_COLUMNS)} FROM nav_daily WHERE portfolio_id=? AND date>=? ORDER BY date",
+        conn, params=(portfolio_id, str(start or "")),
+    )
+
+
+def invalidate_nav(since=None, portfolio_id: int = None, conn=None) -> int:
+    """
+    Mark NAV rollups stale from `since` on (everything when None), for one
+    portfolio or all, e.g. after backfilling older closes. Returns the
+    number of portfolios affected.
+    """
+    conn = conn or get_conn()
+    where, params = [], []
+    if portfolio_id is not None:
+        where.append("portfolio_id=?")
+        params.append(portfolio_id)
+    with conn:
+        if since is None:
+            conn.execute(f"DELETE FROM nav_checkpoint {'WHERE ' + where[0] if where else ''}", params)
+            cur = conn.execute(f"DELETE FROM nav_state {'WHERE ' + where[0] if where else ''}", params)
+        else:
+            cur = conn.execute(
+                f"UPDATE nav_state SET valid_through=date(?, '-1 day') "
+                f"WHERE valid_through>=date(?) {'AND ' + where[0] if where else ''}",
+                [str(since), str(since), *params],
+            )
+    return cur.rowcount
+
+
+def benchmark_nav(portfolio_ids=None, conn=None, history_path: str = HISTORY_DB_FILE) -> list:
+    """Full rebuild then a no-op update per portfolio; returns [(pid, rows, full_s, noop_s)]."""
+    conn = conn or get_conn()
+    if portfolio_ids is None:
+        portfolio_ids = [pid for (pid,) in conn.execute("SELECT id FROM portfolios ORDER BY id")]
+    results = []
+    for pid in portfolio_ids:
+        invalidate_nav(portfolio_id=pid, conn=conn)
+        full = update_nav(pid, conn, history_path)
+        noop = update_nav(pid, conn, history_path)
+        results.append((pid, full["rows"], full["seconds"], noop["seconds"]))
+    return results
@@ -1,10 +1,10 @@
-import sqlite3
+from trackerbazaar.data import get_conn
 from datetime import datetime
 
 DB_FILE = "trackerbazaar_v2.db"  # ✅ new DB
 
 def init_notifications_table():
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_conn(DB_FILE) as conn:
         c = conn.cursor()
         c.execute("""
             CREATE TABLE IF NOT EXISTS notifications (
@@ -18,7 +18,7 @@ def init_notifications_table():
         conn.commit()
 
 def add_notification(email, message):
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_conn(DB_FILE) as conn:
         c = conn.cursor()
         c.execute(
             "INSERT INTO notifications (email, message, timestamp) VALUES (?,?,?)",
@@ -27,7 +27,7 @@ def add_notification(email, message):
         conn.commit()
 
 def get_notifications(email, unread_only=False):
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_conn(DB_FILE) as conn:
         c = conn.cursor()
         if unread_only:
             c.execute("SELECT id, message, timestamp FROM notifications WHERE email=? AND read=0 ORDER BY id DESC", (email,))
@@ -36,7 +36,7 @@ def get_notifications(email, unread_only=False):
         return c.fetchall()
 
 def mark_as_read(notification_id):
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_conn(DB_FILE) as conn:
         c = conn.cursor()
         c.execute("UPDATE notifications SET read=1 WHERE id=?", (notification_id,))
         conn.commit()
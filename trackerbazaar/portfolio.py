@@ -1,7 +1,7 @@
 # trackerbazaar/portfolio.py
-import sqlite3
 import streamlit as st
-from trackerbazaar.data import DB_FILE, init_db
+from trackerbazaar.cache import note_write, user_portfolios
+from trackerbazaar.data import get_conn, init_db
 
 class PortfolioUI:
     def __init__(self, user_email: str):
@@ -9,23 +9,18 @@ class PortfolioUI:
 
     def list_portfolios(self):
         """Fetch portfolios belonging to the logged-in user"""
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, name FROM portfolios WHERE owner_email=?",
-                (self.user_email,)
-            )
-            return cursor.fetchall()
+        return user_portfolios(self.user_email)
 
     def add_portfolio(self, name: str):
         """Add a new portfolio for the current user"""
-        with sqlite3.connect(DB_FILE) as conn:
+        with get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "INSERT INTO portfolios (name, owner_email) VALUES (?, ?)",
                 (name, self.user_email)
             )
             conn.commit()
+        note_write()
 
     def show(self):
         """Streamlit UI for portfolio management"""
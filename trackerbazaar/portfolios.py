@@ -30,3 +30,15 @@ class PortfolioManager:
         Delete a portfolio by its ID.
         """
         return self.tracker.delete_portfolio(portfolio_id)
+
+    def add_transaction(self, portfolio_id, date, symbol, transaction_type, quantity, price, fees=0.0):
+        """
+        Record a BUY/SELL (and update the portfolio's positions).
+        """
+        return self.tracker.add_transaction(portfolio_id, date, symbol, transaction_type, quantity, price, fees)
+
+    def add_dividend(self, portfolio_id, date, symbol, amount):
+        """
+        Record a dividend received.
+        """
+        return self.tracker.add_dividend(portfolio_id, date, symbol, amount)
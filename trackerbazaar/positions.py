@@ -0,0 +1,191 @@
+# trackerbazaar/positions.py
+
+import logging
+import sqlite3
+
+import pandas as pd
+
+from trackerbazaar.corporate_actions import adjust_ledger
+from trackerbazaar.data import get_conn
+from trackerbazaar.holdings import EPS, average_cost
+
+logger = logging.getLogger(__name__)
+
+# The positions table (data.py migration 4) is kept at average cost: it is
+# the policy that updates in O(1) per trade, and rebuild/verify replay the
+# ledger through holdings.average_cost(), which does the same arithmetic
+# vectorized over the whole ledger.
+
+INSERT_TX_SQL = """INSERT INTO transactions
+                   (portfolio_id, date, symbol, type, quantity, price, fees)
+                   VALUES (?,?,?,?,?,?,?)"""
+
+UPSERT_SQL = """
+    INSERT INTO positions (portfolio_id, symbol, net_qty, cost_basis, realized_pnl, last_trade_date)
+    VALUES (?,?,?,?,?,?)
+    ON CONFLICT(portfolio_id, symbol) DO UPDATE SET
+        net_qty=excluded.net_qty, cost_basis=excluded.cost_basis,
+        realized_pnl=excluded.realized_pnl, last_trade_date=excluded.last_trade_date
+"""
+
+POSITIONS_SQL = """SELECT symbol, net_qty, cost_basis, realized_pnl, last_trade_date
+                   FROM positions WHERE portfolio_id=? ORDER BY symbol"""
+
+
+def _in_clause(column: str, values) -> tuple:
+    values = list(values)
+    return f"{column} IN ({','.join('?' * len(values))})", values
+
+
+def _scope(portfolio_id, symbols) -> tuple:
+    """WHERE terms and params for one portfolio (or a list of them) and optionally some symbols."""
+    where, params = [], []
+    if isinstance(portfolio_id, (list, tuple)):
+        clause, values = _in_clause("portfolio_id", portfolio_id)
+        where.append(clause)
+        params.extend(values)
+    elif portfolio_id is not None:
+        where.append("portfolio_id=?")
+        params.append(portfolio_id)
+    if symbols is not None:
+        clause, values = _in_clause("symbol", symbols)
+        where.append(clause)
+        params.extend(values)
+    return where, params
+
+
+def _apply(conn: sqlite3.Connection, portfolio_id: int, date: str, symbol: str, side: str,
+           quantity: float, price: float, fees: float):
+    """Fold one in-order trade into its positions row (average cost)."""
+    row = conn.execute(
+        "SELECT net_qty, cost_basis, realized_pnl FROM positions WHERE portfolio_id=? AND symbol=?",
+        (portfolio_id, symbol),
+    ).fetchone()
+    qty, basis, realized = row or (0.0, 0.0, 0.0)
+    if side == "BUY":
+        qty, basis = qty + quantity, basis + quantity * price + fees
+    elif quantity > 0:
+        matched = min(quantity, max(qty, 0.0))
+        cost = basis / qty * matched if qty > EPS else 0.0
+        if quantity - matched > EPS:
+            logger.warning(f"{symbol}: sell of {quantity:g} on {date} exceeds the open position by {quantity - matched:g}")
+        realized += matched * price - fees * (matched / quantity) - cost
+        qty, basis = qty - matched, basis - cost
+        if qty <= EPS:
+            qty, basis = 0.0, 0.0
+    conn.execute(UPSERT_SQL, (portfolio_id, symbol, qty, basis, realized, date))
+
+
+def record_transaction(conn: sqlite3.Connection, portfolio_id: int, date, symbol: str, side: str,
+                       quantity: float, price: float, fees: float = 0.0) -> int:
+    """
+    Insert a trade and update its position in the caller's transaction, so
+    use it inside ``with get_conn() as conn:``. A trade dated before the
+    position's last trade, or before a corporate action on the symbol,
+    rebuilds that symbol from the ledger instead. Returns the new
+    transaction id.
+    """
+    date, symbol, side = str(date), symbol.strip().upper(), side.strip().upper()
+    quantity, price, fees = float(quantity), float(price), float(fees or 0.0)
+    cur = conn.execute(INSERT_TX_SQL, (portfolio_id, date, symbol, side, quantity, price, fees))
+    last = conn.execute(
+        "SELECT last_trade_date FROM positions WHERE portfolio_id=? AND symbol=?",
+        (portfolio_id, symbol),
+    ).fetchone()
+    restated = conn.execute("SELECT 1 FROM corporate_actions WHERE symbol=? AND ex_date>? LIMIT 1",
+                            (symbol, date)).fetchone()
+    if (last and last[0] and date < last[0]) or restated:
+        rebuild_positions(conn, portfolio_id, [symbol])
+    else:
+        _apply(conn, portfolio_id, date, symbol, side, quantity, price, fees)
+    return cur.lastrowid
+
+
+# ---- rebuild / verify
+
+def _ledger(conn: sqlite3.Connection, portfolio_id: int = None, symbols=None,
+            restate: bool = True) -> pd.DataFrame:
+    """Trades in (portfolio, date, id) order, restated for corporate actions (today's share units) with `restate`."""
+    # Transactions of deleted portfolios are left in place; they have no positions
+    where, params = _scope(portfolio_id, symbols)
+    where.insert(0, "portfolio_id IN (SELECT id FROM portfolios)")
+    sql = ("SELECT id, portfolio_id, date, symbol, type, quantity, price, COALESCE(fees,0) AS fees "
+           "FROM transactions WHERE " + " AND ".join(where))
+    tx = pd.read_sql_query(sql + " ORDER BY portfolio_id, date, id", conn, params=params)
+    return adjust_ledger(tx, conn) if restate else tx
+
+
+def ledger_positions(conn: sqlite3.Connection = None, portfolio_id: int = None, symbols=None,
+                     restate: bool = True) -> pd.DataFrame:
+    """Positions recomputed from the ledger (restated for corporate actions), in the positions table's columns."""
+    conn = conn or get_conn()
+    return average_cost(_ledger(conn, portfolio_id, symbols, restate))
+
+
+def rebuild_positions(conn: sqlite3.Connection = None, portfolio_id: int = None, symbols=None,
+                      restate: bool = True) -> int:
+    """
+    Replace positions rows (all, one portfolio, or some of its symbols)
+    with values recomputed from the ledger; `portfolio_id` may also be a
+    list of ids. Runs in the caller's transaction when given a connection.
+    `restate=False` skips corporate actions (for schemas predating them).
+    Returns the rows written.
+    """
+    own = conn is None
+    conn = conn or get_conn()
+    fresh = ledger_positions(conn, portfolio_id, symbols, restate)
+    where, params = _scope(portfolio_id, symbols)
+    conn.execute("DELETE FROM positions" + (" WHERE " + " AND ".join(where) if where else ""), params)
+    conn.executemany(UPSERT_SQL, fresh.itertuples(index=False, name=None))
+    if own:
+        conn.commit()
+    return len(fresh)
+
+
+def scale_positions(conn: sqlite3.Connection, symbol: str, ex_date: str, factor: float) -> tuple:
+    """
+    Restate every portfolio's `symbol` position for a new corporate action
+    with `factor` shares per share, in the caller's transaction. Positions
+    last traded before the ex-date are scaled in one UPDATE (average cost
+    keeps their cost basis and realized P&L); the ones traded on or after
+    it were mixing pre- and post-action units, so they are replayed from
+    the adjusted ledger together. Returns (rows scaled, rows replayed).
+    """
+    scaled = conn.execute("UPDATE positions SET net_qty = net_qty * ? WHERE symbol=? AND last_trade_date < ?",
+                          (factor, symbol, ex_date)).rowcount
+    mixed = [pid for (pid,) in conn.execute(
+        "SELECT portfolio_id FROM positions WHERE symbol=? AND last_trade_date >= ?", (symbol, ex_date))]
+    replayed = rebuild_positions(conn, mixed, [symbol]) if mixed else 0
+    return scaled, replayed
+
+
+def verify_positions(conn: sqlite3.Connection = None, portfolio_id: int = None, tol: float = 1e-6) -> pd.DataFrame:
+    """
+    Compare the positions table with the ledger. Returns the mismatching
+    (portfolio_id, symbol) rows with stored and expected values; an empty
+    frame means the table is consistent.
+    """
+    conn = conn or get_conn()
+    expected = ledger_positions(conn, portfolio_id)
+    sql = "SELECT portfolio_id, symbol, net_qty, cost_basis, realized_pnl, last_trade_date FROM positions"
+    stored = pd.read_sql_query(sql + (" WHERE portfolio_id=?" if portfolio_id is not None else ""),
+                               conn, params=[portfolio_id] if portfolio_id is not None else [])
+    merged = stored.merge(expected, on=["portfolio_id", "symbol"], how="outer",
+                          suffixes=("_stored", "_ledger"), indicator=True)
+    bad = merged["_merge"] != "both"
+    for col in ("net_qty", "cost_basis", "realized_pnl"):
+        a = merged[f"{col}_stored"].astype(float).fillna(0.0)
+        b = merged[f"{col}_ledger"].astype(float).fillna(0.0)
+        bad |= (a - b).abs() > tol * b.abs().clip(lower=1.0)
+    bad |= merged["last_trade_date_stored"].fillna("") != merged["last_trade_date_ledger"].fillna("")
+    return merged[bad].drop(columns="_merge").reset_index(drop=True)
+
+
+def get_positions(portfolio_id: int, conn: sqlite3.Connection = None, open_only: bool = True) -> pd.DataFrame:
+    """Materialized positions for one portfolio (open ones only by default)."""
+    conn = conn or get_conn()
+    df = pd.read_sql_query(POSITIONS_SQL, conn, params=(portfolio_id,))
+    if open_only:
+        df = df[df["net_qty"] > EPS].reset_index(drop=True)
+    return df
+
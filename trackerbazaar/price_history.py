@@ -0,0 +1,305 @@
+# trackerbazaar/price_history.py
+
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+
+# Kept apart from the app DB: it grows with every snapshot and is append-only
+HISTORY_DB_FILE = "price_history.db"
+
+PKT = pytz.timezone("Asia/Karachi")
+
+# End-of-day rows are stamped at the close of the PSX session so they sort
+# after (and win cross-sectional reads over) that day's intraday snapshots.
+EOD_HOUR = 17
+
+SCHEMA = [
+    # One row per (symbol, trade timestamp); unchanged symbols in a new
+    # snapshot carry the same timestamp and are ignored on insert.
+    """
+    CREATE TABLE IF NOT EXISTS prices (
+        symbol TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        price REAL NOT NULL,
+        change REAL DEFAULT 0,
+        volume REAL DEFAULT 0,
+        high REAL DEFAULT 0,
+        low REAL DEFAULT 0,
+        PRIMARY KEY (symbol, ts)
+    ) WITHOUT ROWID;
+    """,
+    # Cross-sectional reads (all symbols for one day) scan this index only
+    "CREATE INDEX IF NOT EXISTS idx_prices_ts ON prices(ts, symbol, price);",
+]
+
+INSERT_SQL = """
+    INSERT OR IGNORE INTO prices (symbol, ts, price, change, volume, high, low)
+    VALUES (?,?,?,?,?,?,?)
+"""
+REPLACE_SQL = INSERT_SQL.replace("INSERT OR IGNORE", "INSERT OR REPLACE")
+
+COLUMNS = ["symbol", "ts", "price", "change", "volume", "high", "low"]
+
+# Accepted CSV header spellings -> our column
+CSV_ALIASES = {
+    "symbol": "symbol", "ticker": "symbol", "scrip": "symbol",
+    "date": "date", "trade_date": "date", "timestamp": "date",
+    "close": "price", "price": "price", "ldcp": "price", "current": "price",
+    "change": "change", "volume": "volume", "vol": "volume",
+    "high": "high", "low": "low",
+}
+
+
+def connect_history(path: str = HISTORY_DB_FILE) -> sqlite3.Connection:
+    """Open the history DB (WAL, relaxed fsync) and make sure the schema exists."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    for ddl in SCHEMA:
+        conn.execute(ddl.strip())
+    return conn
+
+
+def _day_bounds(day) -> tuple:
+    """[start, end) epoch seconds of a PSX (PKT) calendar day."""
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    elif isinstance(day, datetime):
+        day = day.date()
+    start = PKT.localize(datetime(day.year, day.month, day.day))
+    end = PKT.localize(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def _to_epoch(value) -> int:
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return _day_bounds(value)[0]
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(PKT)
+    return int(ts.timestamp())
+
+
+def append_records(records, conn: sqlite3.Connection = None, path: str = HISTORY_DB_FILE) -> int:
+    """
+    Bulk-append price records with symbol, timestamp, price and optional
+    change/volume/high/low. `records` is anything indexable by field name:
+    a NumPy record array such as psx_data.to_columnar() output, a DataFrame
+    or a dict of arrays. Rows without a timestamp or price are skipped.
+    Returns the number of rows inserted.
+    """
+    n = len(records["symbol"])
+    if n == 0:
+        return 0
+
+    def col(name):
+        try:
+            return np.asarray(records[name], dtype=np.float64)
+        except (KeyError, ValueError):
+            return np.zeros(n)
+
+    ts = col("timestamp").astype(np.int64)
+    price = col("price")
+    keep = (ts > 0) & (price > 0)
+    symbols = np.asarray(records["symbol"], dtype=object)[keep]
+    rows = zip(
+        symbols.tolist(), ts[keep].tolist(), price[keep].tolist(),
+        col("change")[keep].tolist(), col("volume")[keep].tolist(),
+        col("high")[keep].tolist(), col("low")[keep].tolist(),
+    )
+
+    own = conn is None
+    conn = conn or connect_history(path)
+    try:
+        with conn:
+            before = conn.total_changes
+            conn.executemany(INSERT_SQL, rows)
+            return conn.total_changes - before
+    finally:
+        if own:
+            conn.close()
+
+
+def get_series(symbol: str, start=None, end=None, conn: sqlite3.Connection = None,
+               path: str = HISTORY_DB_FILE) -> pd.DataFrame:
+    """Time series for one symbol in [start, end) (a primary-key range scan)."""
+    own = conn is None
+    conn = conn or connect_history(path)
+    try:
+        df = pd.read_sql_query(
+            """SELECT ts, price, change, volume, high, low FROM prices
+               WHERE symbol=? AND ts >= ? AND ts < ? ORDER BY ts""",
+            conn,
+            params=(symbol, _to_epoch(start) or 0, _to_epoch(end) or 2**62),
+        )
+    finally:
+        if own:
+            conn.close()
+    df["time"] = pd.to_datetime(df["ts"], unit="s", utc=True).dt.tz_convert(PKT)
+    return df
+
+
+def get_cross_section(day, conn: sqlite3.Connection = None, path: str = HISTORY_DB_FILE) -> pd.DataFrame:
+    """Last price of every symbol on one PSX trading day (an index range scan on ts)."""
+    start, end = _day_bounds(day)
+    own = conn is None
+    conn = conn or connect_history(path)
+    try:
+        # SQLite returns the row holding MAX(ts) for the bare `price` column
+        return pd.read_sql_query(
+            """SELECT symbol, price, MAX(ts) AS ts FROM prices
+               WHERE ts >= ? AND ts < ? GROUP BY symbol ORDER BY symbol""",
+            conn,
+            params=(start, end),
+        )
+    finally:
+        if own:
+            conn.close()
+
+
+# ----------------------------- bulk backfill -------------------------------
+
+def _eod_ts(dates: pd.Series) -> np.ndarray:
+    """Epoch seconds of EOD_HOUR PKT on each date."""
+    days = pd.to_datetime(dates, errors="coerce").dt.normalize()
+    stamps = (days + pd.Timedelta(hours=EOD_HOUR)).dt.tz_localize(PKT)
+    out = np.zeros(len(stamps), dtype=np.int64)
+    valid = stamps.notna().to_numpy()
+    out[valid] = stamps[valid].dt.as_unit("s").astype("int64").to_numpy()  # pandas may parse to us or ns
+    return out
+
+
+def _parse_csv(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    df = df.rename(columns=lambda c: CSV_ALIASES.get(str(c).strip().lower(), str(c).strip().lower()))
+    missing = {"symbol", "date", "price"} - set(df.columns)
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {sorted(missing)}")
+    df["ts"] = _eod_ts(df["date"])
+    return df
+
+
+def _parse_json(path: str) -> pd.DataFrame:
+    """market-data.json (data -> market -> symbol) or psx_data.json (data -> symbol)."""
+    with open(path, "r") as f:
+        payload = json.load(f)
+    rows = []
+    for key, value in (payload.get("data") or {}).items():
+        if not isinstance(value, dict):
+            continue
+        items = [(key, value)] if "price" in value else value.items()
+        for symbol, item in items:
+            if isinstance(item, dict):
+                rows.append((symbol, item.get("timestamp"), item.get("price"), item.get("change"),
+                             item.get("volume"), item.get("high"), item.get("low")))
+    df = pd.DataFrame(rows, columns=["symbol", "date", "price", "change", "volume", "high", "low"])
+    numeric = pd.to_numeric(df["date"], errors="coerce")
+    as_seconds = numeric.where(numeric < 1e11, numeric / 1000)
+    dates = pd.to_datetime(as_seconds, unit="s", utc=True).dt.tz_convert(PKT).dt.tz_localize(None)
+    df["ts"] = _eod_ts(dates.fillna(pd.to_datetime(df["date"], errors="coerce")))
+    return df
+
+
+def parse_price_file(path: str) -> pd.DataFrame:
+    """
+    Parse one end-of-day price file (CSV, or JSON in the market-data.json
+    shape) into COLUMNS, stamped at EOD_HOUR PKT and de-duplicated on
+    (symbol, date) with the last occurrence winning.
+    """
+    df = _parse_json(path) if path.lower().endswith(".json") else _parse_csv(path)
+    for col in ("price", "change", "volume", "high", "low"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0) if col in df else 0.0
+    df["symbol"] = df["symbol"].astype(str).str.strip().str.upper()
+    df = df[(df["ts"] > 0) & (df["price"] > 0) & (df["symbol"] != "")]
+    return df.drop_duplicates(["symbol", "ts"], keep="last")[COLUMNS]
+
+
+def bulk_load(paths, path: str = HISTORY_DB_FILE, workers: int = None, batch_size: int = 250_000,
+              replace: bool = False, rebuild_index: bool = True, progress=None) -> dict:
+    """
+    Backfill price history from many EOD files.
+
+    Files are parsed in parallel across processes. Rows are buffered,
+    de-duplicated on (symbol, date) and inserted in primary-key order in
+    transactions of about `batch_size` rows. With `rebuild_index` the
+    secondary ts index is dropped for the load and rebuilt once at the end,
+    which is much cheaper than maintaining it row by row. `replace` lets
+    newer files overwrite rows that already exist. Returns load statistics,
+    including rows per second and the earliest timestamp loaded.
+    """
+    paths = list(paths)
+    stats = {"files": len(paths), "failed_files": 0, "rows_parsed": 0,
+             "rows_inserted": 0, "first_ts": None, "seconds": 0.0, "rows_per_sec": 0.0}
+    started = time.perf_counter()
+    sql = REPLACE_SQL if replace else INSERT_SQL
+
+    conn = connect_history(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MB
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if rebuild_index:
+        conn.execute("DROP INDEX IF EXISTS idx_prices_ts")
+
+    pending = []
+
+    def flush():
+        if not pending:
+            return
+        batch = pd.concat(pending, ignore_index=True)
+        pending.clear()
+        batch = batch.drop_duplicates(["symbol", "ts"], keep="last").sort_values(["symbol", "ts"])
+        with conn:
+            before = conn.total_changes
+            conn.executemany(sql, batch.itertuples(index=False, name=None))
+            stats["rows_inserted"] += conn.total_changes - before
+        if len(batch):
+            first = int(batch["ts"].min())
+            stats["first_ts"] = first if stats["first_ts"] is None else min(stats["first_ts"], first)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = {pool.submit(parse_price_file, p): p for p in paths}
+            buffered = 0
+            for done, fut in enumerate(as_completed(futures), 1):
+                try:
+                    df = fut.result()
+                except Exception as e:
+                    stats["failed_files"] += 1
+                    if progress:
+                        progress(f"skipped {futures[fut]}: {e}")
+                    continue
+                stats["rows_parsed"] += len(df)
+                pending.append(df)
+                buffered += len(df)
+                if buffered >= batch_size:
+                    flush()
+                    buffered = 0
+                    if progress:
+                        elapsed = time.perf_counter() - started
+                        progress(f"{done}/{len(paths)} files, {stats['rows_inserted']:,} rows "
+                                 f"({stats['rows_inserted'] / elapsed:,.0f} rows/s)")
+            flush()
+        if rebuild_index:
+            if progress:
+                progress("rebuilding ts index…")
+            for ddl in SCHEMA[1:]:
+                conn.execute(ddl)
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["rows_per_sec"] = stats["rows_inserted"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
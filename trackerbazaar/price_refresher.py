@@ -0,0 +1,108 @@
+# trackerbazaar/price_refresher.py
+
+import logging
+import os
+import threading
+from datetime import datetime
+
+import pytz
+
+from trackerbazaar.current_prices import DATA_FILE
+from trackerbazaar.price_store import get_price_store
+from trackerbazaar.psx_data import fallback_snapshot, is_working_hours, load_psx_data, save_psx_data
+
+logger = logging.getLogger(__name__)
+
+# Poll cadence in seconds; set TRACKERBAZAAR_PRICE_REFRESH_SECONDS=0 to disable the refresher
+REFRESH_INTERVAL = float(os.environ.get("TRACKERBAZAAR_PRICE_REFRESH_SECONDS", 60))
+OFF_HOURS_INTERVAL = float(os.environ.get("TRACKERBAZAAR_PRICE_OFF_HOURS_SECONDS", 1800))
+
+
+class PriceRefresher(threading.Thread):
+    """
+    Daemon thread that keeps the shared PriceStore fresh.
+
+    During PSX hours it fetches every `interval` seconds, outside them every
+    `off_hours_interval`; failures back off exponentially up to the
+    off-hours interval. Each new snapshot is saved to disk (snapshot files +
+    price history) and published to the in-memory store, so page renders
+    only ever read memory.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL, off_hours_interval: float = OFF_HOURS_INTERVAL,
+                 data_file: str = DATA_FILE):
+        super().__init__(name="psx-price-refresher", daemon=True)
+        self.interval = interval
+        self.off_hours_interval = max(off_hours_interval, interval)
+        self.store = get_price_store(data_file)
+        self._stop_event = threading.Event()
+        self._failures = 0
+        self.status = {
+            "last_run": None, "last_success": None, "last_version": None,
+            "last_error": None, "next_run_in": None,
+        }
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _next_delay(self) -> float:
+        base = self.interval if is_working_hours() else self.off_hours_interval
+        if self._failures:
+            return min(base * (2 ** self._failures), self.off_hours_interval)
+        return base
+
+    def refresh_once(self):
+        """
+        Fetch, save and publish one snapshot. Returns the published version,
+        or None when nothing changed; fetch and write failures propagate so
+        run() can back off and report them.
+        """
+        self.status["last_run"] = datetime.now(pytz.UTC).isoformat()
+        snapshot = save_psx_data()
+        if snapshot is None:
+            return None
+        self.store.publish(snapshot, version=snapshot.get("version"))
+        self.status["last_success"] = self.status["last_run"]
+        self.status["last_version"] = snapshot.get("version")
+        return snapshot.get("version")
+
+    def run(self):
+        # Serve whatever was saved last time right away; the built-in
+        # fallback prices only when nothing has ever been saved
+        saved = load_psx_data()
+        if not saved["data"] and not len(self.store):
+            saved = fallback_snapshot()
+        if saved["data"]:
+            self.store.publish(saved, version=saved.get("version"))
+
+        while not self._stop_event.is_set():
+            try:
+                self.refresh_once()
+                self._failures = 0
+                self.status["last_error"] = None
+            except Exception as e:
+                self._failures += 1
+                self.status["last_error"] = str(e)
+                logger.warning(f"Price refresh failed ({self._failures} in a row): {e}")
+            delay = self._next_delay()
+            self.status["next_run_in"] = delay
+            self._stop_event.wait(delay)
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def start_price_refresher(**kwargs):
+    """Start the process-wide refresher once; later calls (every Streamlit rerun) are no-ops."""
+    global _refresher
+    if REFRESH_INTERVAL <= 0 and "interval" not in kwargs:
+        return None
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = PriceRefresher(**kwargs)
+            _refresher.start()
+        return _refresher
+
+def refresher_status() -> dict:
+    """Status of the background refresher (empty if it isn't running)."""
+    return dict(_refresher.status) if _refresher is not None else {}
@@ -0,0 +1,214 @@
+# trackerbazaar/price_store.py
+
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+# Bare-symbol lookups resolve to the first market (in this order) that lists the symbol
+MARKET_PRIORITY = ("REG", "ODL", "IDX", "BNB", "FUT")
+
+
+def _to_epoch(ts) -> float:
+    if ts is None or ts == "":
+        return 0.0
+    if isinstance(ts, (int, float)):
+        return float(ts) / 1000.0 if ts > 1e11 else float(ts)  # ms vs s
+    try:
+        return datetime.fromisoformat(str(ts)).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _iter_rows(payload: dict):
+    """
+    Yield (market, symbol, item, flat) from either snapshot shape:
+    market-data.json nests data -> market -> symbol, psx_data.json is flat
+    data -> symbol (with an optional per-item "market").
+    """
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if not isinstance(data, dict):
+        return
+    for key, value in data.items():
+        if not isinstance(value, dict):
+            continue
+        if "price" in value:
+            yield value.get("market", "REG"), key, value, True
+        else:
+            for symbol, item in value.items():
+                if isinstance(item, dict):
+                    yield key, symbol, item, False
+
+
+class PriceSnapshot:
+    """
+    One immutable, columnar snapshot: parallel NumPy columns plus two sorted
+    key arrays ("MARKET:SYMBOL" and bare symbol) so a whole list of symbols
+    resolves with one `searchsorted` instead of N dict probes.
+    """
+
+    def __init__(self, rows=(), version=None):
+        rows = list(rows)
+        n = len(rows)
+        self.version = version
+        self.markets = np.array([r[0] for r in rows], dtype=object)
+        self.symbols = np.array([r[1] for r in rows], dtype=object)
+        self.price = np.fromiter((r[2] for r in rows), dtype=np.float64, count=n)
+        self.change = np.fromiter((r[3] for r in rows), dtype=np.float64, count=n)
+        self.change_pct = np.fromiter((r[4] for r in rows), dtype=np.float64, count=n)
+        self.volume = np.fromiter((r[5] for r in rows), dtype=np.float64, count=n)
+        self.timestamp = np.fromiter((r[6] for r in rows), dtype=np.float64, count=n)
+
+        # (market, symbol) index
+        full = np.array([f"{m}:{s}" for m, s in zip(self.markets, self.symbols)], dtype=str)
+        order = np.argsort(full, kind="stable")
+        self._full_keys, self._full_rows = full[order], order
+
+        # bare symbol index, preferring MARKET_PRIORITY
+        rank = {m: i for i, m in enumerate(MARKET_PRIORITY)}
+        best = {}
+        for row, (m, s) in enumerate(zip(self.markets, self.symbols)):
+            cur = best.get(s)
+            if cur is None or rank.get(m, len(rank)) < rank.get(self.markets[cur], len(rank)):
+                best[s] = row
+        keys = np.array(list(best.keys()), dtype=str)
+        rows_ = np.fromiter(best.values(), dtype=np.int64, count=len(best))
+        order = np.argsort(keys, kind="stable")
+        self._sym_keys, self._sym_rows = keys[order], rows_[order]
+
+    @classmethod
+    def from_payload(cls, payload: dict, version=None) -> "PriceSnapshot":
+        """Build a snapshot from a parsed market-data.json / psx_data.json dict."""
+        rows = []
+        for market, symbol, item, flat in _iter_rows(payload):
+            try:
+                price = float(item.get("price") or 0.0)
+            except (TypeError, ValueError):
+                continue
+            pct = float(item.get("changePercent") or 0.0)
+            rows.append((
+                market, symbol, price,
+                float(item.get("change") or 0.0),
+                pct if flat else pct * 100,  # raw feed is a fraction; psx_data.json stores percent
+                float(item.get("volume") or 0.0),
+                _to_epoch(item.get("timestamp")),
+            ))
+        if isinstance(payload, dict):
+            version = payload.get("version", version)
+        return cls(rows, version=version)
+
+    def rows_for(self, symbols, market: str = None) -> np.ndarray:
+        """Row index per requested symbol, -1 where unknown."""
+        query = np.asarray(list(symbols), dtype=str)
+        if market:
+            query = np.char.add(f"{market}:", query)
+            keys, rows = self._full_keys, self._full_rows
+        else:
+            keys, rows = self._sym_keys, self._sym_rows
+        if query.size == 0 or keys.size == 0:
+            return np.full(query.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(keys, query)
+        pos = np.clip(pos, 0, keys.size - 1)
+        hit = keys[pos] == query
+        return np.where(hit, rows[pos], -1)
+
+    def take(self, column: np.ndarray, rows: np.ndarray, default=0.0) -> np.ndarray:
+        """Gather `column` at `rows`, filling -1 (unknown) rows with `default`."""
+        out = np.full(rows.shape, default, dtype=column.dtype)
+        found = rows >= 0
+        out[found] = column[rows[found]]
+        return out
+
+    def __len__(self):
+        return int(self.price.size)
+
+
+class PriceStore:
+    """
+    Process-wide holder of the current PriceSnapshot for one file.
+
+    The file is re-parsed only when its mtime/size changes, and the new
+    snapshot replaces the old one with a single reference swap, so readers
+    never see a half-loaded set of columns. Snapshots fetched in-process
+    can be pushed in with publish().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self.snapshot = PriceSnapshot()
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Re-parse the snapshot if the file changed. Returns True if it reloaded."""
+        stamp = self._file_stamp()
+        if not force and stamp == self._stamp:
+            return False
+        with self._lock:
+            if not force and stamp == self._stamp:
+                return False
+            payload = {}
+            if stamp is not None:
+                try:
+                    with open(self.path, "r") as f:
+                        payload = json.load(f)
+                except (OSError, ValueError):
+                    return False  # keep serving the last good snapshot
+            self.snapshot = PriceSnapshot.from_payload(payload, version=stamp)
+            self._stamp = stamp
+            return True
+
+    def publish(self, payload: dict, version=None):
+        """
+        Swap in a snapshot produced in-process (e.g. by the background
+        refresher) without touching the file. Older versions are ignored.
+        """
+        snapshot = PriceSnapshot.from_payload(payload, version=version)
+        with self._lock:
+            current = self.snapshot.version
+            if (isinstance(current, int) and isinstance(snapshot.version, int)
+                    and snapshot.version <= current):
+                return False
+            self.snapshot = snapshot
+            # Adopt the current file state so refresh() doesn't clobber this with stale disk data
+            self._stamp = self._file_stamp()
+            return True
+
+    def get_prices(self, symbols, market: str = None) -> np.ndarray:
+        """Prices for `symbols` in one vectorized lookup (0.0 where missing)."""
+        self.refresh()
+        snap = self.snapshot
+        return snap.take(snap.price, snap.rows_for(symbols, market))
+
+    def get_price(self, symbol: str, market: str = None) -> float:
+        return float(self.get_prices([symbol], market)[0])
+
+    def __len__(self):
+        return len(self.snapshot)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_price_store(path: str) -> PriceStore:
+    """Return the process-wide store for `path` (created and loaded on first use)."""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = PriceStore(path)
+    store.refresh()
+    return store
@@ -0,0 +1,695 @@
+# trackerbazaar/psx_data.py
+
+import requests
+import glob
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from urllib.parse import urlsplit
+import pytz
+from requests.adapters import HTTPAdapter
+import logging
+import os
+import numpy as np
+from trackerbazaar.price_history import append_records
+from trackerbazaar.source_health import get_breaker, hedged_call
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "psx_data.json"        # last full snapshot
+DELTA_FILE = "psx_data.delta.json"     # changes since SNAPSHOT_FILE
+DELTA_MAX_RATIO = 0.25                 # rewrite the full snapshot past this share of changed symbols
+COLUMNAR_PREFIX = "psx_data.v"         # psx_data.v00000042.npy, one per version
+COLUMNAR_KEEP = 3                      # versions kept around for readers still mapping an older one
+
+# Record layout of the columnar (.npy) snapshot
+COLUMNAR_DTYPE = np.dtype([
+    ("symbol", "U24"), ("market", "U4"), ("sharia", "?"),
+    ("price", "f8"), ("change", "f8"), ("changePercent", "f8"),
+    ("volume", "f8"), ("trades", "f8"), ("value", "f8"),
+    ("high", "f8"), ("low", "f8"), ("bid", "f8"), ("ask", "f8"),
+    ("bidVol", "f8"), ("askVol", "f8"), ("timestamp", "f8"),
+])
+
+MARKET_DATA_URL = "https://psxterminal.com/api/market-data"
+DPS_SYMBOLS_URL = "https://dps.psx.com.pk/symbols"
+YIELDS_URL = "https://psxterminal.com/api/yields/{ticker}"
+
+# Source chain tuning (psxterminal -> DPS -> FALLBACK_PRICES)
+SOURCE_TIMEOUT = 10.0        # per-request timeout for a price source
+HEDGE_AFTER = 2.0            # start the secondary source if the primary is slower than this
+FETCH_ATTEMPTS = 3           # attempts during market hours (1 outside them)
+RETRY_WAIT = 2.0             # seconds between attempts
+FETCH_DEADLINE = 25.0        # hard cap on the whole source chain
+
+# Yields fetch tuning (the REG board alone is ~500 symbols)
+YIELDS_WORKERS = 16          # concurrent requests in flight
+YIELDS_RATE_LIMIT = 50.0     # max requests/second per host
+YIELDS_TIMEOUT = (3.05, 5)   # (connect, read) seconds per request
+YIELDS_DEADLINE = 30.0       # seconds for the whole batch
+
+
+def is_working_hours():
+    """Check if current time is within PSX working hours (9 AM–5 PM PKT, UTC+5)."""
+    now_utc = datetime.now(pytz.UTC)
+    pkt_tz = pytz.timezone("Asia/Karachi")
+    now_pkt = now_utc.astimezone(pkt_tz)
+    hour = now_pkt.hour
+    return 9 <= hour < 17
+
+
+# ------------------------- concurrent fetch engine -------------------------
+
+class RateLimiter:
+    """Token bucket shared by every worker talking to one host."""
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float = None) -> bool:
+        """Block until a token is available. Returns False if `deadline` (monotonic) passes first."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_for = (1 - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+
+_host_limiters = {}
+_host_limiters_lock = threading.Lock()
+
+def _limiter_for(url: str, rate: float) -> RateLimiter:
+    """Return the process-wide limiter for the host in `url`."""
+    host = urlsplit(url).netloc
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(host)
+        if limiter is None or limiter.rate != rate:
+            limiter = _host_limiters[host] = RateLimiter(rate)
+        return limiter
+
+def make_session(pool_size: int = YIELDS_WORKERS) -> requests.Session:
+    """Keep-alive session whose connection pool is sized for `pool_size` workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _fetch_one_yield(session, url, timeout, limiter, deadline):
+    if not limiter.acquire(deadline):
+        raise TimeoutError("batch deadline reached before request was sent")
+    # Never let a single request outlive the batch deadline
+    remaining = max(0.1, deadline - time.monotonic())
+    if isinstance(timeout, tuple):
+        timeout = tuple(min(t, remaining) for t in timeout)
+    else:
+        timeout = min(timeout, remaining)
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+def fetch_yields(tickers, url_template: str = YIELDS_URL, workers: int = YIELDS_WORKERS,
+                 rate_limit: float = YIELDS_RATE_LIMIT, timeout=YIELDS_TIMEOUT,
+                 deadline: float = YIELDS_DEADLINE, session: requests.Session = None):
+    """
+    Fetch the yields endpoint for many tickers concurrently.
+
+    Requests go through one pooled keep-alive session and a per-host rate
+    limit; each request has its own timeout and the whole batch is cut off
+    at `deadline` seconds. Returns ``(results, stats)`` where `results` maps
+    ticker -> {"price": float, "sharia": bool} and `stats` reports counts,
+    elapsed seconds and the achieved requests per second.
+    """
+    tickers = list(tickers)
+    results = {}
+    stats = {"requests": len(tickers), "ok": 0, "failed": 0, "timed_out": 0,
+             "elapsed": 0.0, "rps": 0.0}
+    if not tickers:
+        return results, stats
+
+    own_session = session is None
+    session = session or make_session(workers)
+    limiter = _limiter_for(url_template.format(ticker=tickers[0]), rate_limit)
+    started = time.monotonic()
+    batch_deadline = started + deadline
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="psx-yields")
+    try:
+        futures = {
+            pool.submit(_fetch_one_yield, session, url_template.format(ticker=t),
+                        timeout, limiter, batch_deadline): t
+            for t in tickers
+        }
+        done, pending = wait(futures, timeout=deadline)
+        for fut in pending:
+            fut.cancel()
+        stats["timed_out"] = len(pending)
+
+        for fut in done:
+            ticker = futures[fut]
+            try:
+                response_json = fut.result()
+            except (TimeoutError, requests.Timeout):
+                stats["timed_out"] += 1
+                continue
+            except (requests.RequestException, ValueError) as e:
+                logger.warning(f"Error fetching yields data for {ticker}: {e}")
+                stats["failed"] += 1
+                continue
+            yields_data = response_json.get("data", {}) if isinstance(response_json, dict) else None
+            if not isinstance(yields_data, dict):
+                logger.warning(f"Invalid yields data for {ticker}: {yields_data}")
+                stats["failed"] += 1
+                continue
+            price = yields_data.get("price")
+            if price is None:
+                continue
+            try:
+                results[ticker] = {
+                    "price": float(price),
+                    "sharia": not yields_data.get("isNonCompliant", True),
+                }
+                stats["ok"] += 1
+            except (ValueError, TypeError):
+                logger.warning(f"Invalid price for {ticker}: {price}")
+                stats["failed"] += 1
+    finally:
+        # Drop queued requests, but let in-flight ones finish (each is capped at
+        # the batch deadline) before their session is closed under them
+        pool.shutdown(wait=True, cancel_futures=True)
+        if own_session:
+            session.close()
+
+    stats["elapsed"] = time.monotonic() - started
+    sent = stats["requests"] - stats["timed_out"]
+    stats["rps"] = sent / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+    logger.info(
+        "Yields fetch: %(ok)d ok, %(failed)d failed, %(timed_out)d timed out "
+        "in %(elapsed).2fs (%(rps).1f req/s)", stats
+    )
+    return results, stats
+
+
+# ------------------------------ PSX sources --------------------------------
+
+class NotModified(Exception):
+    """The source answered 304: nothing changed since the validators we sent."""
+
+
+def conditional_get(url: str, validators: dict = None, timeout=10, session=None):
+    """
+    GET `url` sending If-None-Match / If-Modified-Since from `validators`
+    (a dict of url -> {"etag", "last_modified"}, updated in place).
+    Raises NotModified on a 304.
+    """
+    headers = {}
+    cached = (validators or {}).get(url, {})
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = (session or requests).get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        raise NotModified(url)
+    response.raise_for_status()
+
+    if validators is not None:
+        fresh = {}
+        if response.headers.get("ETag"):
+            fresh["etag"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            fresh["last_modified"] = response.headers["Last-Modified"]
+        if fresh:
+            validators[url] = fresh
+        else:
+            validators.pop(url, None)
+    return response
+
+
+FALLBACK_PRICES = {
+    'MLCF': {'price': 83.48, 'sharia': True, 'type': 'Stock'},
+    'GCIL': {'price': 26.70, 'sharia': True, 'type': 'Stock'},
+    'MEBL': {'price': 374.98, 'sharia': True, 'type': 'Stock'},
+    'OGDC': {'price': 272.69, 'sharia': True, 'type': 'Stock'},
+    'GAL': {'price': 529.99, 'sharia': True, 'type': 'Stock'},
+    'GHNI': {'price': 788.00, 'sharia': True, 'type': 'Stock'},
+    'HALEON': {'price': 829.00, 'sharia': True, 'type': 'Stock'},
+    'MARI': {'price': 629.60, 'sharia': True, 'type': 'Stock'},
+    'GLAXO': {'price': 429.99, 'sharia': True, 'type': 'Stock'},
+    'FECTC': {'price': 88.15, 'sharia': True, 'type': 'Stock'},
+    'FFC': {'price': 454.10, 'sharia': False, 'type': 'Stock'},
+    'MUGHAL': {'price': 64.01, 'sharia': False, 'type': 'Stock'},
+    'MUF1': {'price': 150.00, 'sharia': True, 'type': 'Mutual Fund'},
+    'COM1': {'price': 2500.00, 'sharia': False, 'type': 'Commodity'}
+}
+
+
+def fallback_snapshot() -> dict:
+    """
+    FALLBACK_PRICES as an in-memory snapshot (version 0), for serving
+    something before any fetch has ever succeeded. Never written to disk
+    or to the price history.
+    """
+    return {"version": 0, "timestamp": None, "validators": {},
+            "data": {ticker: dict(item) for ticker, item in FALLBACK_PRICES.items()}}
+
+
+class SourcesUnavailable(Exception):
+    """Every PSX price source failed; the last saved snapshot stays as it is."""
+
+
+def _fetch_market_data(previous: dict, validators: dict):
+    """Primary source: psxterminal market-data (all boards, full quotes)."""
+    prices = {}
+    try:
+        response = conditional_get(MARKET_DATA_URL, validators, timeout=SOURCE_TIMEOUT)
+    except NotModified:
+        if previous:
+            logger.info("Market data not modified since last fetch.")
+            return previous
+        validators.pop(MARKET_DATA_URL, None)
+        response = conditional_get(MARKET_DATA_URL, validators, timeout=SOURCE_TIMEOUT)
+    try:
+        response_json = response.json()
+    except json.JSONDecodeError:
+        logger.error(f"Failed to parse market data API response as JSON: {response.text}.")
+        raise requests.RequestException("JSON decode error")
+    if not isinstance(response_json, dict) or not response_json.get("success", False):
+        logger.error("Market data API returned unexpected response.")
+        raise requests.RequestException("Invalid response")
+    market_data = response_json.get("data", {})
+    if not isinstance(market_data, dict):
+        logger.error(f"Market data 'data' field is not a dict: {type(market_data)}.")
+        raise requests.RequestException("Invalid data field")
+    for market, stocks in market_data.items():
+        if not isinstance(stocks, dict):
+            logger.warning(f"Skipping invalid market data for {market}: {stocks}")
+            continue
+        for ticker, item in stocks.items():
+            if not isinstance(item, dict):
+                logger.warning(f"Skipping invalid stock data for {ticker}: {item}")
+                continue
+            price = item.get("price")
+            if ticker and price is not None:
+                try:
+                    prices[ticker] = {
+                        "market": market,
+                        "price": float(price),
+                        "sharia": False,  # Default, updated later via /api/yields
+                        "type": "Stock",
+                        "change": item.get("change", 0.0),
+                        "changePercent": item.get("changePercent", 0.0) * 100,  # Convert to percentage
+                        "volume": item.get("volume", 0),
+                        "trades": item.get("trades", 0),
+                        "value": item.get("value", 0.0),
+                        "high": item.get("high", 0.0),
+                        "low": item.get("low", 0.0),
+                        "bid": item.get("bid", 0.0),
+                        "ask": item.get("ask", 0.0),
+                        "bidVol": item.get("bidVol", 0),
+                        "askVol": item.get("askVol", 0),
+                        "timestamp": datetime.fromtimestamp(item.get("timestamp", 0)).isoformat() if item.get("timestamp") else datetime.now(pytz.UTC).isoformat()
+                    }
+                except (ValueError, TypeError):
+                    logger.warning(f"Invalid price for {ticker}: {price}")
+                    continue
+    if not prices:
+        raise requests.RequestException("Market data API returned no prices")
+    return prices
+
+
+def _fetch_dps_symbols():
+    """Secondary source: DPS symbol list (no quotes; prices are filled in from /api/yields)."""
+    response = requests.get(DPS_SYMBOLS_URL, timeout=SOURCE_TIMEOUT)
+    response.raise_for_status()
+    try:
+        symbols_data = response.json()
+    except json.JSONDecodeError:
+        logger.error(f"Failed to parse DPS PSX response as JSON: {response.text}.")
+        raise requests.RequestException("JSON decode error")
+    prices = {}
+    now = datetime.now(pytz.UTC).isoformat()
+    for item in symbols_data:
+        ticker = item.get("symbol")
+        if ticker:
+            prices[ticker] = {
+                "price": 0.0,
+                "sharia": False,  # Default, updated later or via fallback
+                "type": "Stock",
+                "change": 0.0,
+                "changePercent": 0.0,
+                "volume": 0,
+                "trades": 0,
+                "value": 0.0,
+                "high": 0.0,
+                "low": 0.0,
+                "bid": 0.0,
+                "ask": 0.0,
+                "bidVol": 0,
+                "askVol": 0,
+                "timestamp": now
+            }
+    if not prices:
+        raise requests.RequestException("DPS returned no symbols")
+    return prices
+
+
+def retry_attempts() -> int:
+    """Retry policy, evaluated on every call: retry during market hours only."""
+    return FETCH_ATTEMPTS if is_working_hours() else 1
+
+
+def fetch_psx_data(previous: dict = None, validators: dict = None):
+    """
+    Fetch stock prices and data from PSX Terminal APIs, fallback to DPS PSX.
+
+    psxterminal is the primary source. If it hasn't answered within
+    HEDGE_AFTER seconds, or fails or has its breaker open, the DPS request
+    is started in parallel and the first success wins. If both fail, the
+    hedged pair is retried per retry_attempts() within FETCH_DEADLINE, and
+    then SourcesUnavailable is raised.
+
+    With `previous` (the last snapshot's data) the fetch is incremental:
+    a 304 from the market-data endpoint returns `previous` as-is, and the
+    per-ticker yields are only refreshed for symbols whose `timestamp`
+    moved. `validators` carries ETag/Last-Modified between runs; each
+    attempt works on its own copy and only the winner's is kept, so a
+    losing psxterminal request still running after DPS won can't leave
+    validators that don't match the saved data.
+    """
+    previous = previous or {}
+    validators = {} if validators is None else validators
+
+    def market_data():
+        own = dict(validators)
+        return _fetch_market_data(previous, own), own
+
+    primary = (get_breaker("psxterminal"), market_data)
+    secondary = (get_breaker("dps"), lambda: (_fetch_dps_symbols(), None))
+
+    started = time.monotonic()
+    prices = None
+    attempts = retry_attempts()
+    for attempt in range(1, attempts + 1):
+        remaining = FETCH_DEADLINE - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        try:
+            source, (prices, fresh) = hedged_call(primary, secondary, budget=HEDGE_AFTER,
+                                                  timeout=min(remaining, SOURCE_TIMEOUT + HEDGE_AFTER))
+            if fresh is None:  # DPS data: the next run must not get a 304 against psxterminal's old state
+                validators.pop(MARKET_DATA_URL, None)
+            else:
+                validators.clear()
+                validators.update(fresh)
+            logger.info(f"PSX prices from {source} ({len(prices)} symbols)")
+            break
+        except Exception as e:
+            logger.error(f"PSX sources failed (attempt {attempt}/{attempts}): {e}")
+            if attempt < attempts:
+                time.sleep(min(RETRY_WAIT, max(0.0, FETCH_DEADLINE - (time.monotonic() - started))))
+    if prices is None:
+        raise SourcesUnavailable(f"no PSX price source answered in {attempts} attempt(s)")
+    if prices is previous:
+        return previous
+
+    stale = []
+    for ticker, item in prices.items():
+        prev = previous.get(ticker)
+        if prev and prev.get("timestamp") == item["timestamp"]:
+            # Untraded since last run: keep the yields-derived fields we already have
+            item["price"] = prev.get("price", item["price"])
+            item["sharia"] = prev.get("sharia", item["sharia"])
+        else:
+            stale.append(ticker)
+
+    yields_breaker = get_breaker("yields")
+    if stale and yields_breaker.allow():
+        yields, stats = fetch_yields(stale)
+        if stats["ok"] == 0:
+            yields_breaker.record_failure(stats["elapsed"], "no yields returned")
+        else:
+            yields_breaker.record_success(stats["elapsed"])
+        for ticker, info in yields.items():
+            prices[ticker]["price"] = info["price"]
+            prices[ticker]["sharia"] = info["sharia"]
+    elif stale:
+        logger.warning("Yields circuit open; keeping previous yields-derived prices.")
+
+    return prices
+
+
+# ------------------------------- snapshots ---------------------------------
+
+def _read_json(path: str):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _atomic_write(path: str, write):
+    """Write via a temp file in the same directory, then rename over `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def write_json_atomic(path: str, obj):
+    """Compact JSON, atomically replaced so readers never see a half-written file."""
+    payload = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    _atomic_write(path, lambda f: f.write(payload))
+
+def load_psx_data(path: str = SNAPSHOT_FILE, delta_path: str = DELTA_FILE) -> dict:
+    """
+    Return the current snapshot: the last full snapshot with the pending
+    delta (if it was taken against that snapshot) applied on top.
+    """
+    base = _read_json(path)
+    if not isinstance(base, dict):
+        return {"version": 0, "timestamp": None, "data": {}, "validators": {}}
+    snapshot = {
+        "version": base.get("version", 0),
+        "timestamp": base.get("timestamp"),
+        "data": dict(base.get("data") or {}),
+        "validators": base.get("validators") or {},
+    }
+    delta = _read_json(delta_path)
+    if isinstance(delta, dict) and delta.get("base_timestamp") == base.get("timestamp"):
+        snapshot["data"].update(delta.get("data") or {})
+        for ticker in delta.get("removed") or []:
+            snapshot["data"].pop(ticker, None)
+        snapshot["version"] = delta.get("version", snapshot["version"])
+        snapshot["timestamp"] = delta.get("timestamp", snapshot["timestamp"])
+        snapshot["validators"] = delta.get("validators") or snapshot["validators"]
+    return snapshot
+
+def diff_psx_data(old: dict, new: dict):
+    """Return (changed, removed): symbols whose `timestamp` differs or that are new, and symbols that vanished."""
+    changed = {
+        ticker: item for ticker, item in new.items()
+        if ticker not in old or old[ticker].get("timestamp") != item.get("timestamp")
+    }
+    removed = [ticker for ticker in old if ticker not in new]
+    return changed, removed
+
+
+# --------------------------- columnar snapshots -----------------------------
+
+def _epoch(ts) -> float:
+    if not ts:
+        return 0.0
+    try:
+        return datetime.fromisoformat(str(ts)).timestamp()
+    except ValueError:
+        return 0.0
+
+def to_columnar(data: dict) -> np.ndarray:
+    """Convert a {symbol: item} price dict into a COLUMNAR_DTYPE record array."""
+    items = sorted(data.items())
+    arr = np.zeros(len(items), dtype=COLUMNAR_DTYPE)
+    if not items:
+        return arr
+
+    def num(value):
+        try:
+            return float(value or 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    arr["symbol"] = [ticker for ticker, _ in items]
+    arr["market"] = [item.get("market", "REG") for _, item in items]
+    arr["sharia"] = [bool(item.get("sharia", False)) for _, item in items]
+    for field in COLUMNAR_DTYPE.names[3:-1]:
+        arr[field] = [num(item.get(field)) for _, item in items]
+    arr["timestamp"] = [_epoch(item.get("timestamp")) for _, item in items]
+    return arr
+
+def columnar_path(version: int, directory: str = ".") -> str:
+    return os.path.join(directory, f"{COLUMNAR_PREFIX}{int(version):08d}.npy")
+
+def write_columnar_snapshot(data, version: int, directory: str = ".") -> str:
+    """
+    Atomically write version `version` (a price dict or to_columnar() records)
+    as a .npy record array and prune old versions.
+    """
+    arr = data if isinstance(data, np.ndarray) else to_columnar(data)
+    path = columnar_path(version, directory)
+    _atomic_write(path, lambda f: np.save(f, arr, allow_pickle=False))
+    for old in list_columnar_versions(directory)[:-COLUMNAR_KEEP]:
+        try:
+            os.remove(columnar_path(old, directory))
+        except OSError:
+            pass
+    return path
+
+def list_columnar_versions(directory: str = "."):
+    """Sorted versions of the columnar snapshots present in `directory`."""
+    versions = []
+    for path in glob.glob(os.path.join(directory, f"{COLUMNAR_PREFIX}*.npy")):
+        stem = os.path.basename(path)[len(COLUMNAR_PREFIX):-len(".npy")]
+        if stem.isdigit():
+            versions.append(int(stem))
+    return sorted(versions)
+
+def load_columnar_snapshot(directory: str = ".", version: int = None):
+    """
+    Memory-map a columnar snapshot (the newest one unless `version` is given).
+    Returns ``(version, records)``; `records` is a read-only, zero-copy
+    np.memmap of COLUMNAR_DTYPE, or ``(None, None)`` if there is none.
+    """
+    if version is None:
+        versions = list_columnar_versions(directory)
+        if not versions:
+            return None, None
+        version = versions[-1]
+    return version, np.load(columnar_path(version, directory), mmap_mode="r", allow_pickle=False)
+
+
+def _append_history(records):
+    """Append a snapshot to the price history; a history failure never blocks the snapshot."""
+    try:
+        inserted = append_records(records)
+        logger.info(f"Price history: {inserted} new rows")
+    except Exception as e:
+        logger.warning(f"Failed to append snapshot to price history: {e}")
+
+
+def save_psx_data(incremental: bool = True):
+    """
+    Fetch PSX data and save it as a new snapshot version.
+
+    Incremental runs write only the symbols that changed since the last full
+    snapshot (psx_data.json) to psx_data.delta.json. A full snapshot is
+    written on the first run, when `incremental` is False, or once the delta
+    grows past DELTA_MAX_RATIO of the market. Every version is also written
+    as a memory-mappable psx_data.vNNNNNNNN.npy and appended to the price
+    history store. All files are replaced atomically. Returns the merged
+    snapshot, or None when the data was not modified. Raises
+    SourcesUnavailable when no source answered and OSError when a file
+    can't be written, so callers can tell failures from quiet runs.
+    """
+    base = _read_json(SNAPSHOT_FILE) if incremental else None
+    current = load_psx_data()
+    previous = current["data"] if base else {}
+    validators = dict(current["validators"]) if base else {}
+
+    data = fetch_psx_data(previous=previous, validators=validators)
+    now = datetime.now(pytz.UTC).isoformat()
+
+    if base and (data is previous or diff_psx_data(previous, data) == ({}, [])):
+        logger.info("PSX data not modified; nothing written.")
+        return None
+
+    version = int(current.get("version") or 0) + 1
+    snapshot = {"version": version, "timestamp": now, "data": data, "validators": validators}
+    directory = os.path.dirname(os.path.abspath(SNAPSHOT_FILE))
+
+    # Columnar copy first, so a reader that sees version N in JSON can map it
+    records = to_columnar(data)
+    write_columnar_snapshot(records, version, directory)
+    _append_history(records)
+
+    if base:
+        changed, removed = diff_psx_data(base.get("data") or {}, data)
+        if len(changed) + len(removed) <= DELTA_MAX_RATIO * max(len(data), 1):
+            write_json_atomic(DELTA_FILE, {
+                "version": version,
+                "base_timestamp": base.get("timestamp"),
+                "timestamp": now,
+                "data": changed,
+                "removed": removed,
+                "validators": validators,
+            })
+            logger.info(f"PSX delta v{version} saved to {DELTA_FILE} ({len(changed)} changed, {len(removed)} removed)")
+            return snapshot
+
+    write_json_atomic(SNAPSHOT_FILE, snapshot)
+    if os.path.exists(DELTA_FILE):
+        os.remove(DELTA_FILE)
+    logger.info(f"PSX data v{version} fetched and saved to {SNAPSHOT_FILE}")
+    return snapshot
+
+
+def benchmark_snapshot_formats(path: str = SNAPSHOT_FILE, repeat: int = 20) -> dict:
+    """
+    Compare file size and load time of one snapshot stored as indented JSON
+    (the old format), compact JSON and the memory-mapped .npy layout.
+    """
+    data = load_psx_data(path)["data"]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        indented = os.path.join(tmp, "indented.json")
+        compact = os.path.join(tmp, "compact.json")
+        with open(indented, "w") as f:
+            json.dump({"data": data}, f, indent=2)
+        write_json_atomic(compact, {"data": data})
+        npy = write_columnar_snapshot(data, 1, tmp)
+
+        loaders = {
+            "json_indent2": (indented, lambda: _read_json(indented)),
+            "json_compact": (compact, lambda: _read_json(compact)),
+            "npy_mmap": (npy, lambda: load_columnar_snapshot(tmp, 1)[1]["price"].sum()),
+        }
+        for name, (file_path, load) in loaders.items():
+            started = time.perf_counter()
+            for _ in range(repeat):
+                load()
+            results[name] = {
+                "bytes": os.path.getsize(file_path),
+                "load_ms": (time.perf_counter() - started) * 1000 / repeat,
+            }
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        for name, r in benchmark_snapshot_formats(*sys.argv[2:3]).items():
+            print(f"{name:13s} {r['bytes']:>10,d} bytes  {r['load_ms']:8.3f} ms")
+    else:
+        save_psx_data()
@@ -0,0 +1,283 @@
+# trackerbazaar/returns.py
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from trackerbazaar.data import get_conn
+from trackerbazaar.nav import get_nav, symbol_matrices
+from trackerbazaar.positions import EPS
+from trackerbazaar.price_history import HISTORY_DB_FILE
+
+WINDOWS = ("MTD", "YTD", "1Y", "Inception")
+BASES = ("auto", "holdings", "account")
+RETURN_COLUMNS = ["window", "start", "end", "twr", "xirr"]
+
+DAYS_PER_YEAR = 365.0
+XIRR_TOL = 1e-10
+XIRR_MAX_ITER = 100
+XIRR_FLOOR = -0.9999  # rates are searched between this and 10**XIRR_CEILING_STEPS
+XIRR_CEILING_STEPS = 8
+XIRR_CELLS = 4_000_000  # padded flow cells solved per block (~32 MB per float64 array)
+
+
+# ---- windows and daily returns
+
+def window_base(dates: np.ndarray, window: str) -> int:
+    """
+    Index into `dates` of the window's base day: the last day before it
+    starts, whose closing value is the opening investment. -1 means the
+    window starts from nothing (inception, or history shorter than the
+    window). `window` is one of WINDOWS or an ISO start date; every window
+    ends on the last day.
+    """
+    if window == "Inception":
+        return -1
+    end = dates[-1]
+    if window == "MTD":
+        start = end.astype("datetime64[M]").astype("datetime64[D]")
+    elif window == "YTD":
+        start = end.astype("datetime64[Y]").astype("datetime64[D]")
+    elif window == "1Y":
+        start = end - 364
+    else:
+        try:
+            start = np.datetime64(window, "D")
+        except ValueError:
+            raise ValueError(f"Unknown window {window!r}; expected one of {WINDOWS} or a YYYY-MM-DD date") from None
+    return int(np.searchsorted(dates, start, side="left")) - 1
+
+
+def daily_returns(value: np.ndarray, flow: np.ndarray, income: np.ndarray) -> np.ndarray:
+    """
+    Day-over-day returns of (days x series) arrays: closing `value`, net
+    money put in that day (`flow`, negative when taken out) and `income`
+    paid out. Money put in counts from the start of the day and money
+    taken out at the close, so a series starting from nothing earns the
+    close over what went in and a full exit earns the proceeds over the
+    previous close. Days without a positive base are flat.
+    """
+    prev = np.zeros_like(value)
+    prev[1:] = value[:-1]
+    base = prev + np.maximum(flow, 0)
+    out = np.ones_like(value)
+    np.divide(value + income + np.maximum(-flow, 0), base, out=out, where=base > EPS)
+    return out - 1
+
+
+def window_flows(dates: np.ndarray, value: np.ndarray, flow: np.ndarray, income: np.ndarray,
+                 base: int) -> tuple:
+    """
+    Investor-side dated cash flows of each series over the window after
+    `base`: the base day's value paid in, daily flows out of pocket,
+    income received and the last day's value taken out. Returns
+    ``(years, amounts)`` with years since the first flow, (days,) and
+    (days x series).
+    """
+    lo = max(base, 0)
+    amounts = income[lo:] - flow[lo:]
+    if base >= 0:
+        amounts[0] = -value[base]
+    amounts[-1] += value[-1]
+    years = (dates[lo:] - dates[lo]).astype(np.float64) / DAYS_PER_YEAR
+    return years, amounts
+
+
+# ---- XIRR
+
+def pad_flows(flows) -> tuple:
+    """
+    Stack (years, amounts) pairs of any lengths into padded
+    (problems x flows) arrays. Zero amounts are dropped first; padding is
+    zero, which adds nothing to the present value.
+    """
+    kept = [(np.asarray(t, dtype=np.float64)[a != 0], a[a != 0])
+            for t, a in ((t, np.asarray(a, dtype=np.float64)) for t, a in flows)]
+    width = max((len(a) for _, a in kept), default=0)
+    years = np.zeros((len(kept), max(width, 1)))
+    amounts = np.zeros_like(years)
+    for i, (t, a) in enumerate(kept):
+        years[i, :len(t)] = t
+        amounts[i, :len(a)] = a
+    return years, amounts
+
+
+def _npv(rate: np.ndarray, years: np.ndarray, amounts: np.ndarray) -> tuple:
+    """Present value of each row at its rate, and its derivative."""
+    disc = np.exp(-years * np.log1p(rate)[:, None])
+    return (amounts * disc).sum(axis=1), -(years * amounts * disc).sum(axis=1) / (1 + rate)
+
+
+def _newton(years: np.ndarray, amounts: np.ndarray, tol: float, max_iter: int) -> np.ndarray:
+    n = len(amounts)
+    rate = np.full(n, np.nan)
+    paid_in, paid_out = -np.minimum(amounts, 0).sum(axis=1), np.maximum(amounts, 0).sum(axis=1)
+    active = (paid_in > 0) & (paid_out > 0)  # no sign change, no rate
+
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        # Bracket each root between XIRR_FLOOR and a ceiling raised tenfold until the NPV changes sign
+        lo, hi = np.full(n, XIRR_FLOOR), np.ones(n)
+        f_lo = _npv(lo, years, amounts)[0]
+        for _ in range(XIRR_CEILING_STEPS):
+            grow = active & (np.sign(_npv(hi, years, amounts)[0]) == np.sign(f_lo))
+            if not grow.any():
+                break
+            hi[grow] *= 10
+        active &= np.sign(_npv(hi, years, amounts)[0]) != np.sign(f_lo)
+
+        # Start from the money multiple spread over the flows' span
+        span = np.maximum(years.max(axis=1), 1 / DAYS_PER_YEAR)
+        guess = np.divide(paid_out, paid_in, out=np.ones(n), where=active) ** (1 / span) - 1
+        rate[active] = np.clip(guess, lo, hi)[active]
+
+        for _ in range(max_iter):
+            idx = np.flatnonzero(active)
+            if not idx.size:
+                break
+            r = rate[idx]
+            npv, slope = _npv(r, years[idx], amounts[idx])
+            below = np.sign(npv) == np.sign(f_lo[idx])  # the root lies above r
+            lo[idx] = np.where(below, r, lo[idx])
+            f_lo[idx] = np.where(below, npv, f_lo[idx])
+            hi[idx] = np.where(below, hi[idx], r)
+            # Newton step, or bisection when it would leave the bracket
+            step = np.divide(npv, slope, out=np.full_like(npv, np.inf), where=slope != 0)
+            done = (np.abs(step) <= tol * (1 + np.abs(r))) | (npv == 0)
+            new = r - np.where(npv == 0, 0.0, step)
+            outside = ~done & ~((new > lo[idx]) & (new < hi[idx]))
+            new[outside] = (lo[idx][outside] + hi[idx][outside]) / 2
+            rate[idx] = new
+            active[idx] = ~done
+    rate[active] = np.nan  # unconverged
+    return rate
+
+
+def xirr(years: np.ndarray, amounts: np.ndarray, tol: float = XIRR_TOL, max_iter: int = XIRR_MAX_ITER) -> np.ndarray:
+    """
+    Money-weighted return per unit of `years` (annualized when they are
+    years) of every row of padded (problems x flows) arrays at once:
+    Newton steps on all rows together, each row dropping out as it
+    converges. `years` may also be one row shared by all problems. Each
+    row keeps a bracket around its root and bisects when a Newton step
+    would leave it. Rows without both an inflow and an outflow, whose root
+    lies outside the search range, or that don't converge, are NaN. Rows
+    are solved in blocks of about XIRR_CELLS cells to bound memory.
+    """
+    amounts = np.atleast_2d(np.asarray(amounts, dtype=np.float64))
+    years = np.broadcast_to(np.atleast_2d(np.asarray(years, dtype=np.float64)), amounts.shape)
+    block = max(XIRR_CELLS // max(amounts.shape[1], 1), 1)
+    return np.concatenate([
+        _newton(years[i:i + block], amounts[i:i + block], tol, max_iter)
+        for i in range(0, len(amounts), block)
+    ]) if len(amounts) else np.zeros(0)
+
+
+# ---- portfolios and symbols
+
+def _series(nav: pd.DataFrame, basis: str) -> tuple:
+    """(value, flow, income, basis) columns of a NAV frame."""
+    if basis == "auto":
+        # The whole account when the cash ledger funds it; otherwise just the holdings
+        funded = nav["external_flow"].abs().sum() > EPS and nav["nav"].min() > EPS
+        basis = "account" if funded else "holdings"
+    if basis == "account":
+        cols = ("nav", "external_flow", None)
+    elif basis == "holdings":
+        cols = ("holdings_value", "trade_flow", "dividends")
+    else:
+        raise ValueError(f"Unknown basis {basis!r}; expected one of {BASES}")
+    value, flow, income = (nav[c].to_numpy(dtype=np.float64) if c else np.zeros(len(nav)) for c in cols)
+    return value[:, None], flow[:, None], income[:, None], basis
+
+
+def _solve(dates, value, flow, income, windows) -> list:
+    """[(window, start, twr per series, flows per series)] for one set of series."""
+    r = daily_returns(value, flow, income)
+    out = []
+    for w in windows:
+        base = window_base(dates, w)
+        twr = np.prod(1 + r[base + 1:], axis=0) - 1
+        years, amounts = window_flows(dates, value, flow, income, base)
+        if 0 < years[-1] < 1:  # short windows report the period's return, not an annualized one
+            years = years / years[-1]
+        out.append((w, dates[max(base, 0)], twr, [(years, a) for a in amounts.T]))
+    return out
+
+
+def _frame(rows: list, flows: list, lead: dict) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=[*lead, *RETURN_COLUMNS[:-1]])
+    df["xirr"] = xirr(*pad_flows(flows))
+    return df
+
+
+def portfolio_returns(portfolio_ids, windows=WINDOWS, basis: str = "auto", conn=None,
+                      history_path: str = HISTORY_DB_FILE) -> pd.DataFrame:
+    """
+    Time-weighted and money-weighted (XIRR) returns of each portfolio over
+    each window, from its daily NAV rollup. TWR chains daily returns, so
+    deposits and trades don't move it; XIRR weighs the same flows by when
+    they happened. XIRR is annualized for windows of a year or more and
+    left as the period's return for shorter ones, like TWR. All
+    portfolios' XIRRs are solved in one vectorized pass.
+
+    `basis` "holdings" values the holdings alone, with net trade spend as
+    flows and dividends as income; "account" values the NAV with cash
+    ledger entries as flows. "auto" picks account when cash entries fund
+    the portfolio (NAV stays positive), else holdings.
+
+    Columns: portfolio_id, basis, window, start, end, twr, xirr (fractions).
+    """
+    conn = conn or get_conn()
+    rows, flows = [], []
+    for pid in portfolio_ids:
+        nav = get_nav(pid, conn=conn, history_path=history_path)
+        if nav.empty:
+            continue
+        dates = nav["date"].to_numpy().astype("datetime64[D]")
+        value, flow, income, used = _series(nav, basis)
+        for w, start, twr, f in _solve(dates, value, flow, income, windows):
+            rows.append((pid, used, w, str(start), str(dates[-1]), twr[0]))
+            flows.extend(f)
+    return _frame(rows, flows, {"portfolio_id": None, "basis": None})
+
+
+def symbol_returns(portfolio_id: int, windows=WINDOWS, conn=None, history_path: str = HISTORY_DB_FILE) -> pd.DataFrame:
+    """
+    Holdings-basis TWR and XIRR of every symbol the portfolio has traded,
+    over each window: trade spend is the flow, the symbol's dividends are
+    income. Symbols not held during a window have zero TWR and no XIRR.
+    Columns: symbol, window, start, end, twr, xirr.
+    """
+    m = symbol_matrices(portfolio_id, conn=conn, history_path=history_path)
+    if m is None or not m["symbols"]:
+        return pd.DataFrame(columns=["symbol", *RETURN_COLUMNS])
+    rows, flows = [], []
+    dates = m["dates"]
+    for w, start, twr, f in _solve(dates, m["value"], m["flow"], m["dividends"], windows):
+        rows.extend((s, w, str(start), str(dates[-1]), t) for s, t in zip(m["symbols"], twr.tolist()))
+        flows.extend(f)
+    return _frame(rows, flows, {"symbol": None})
+
+
+def benchmark_xirr(n_portfolios: int = 5_000, n_flows: int = 250, seed: int = 0) -> dict:
+    """Time one xirr() pass over synthetic portfolios with known rates."""
+    rng = np.random.default_rng(seed)
+    true = rng.uniform(-0.3, 0.6, n_portfolios)
+    years = np.sort(rng.uniform(0, 10, (n_portfolios, n_flows)), axis=1)
+    years[:, 0] = 0
+    amounts = -rng.uniform(1e3, 1e5, (n_portfolios, n_flows))
+    amounts[:, -1] = 0
+    # Terminal value that makes each row's NPV zero at its true rate
+    amounts[:, -1] = -(amounts * (1 + true[:, None]) ** -years).sum(axis=1) * (1 + true) ** years[:, -1]
+    started = time.perf_counter()
+    rate = xirr(years, amounts)
+    elapsed = time.perf_counter() - started
+    return {"portfolios": n_portfolios, "flows": n_flows, "seconds": elapsed,
+            "max_error": float(np.nanmax(np.abs(rate - true))), "unsolved": int(np.isnan(rate).sum())}
+
+
+if __name__ == "__main__":
+    r = benchmark_xirr()
+    print(f"XIRR for {r['portfolios']:,} portfolios x {r['flows']} flows in {r['seconds'] * 1000:.0f} ms "
+          f"(max error {r['max_error']:.1e}, {r['unsolved']} unsolved)")
@@ -1,11 +1,12 @@
 import streamlit as st
 import sqlite3
 from passlib.hash import pbkdf2_sha256
+from trackerbazaar.data import get_conn
 
 
 def init_db():
     """Ensure users table exists with correct schema"""
-    with sqlite3.connect("trackerbazaar.db") as conn:
+    with get_conn("trackerbazaar.db") as conn:
         c = conn.cursor()
         c.execute(
             """
@@ -33,7 +34,7 @@ def signup():
 
         hashed_pw = pbkdf2_sha256.hash(password)
         try:
-            with sqlite3.connect("trackerbazaar.db") as conn:
+            with get_conn("trackerbazaar.db") as conn:
                 c = conn.cursor()
                 c.execute(
                     "INSERT INTO users(email, username, password_hash) VALUES (?,?,?)",
@@ -0,0 +1,182 @@
+# trackerbazaar/source_health.py
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class CircuitBreaker:
+    """
+    Per-source circuit breaker with latency tracking.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    calls are refused for `reset_timeout` seconds. Then a single trial
+    call is let through (half-open): success closes the breaker, failure
+    opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 60.0, window: int = 50):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened_at = None
+        self.last_error = None
+        self._latencies = deque(maxlen=window)
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """May a call go to this source right now?"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+                logger.info(f"Circuit {self.name}: half-open, sending a trial request")
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self.successes += 1
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logger.info(f"Circuit {self.name}: closed")
+            self.state = CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self, latency: float, error=None):
+        with self._lock:
+            self._latencies.append(latency)
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error else None
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit {self.name}: open after {self.consecutive_failures} failure(s): {error}")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def call(self, fn, *args, **kwargs):
+        """Run `fn` through the breaker. Raises CircuitOpenError if the breaker refuses the call."""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(time.monotonic() - started, e)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def latency_percentile(self, pct: float):
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))]
+
+    def metrics(self) -> dict:
+        return {
+            "source": self.name,
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "consecutive_failures": self.consecutive_failures,
+            "p50_latency_s": self.latency_percentile(50),
+            "p95_latency_s": self.latency_percentile(95),
+            "last_error": self.last_error,
+        }
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the source's breaker is open."""
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Process-wide breaker for a named source."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+        return breaker
+
+def source_metrics() -> list:
+    """Breaker state and latency stats for every source seen so far."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [b.metrics() for b in breakers]
+
+
+# A hedge runs up to two calls, and each may outlive hedged_call() by its own
+# request timeout (the loser after a win, or both after a short deadline).
+# Room for that times HEDGE_CONCURRENCY fetches keeps a new hedge from
+# queueing behind stragglers during an outage.
+HEDGE_CONCURRENCY = 2
+_hedge_pool = ThreadPoolExecutor(max_workers=4 * HEDGE_CONCURRENCY, thread_name_prefix="psx-hedge")
+
+def hedged_call(primary, secondary, budget: float, timeout: float):
+    """
+    Call `primary` (a (breaker, fn) pair); if it hasn't answered within
+    `budget` seconds, or fails or is refused sooner, also start `secondary`.
+    Returns ``(breaker_name, result)`` from the first success. Raises the
+    last error if both fail or `timeout` seconds pass.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    candidates = [primary, secondary]
+    futures = {}
+    errors = []
+
+    def launch(pair):
+        breaker, fn = pair
+        futures[_hedge_pool.submit(breaker.call, fn)] = breaker.name
+
+    launch(candidates.pop(0))
+    hedge_at = started + budget
+    try:
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            next_wake = deadline if not candidates else min(deadline, hedge_at)
+            done, _ = wait(list(futures), timeout=max(0.0, next_wake - now), return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = futures.pop(fut)
+                try:
+                    return name, fut.result()
+                except Exception as e:
+                    errors.append(e)
+            # Hedge once the budget is spent, or straight away if the primary already failed
+            if candidates and (not futures or time.monotonic() >= hedge_at):
+                launch(candidates.pop(0))
+    finally:
+        for fut in futures:
+            fut.cancel()  # still queued: nobody will read the answer, so don't start it
+    if not errors:
+        errors.append(TimeoutError(f"no source answered within {timeout:.1f}s"))
+    raise errors[-1]
@@ -1,7 +1,8 @@
 # trackerbazaar/tracker.py
 
-import sqlite3
-from trackerbazaar.data import DB_FILE, TABLES
+from trackerbazaar.cache import note_write
+from trackerbazaar.data import DB_FILE, QUERIES, get_conn
+from trackerbazaar.positions import record_transaction
 
 class PortfolioTracker:
     def __init__(self):
@@ -12,38 +13,68 @@ class PortfolioTracker:
         Return all portfolios. If owner_email is provided,
         only return portfolios belonging to that user.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with get_conn(self.db_path) as conn:
             cursor = conn.cursor()
             if owner_email:
                 cursor.execute(
-                    f"SELECT id, name FROM {TABLES['portfolios']} WHERE owner_email=?",
+                    QUERIES["user_portfolios"],
                     (owner_email,)
                 )
             else:
-                cursor.execute(f"SELECT id, name FROM {TABLES['portfolios']}")
+                cursor.execute("SELECT id, name FROM portfolios")
             return cursor.fetchall()
 
     def create_portfolio(self, name, owner_email):
         """
         Create a new portfolio for a given owner.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with get_conn(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(
-                f"INSERT INTO {TABLES['portfolios']} (name, owner_email) VALUES (?, ?)",
+                "INSERT INTO portfolios (name, owner_email) VALUES (?, ?)",
                 (name, owner_email)
             )
             conn.commit()
-            return cursor.lastrowid
+        note_write()
+        return cursor.lastrowid
 
     def delete_portfolio(self, portfolio_id):
         """
         Delete a portfolio by its ID.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with get_conn(self.db_path) as conn:
             cursor = conn.cursor()
+            for table in ("positions", "nav_daily", "nav_state", "nav_checkpoint"):
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE portfolio_id=?",
+                    (portfolio_id,)
+                )
             cursor.execute(
-                f"DELETE FROM {TABLES['portfolios']} WHERE id=?",
+                "DELETE FROM portfolios WHERE id=?",
                 (portfolio_id,)
             )
             conn.commit()
+        note_write()
+
+    def add_transaction(self, portfolio_id, date, symbol, transaction_type, quantity, price, fees=0.0):
+        """
+        Record a BUY/SELL and update the portfolio's materialized position
+        in the same transaction. Returns the new transaction id.
+        """
+        with get_conn(self.db_path) as conn:
+            tx_id = record_transaction(conn, portfolio_id, date, symbol, transaction_type, quantity, price, fees)
+        note_write()
+        return tx_id
+
+    def add_dividend(self, portfolio_id, date, symbol, amount):
+        """
+        Record a dividend received. Returns the new dividend id.
+        """
+        with get_conn(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO dividends (portfolio_id, date, symbol, amount) VALUES (?, ?, ?, ?)",
+                (portfolio_id, str(date), symbol.strip().upper(), float(amount))
+            )
+        note_write()
+        return cursor.lastrowid
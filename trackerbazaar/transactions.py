@@ -1,8 +1,10 @@
-import sqlite3
-import pandas as pd
 import streamlit as st
 from datetime import date
-from trackerbazaar.data import DB_FILE, init_db
+from trackerbazaar.cache import note_write, user_portfolios
+from trackerbazaar.data import get_conn, init_db
+from trackerbazaar.history_view import show_history
+from trackerbazaar.importer import import_transactions
+from trackerbazaar.positions import record_transaction
 
 
 class TransactionsUI:
@@ -10,13 +12,7 @@ class TransactionsUI:
         self.user_email = user_email
 
     def _user_portfolios(self):
-        with sqlite3.connect(DB_FILE) as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT id, name FROM portfolios WHERE owner_email=? ORDER BY name",
-                (self.user_email,),
-            )
-            return cur.fetchall()
+        return user_portfolios(self.user_email)
 
     def show(self):
         st.header("📜 Transactions")
@@ -54,15 +50,9 @@ class TransactionsUI:
                     st.warning("Enter a symbol.")
                 else:
                     try:
-                        with sqlite3.connect(DB_FILE) as conn:
-                            cur = conn.cursor()
-                            cur.execute(
-                                """INSERT INTO transactions
-                                   (portfolio_id, date, symbol, type, quantity, price, fees)
-                                   VALUES (?,?,?,?,?,?,?)""",
-                                (portfolio_id, str(tx_date), symbol, tx_type, quantity, price, fees),
-                            )
-                            conn.commit()
+                        with get_conn() as conn:
+                            record_transaction(conn, portfolio_id, tx_date, symbol, tx_type, quantity, price, fees)
+                        note_write()
                         st.success("Transaction added.")
                         try:
                             st.rerun()
@@ -71,17 +61,40 @@ class TransactionsUI:
                     except Exception as e:
                         st.error(f"Failed to add transaction: {e}")
 
-        # Transaction table
-        with sqlite3.connect(DB_FILE) as conn:
-            df = pd.read_sql_query(
-                """SELECT date, symbol, type, quantity, price, fees
-                   FROM transactions WHERE portfolio_id=? ORDER BY date DESC""",
-                conn,
-                params=(portfolio_id,),
+        # Bulk import from a broker statement
+        with st.expander("📥 Import broker statement (CSV/XLSX)"):
+            st.caption(
+                "Needs date, symbol, type (BUY/SELL), quantity and price columns; fees optional. "
+                "Common broker headings (Trade Date, Scrip, Side, Qty, Rate, Commission…) are recognised. "
+                "Trades already imported are skipped."
             )
+            upload = st.file_uploader("Statement", type=["csv", "xlsx"], key=f"import_{portfolio_id}")
+            month_first = st.checkbox("Dates are month-first (MM/DD/YYYY)", value=False)
+            if upload is not None and st.button("Import trades"):
+                try:
+                    with st.spinner("Importing…"):
+                        stats = import_transactions(upload, portfolio_id, name=upload.name,
+                                                    dayfirst=not month_first)
+                    note_write()
+                    rejected = stats["rejected"]
+                    st.success(
+                        f"Imported {stats['inserted']:,} of {stats['rows_read']:,} rows "
+                        f"in {stats['seconds']:.1f}s ({stats['rows_per_sec']:,.0f} rows/s); "
+                        f"{stats['duplicates']:,} duplicate(s) skipped."
+                    )
+                    if len(rejected) > stats["duplicates"]:
+                        st.warning(f"{len(rejected) - stats['duplicates']:,} row(s) rejected:")
+                    if len(rejected):
+                        st.dataframe(rejected, use_container_width=True)
+                        st.download_button("Download rejected rows", rejected.to_csv(index=False),
+                                           file_name="rejected_rows.csv", mime="text/csv")
+                except Exception as e:
+                    st.error(f"Import failed: {e}")
 
-        st.subheader("History")
-        if df.empty:
-            st.info("No transactions yet.")
-        else:
-            st.dataframe(df, use_container_width=True)
+        # Transaction table
+        totals = show_history("transactions", portfolio_id, self.user_email, "No transactions yet.")
+        if totals["rows"]:
+            st.caption(
+                f"Bought: **PKR {totals['bought']:,.0f}** · Sold: **PKR {totals['sold']:,.0f}** "
+                f"· Fees: **PKR {totals['fees']:,.0f}**"
+            )
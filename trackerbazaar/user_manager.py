@@ -1,7 +1,6 @@
 import streamlit as st
-import sqlite3
 from passlib.hash import pbkdf2_sha256
-from trackerbazaar.data import DB_FILE
+from trackerbazaar.data import QUERIES, get_conn, init_db
 
 class UserManager:
     def __init__(self):
@@ -10,20 +9,12 @@ class UserManager:
             st.session_state.logged_in_user = None
 
     def _init_db(self):
-        """Initialize users table if it doesn't exist"""
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    email TEXT PRIMARY KEY,
-                    password_hash TEXT NOT NULL
-                )
-            """)
-            conn.commit()
+        """Ensure the schema (including the users table) is up to date"""
+        init_db()
 
     def register_user(self, email, password):
         """Register a new user"""
-        with sqlite3.connect(DB_FILE) as conn:
+        with get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT email FROM users WHERE email=?", (email,))
             if cursor.fetchone():
@@ -36,9 +27,9 @@ class UserManager:
 
     def login_user(self, email, password):
         """Check login credentials"""
-        with sqlite3.connect(DB_FILE) as conn:
+        with get_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT password_hash FROM users WHERE email=?", (email,))
+            cursor.execute(QUERIES["user_lookup"], (email,))
             row = cursor.fetchone()
             if row and pbkdf2_sha256.verify(password, row[0]):
                 st.session_state.logged_in_user = email
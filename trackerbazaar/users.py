@@ -1,5 +1,6 @@
 import streamlit as st
 import sqlite3
+from trackerbazaar.data import get_conn
 from passlib.hash import pbkdf2_sha256
 
 DB_FILE = "trackerbazaar_v2.db"  # ✅ consistent with other modules
@@ -13,7 +14,7 @@ class UserManager:
 
     def _init_db(self):
         """Initialize the users table inside trackerbazaar_v2.db"""
-        with sqlite3.connect(DB_FILE) as conn:
+        with get_conn(DB_FILE) as conn:
             c = conn.cursor()
             c.execute(
                 """
@@ -28,7 +29,7 @@ class UserManager:
     def signup(self, email, password):
         """Register a new user."""
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with get_conn(DB_FILE) as conn:
                 c = conn.cursor()
                 password_hash = pbkdf2_sha256.hash(password)
                 c.execute(
@@ -47,7 +48,7 @@ class UserManager:
     def login(self, email, password):
         """Login existing user."""
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with get_conn(DB_FILE) as conn:
                 c = conn.cursor()
                 c.execute("SELECT password_hash FROM users WHERE email=?", (email,))
                 row = c.fetchone()
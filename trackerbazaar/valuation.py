@@ -0,0 +1,152 @@
+# trackerbazaar/valuation.py
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from trackerbazaar.current_prices import CurrentPrices
+from trackerbazaar.data import get_conn
+from trackerbazaar.positions import EPS
+from trackerbazaar.price_store import PriceSnapshot
+
+# Open positions of every live portfolio, or of one owner's portfolios
+OPEN_POSITIONS_SQL = """SELECT portfolio_id, symbol, net_qty, cost_basis
+                        FROM positions
+                        WHERE net_qty > ? AND portfolio_id IN (SELECT id FROM portfolios)"""
+OWNER_POSITIONS_SQL = """SELECT portfolio_id, symbol, net_qty, cost_basis
+                         FROM positions
+                         WHERE net_qty > ? AND portfolio_id IN (SELECT id FROM portfolios WHERE owner_email=?)"""
+
+VALUATION_COLUMNS = [
+    "portfolio_id", "symbol", "quantity", "cost_basis", "avg_cost", "price", "market_value",
+    "unrealized_pnl", "unrealized_pct", "day_change", "day_change_pct", "weight", "priced",
+]
+SUMMARY_COLUMNS = [
+    "portfolio_id", "positions", "unpriced", "cost_basis", "market_value",
+    "unrealized_pnl", "unrealized_pct", "day_change", "day_change_pct",
+]
+
+
+def load_open_positions(owner_email: str = None, portfolio_ids=None, conn=None) -> pd.DataFrame:
+    """
+    Open positions (portfolio_id, symbol, net_qty, cost_basis) in one query:
+    one owner's portfolios, or every portfolio when `owner_email` is None.
+    `portfolio_ids` narrows the result further.
+    """
+    conn = conn or get_conn()
+    if owner_email is None:
+        df = pd.read_sql_query(OPEN_POSITIONS_SQL, conn, params=(EPS,))
+    else:
+        df = pd.read_sql_query(OWNER_POSITIONS_SQL, conn, params=(EPS, owner_email))
+    if portfolio_ids is not None:
+        df = df[df["portfolio_id"].isin(list(portfolio_ids))].reset_index(drop=True)
+    return df
+
+
+def _pct(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(num, dtype=np.float64)
+    np.divide(num, den, out=out, where=np.abs(den) > EPS)
+    return out * 100
+
+
+def value_positions(positions: pd.DataFrame, snapshot: PriceSnapshot) -> pd.DataFrame:
+    """
+    Mark positions (portfolio_id, symbol, net_qty, cost_basis) to the
+    snapshot in one vectorized pass.
+
+    Symbols are factorized first, so the snapshot lookup is one
+    searchsorted over the distinct symbols however many portfolios hold
+    them. Positions with no (or a zero) price are carried at cost with
+    ``priced`` False. Day change is quantity times the snapshot's
+    per-share `change`; percentages are in percent, weights are the
+    position's share of its portfolio's market value.
+    """
+    if positions.empty:
+        return pd.DataFrame(columns=VALUATION_COLUMNS)
+    codes, uniques = pd.factorize(positions["symbol"], sort=False)
+    rows = snapshot.rows_for(np.asarray(uniques, dtype=str))[codes]
+
+    qty = positions["net_qty"].to_numpy(dtype=np.float64)
+    cost = positions["cost_basis"].to_numpy(dtype=np.float64)
+    price = snapshot.take(snapshot.price, rows)
+    priced = price > 0
+    change = np.where(priced, snapshot.take(snapshot.change, rows), 0.0)
+    change_pct = np.where(priced, snapshot.take(snapshot.change_pct, rows), 0.0)
+
+    value = np.where(priced, qty * price, cost)
+    unrealized = value - cost
+    day_change = qty * change
+
+    pcodes, _ = pd.factorize(positions["portfolio_id"], sort=False)
+    totals = np.bincount(pcodes, weights=value)
+    return pd.DataFrame({
+        "portfolio_id": positions["portfolio_id"].to_numpy(),
+        "symbol": positions["symbol"].to_numpy(),
+        "quantity": qty,
+        "cost_basis": cost,
+        "avg_cost": np.divide(cost, qty, out=np.zeros_like(cost), where=qty > EPS),
+        "price": np.where(priced, price, np.nan),
+        "market_value": value,
+        "unrealized_pnl": unrealized,
+        "unrealized_pct": _pct(unrealized, cost),
+        "day_change": day_change,
+        "day_change_pct": change_pct,
+        "weight": _pct(value, totals[pcodes]) / 100,
+        "priced": priced,
+    })
+
+
+def summarize(valued: pd.DataFrame) -> pd.DataFrame:
+    """Per-portfolio totals of a value_positions() frame."""
+    if valued.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    g = valued.groupby("portfolio_id", sort=True)
+    out = g[["cost_basis", "market_value", "unrealized_pnl", "day_change"]].sum()
+    out.insert(0, "positions", g.size())
+    out.insert(1, "unpriced", g["priced"].size() - g["priced"].sum())
+    mv, cost, day = (out[c].to_numpy() for c in ("market_value", "cost_basis", "day_change"))
+    out["unrealized_pct"] = _pct(out["unrealized_pnl"].to_numpy(), cost)
+    out["day_change_pct"] = _pct(day, mv - day)  # against yesterday's value
+    return out.reset_index()[SUMMARY_COLUMNS]
+
+
+def value_portfolios(owner_email: str = None, portfolio_ids=None, snapshot: PriceSnapshot = None,
+                     conn=None) -> tuple:
+    """
+    Value one owner's portfolios, or every portfolio when `owner_email` is
+    None (batch jobs), against `snapshot` (default: the current prices).
+    Returns ``(positions, summary)``.
+    """
+    if snapshot is None:
+        snapshot = CurrentPrices().store.snapshot
+    valued = value_positions(load_open_positions(owner_email, portfolio_ids, conn), snapshot)
+    return valued, summarize(valued)
+
+
+def benchmark_valuation(n_portfolios: int = 10_000, per_portfolio: int = 20, n_symbols: int = 600,
+                        seed: int = 0) -> dict:
+    """Time value_positions() + summarize() on synthetic positions and a synthetic snapshot."""
+    rng = np.random.default_rng(seed)
+    universe = np.array([f"SYM{i}" for i in range(n_symbols)], dtype=object)
+    snapshot = PriceSnapshot([
+        ("REG", s, float(p), float(c), float(c / p * 100), 0.0, 0.0)
+        for s, p, c in zip(universe[:-10], rng.random(n_symbols) * 500 + 1, rng.normal(0, 5, n_symbols))
+    ])  # the last ten symbols stay unpriced
+    n = n_portfolios * per_portfolio
+    positions = pd.DataFrame({
+        "portfolio_id": np.repeat(np.arange(n_portfolios), per_portfolio),
+        "symbol": universe[rng.integers(0, n_symbols, n)],
+        "net_qty": rng.integers(1, 5000, n).astype(np.float64),
+        "cost_basis": rng.random(n) * 1e6,
+    })
+    started = time.perf_counter()
+    valued = value_positions(positions, snapshot)
+    summary = summarize(valued)
+    elapsed = time.perf_counter() - started
+    return {"portfolios": len(summary), "positions": len(valued), "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    r = benchmark_valuation()
+    print(f"{r['portfolios']:,} portfolios / {r['positions']:,} positions valued in {r['seconds'] * 1000:.1f} ms")
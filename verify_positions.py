@@ -0,0 +1,36 @@
+# verify_positions.py
+# Check (or rebuild) the materialized positions table against the ledger:
+#   python verify_positions.py            # report mismatches, exit 1 if any
+#   python verify_positions.py --rebuild  # recompute from transactions
+
+import argparse
+import sys
+
+from trackerbazaar.data import get_conn, init_db
+from trackerbazaar.positions import rebuild_positions, verify_positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or rebuild the positions table.")
+    parser.add_argument("--portfolio", type=int, default=None, help="limit to one portfolio id")
+    parser.add_argument("--rebuild", action="store_true", help="recompute positions from the ledger")
+    args = parser.parse_args()
+
+    init_db()
+    if args.rebuild:
+        with get_conn() as conn:
+            n = rebuild_positions(conn, args.portfolio)
+        print(f"✅ Rebuilt {n} position row(s) from the ledger")
+        return
+
+    mismatches = verify_positions(portfolio_id=args.portfolio)
+    if mismatches.empty:
+        print("✅ positions table matches the transaction ledger")
+        return
+    print(f"❌ {len(mismatches)} position(s) differ from the ledger:")
+    print(mismatches.to_string())
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()